@@ -43,6 +43,146 @@
 # Python module imports.
 #-------------------------------------------------------------------
 import sys
+import struct
+from array import array
+from collections import OrderedDict
+
+from aes_sbox import SBOX, INV_SBOX, WIDE_SBOX, WIDE_INV_SBOX
+from aes_key_expansion import get_rcon, expand_key, key_schedule
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+# A block as four big endian 32 bit words.
+BLOCK_STRUCT = struct.Struct(">4I")
+
+
+#-------------------------------------------------------------------
+# gf_mult()
+#
+# Galois Multiplication of the two given bytes in GF(2^8) with
+# the AES polynomial.
+#-------------------------------------------------------------------
+def gf_mult(a, b):
+    res = 0
+    while b:
+        if b & 1:
+            res ^= a
+        a = ((a << 1) ^ (0x1b & ((a >> 7) * 0xff))) & 0xff
+        b >>= 1
+    return res
+
+
+#-------------------------------------------------------------------
+# gen_gm_table()
+#
+# Generate the table with the Galois Multiplication by the
+# given constant for all bytes.
+#-------------------------------------------------------------------
+def gen_gm_table(c):
+    return [gf_mult(b, c) for b in range(256)]
+
+
+#-------------------------------------------------------------------
+# Galois Multiplication tables for the constants used in
+# MixColumns and InvMixColumns. Built once when the module
+# is loaded and shared by all engines.
+#-------------------------------------------------------------------
+GM2 = gen_gm_table(2)
+GM3 = gen_gm_table(3)
+GM4 = gen_gm_table(4)
+GM8 = gen_gm_table(8)
+GM09 = gen_gm_table(9)
+GM11 = gen_gm_table(11)
+GM13 = gen_gm_table(13)
+GM14 = gen_gm_table(14)
+
+
+#-------------------------------------------------------------------
+# Masks for SIMD within a register (SWAR) operations on the bytes
+# in a 32 bit column word and in a 128 bit state with four
+# column words.
+#-------------------------------------------------------------------
+SWAR_LO7_32 = 0x7f7f7f7f
+SWAR_MSB_32 = 0x01010101
+SWAR_LO7_128 = 0x7f7f7f7f7f7f7f7f7f7f7f7f7f7f7f7f
+SWAR_MSB_128 = 0x01010101010101010101010101010101
+SWAR_ROT8_128 = (0xffffff00ffffff00ffffff00ffffff00, 0x000000ff000000ff000000ff000000ff)
+SWAR_ROT16_128 = (0xffff0000ffff0000ffff0000ffff0000, 0x0000ffff0000ffff0000ffff0000ffff)
+SWAR_ROT24_128 = (0xff000000ff000000ff000000ff000000, 0x00ffffff00ffffff00ffffff00ffffff)
+
+
+#-------------------------------------------------------------------
+# xtime_word()
+#
+# Multiply all four bytes in the given word by x in GF(2^8).
+#-------------------------------------------------------------------
+def xtime_word(w):
+    return ((w & SWAR_LO7_32) << 1) ^ (((w >> 7) & SWAR_MSB_32) * 0x1b)
+
+
+#-------------------------------------------------------------------
+# mix_word()
+#
+# MixColumns on a column word without tables. With the column
+# rotated left by one byte, 2a0 ^ 3a1 ^ a2 ^ a3 is computed as
+# xtime(a0 ^ a1) ^ a1 ^ a2 ^ a3 for all four rows at once.
+#-------------------------------------------------------------------
+def mix_word(w):
+    r8 = ((w << 8) | (w >> 24)) & 0xffffffff
+    r16 = ((w << 16) | (w >> 16)) & 0xffffffff
+    r24 = ((w << 24) | (w >> 8)) & 0xffffffff
+    t = w ^ r8
+    return ((t & SWAR_LO7_32) << 1) ^ (((t >> 7) & SWAR_MSB_32) * 0x1b) ^ r8 ^ r16 ^ r24
+
+
+#-------------------------------------------------------------------
+# inv_mix_word()
+#
+# InvMixColumns on a column word without tables. The column is
+# first multiplied with (05, 00, 04, 00) after which MixColumns
+# gives the inverse.
+#-------------------------------------------------------------------
+def inv_mix_word(w):
+    u = w ^ (((w << 16) | (w >> 16)) & 0xffffffff)
+    u = ((u & SWAR_LO7_32) << 1) ^ (((u >> 7) & SWAR_MSB_32) * 0x1b)
+    u = ((u & SWAR_LO7_32) << 1) ^ (((u >> 7) & SWAR_MSB_32) * 0x1b)
+    return mix_word(w ^ u)
+
+
+#-------------------------------------------------------------------
+# xtime_128()
+#
+# Multiply all 16 bytes in the given 128 bit state by x.
+#-------------------------------------------------------------------
+def xtime_128(x):
+    return ((x & SWAR_LO7_128) << 1) ^ (((x >> 7) & SWAR_MSB_128) * 0x1b)
+
+
+#-------------------------------------------------------------------
+# mixcolumns_128()
+#
+# MixColumns on a 128 bit state with four column words. All
+# words are rotated at once with masks. Column 0 is the most
+# significant word.
+#-------------------------------------------------------------------
+def mixcolumns_128(x):
+    r8 = ((x << 8) & SWAR_ROT8_128[0]) | ((x >> 24) & SWAR_ROT8_128[1])
+    r16 = ((x << 16) & SWAR_ROT16_128[0]) | ((x >> 16) & SWAR_ROT16_128[1])
+    r24 = ((x << 24) & SWAR_ROT24_128[0]) | ((x >> 8) & SWAR_ROT24_128[1])
+    t = x ^ r8
+    return ((t & SWAR_LO7_128) << 1) ^ (((t >> 7) & SWAR_MSB_128) * 0x1b) ^ r8 ^ r16 ^ r24
+
+
+#-------------------------------------------------------------------
+# inv_mixcolumns_128()
+#
+# InvMixColumns on a 128 bit state with four column words.
+#-------------------------------------------------------------------
+def inv_mixcolumns_128(x):
+    u = x ^ (((x << 16) & SWAR_ROT16_128[0]) | ((x >> 16) & SWAR_ROT16_128[1]))
+    return mixcolumns_128(x ^ xtime_128(xtime_128(u)))
 
 
 #-------------------------------------------------------------------
@@ -56,79 +196,87 @@ class AES():
     AES_256_ROUNDS = 14
 
 
-    sbox = [0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5,
-            0x30, 0x01, 0x67, 0x2b, 0xfe, 0xd7, 0xab, 0x76,
-            0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0,
-            0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0,
-            0xb7, 0xfd, 0x93, 0x26, 0x36, 0x3f, 0xf7, 0xcc,
-            0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
-            0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a,
-            0x07, 0x12, 0x80, 0xe2, 0xeb, 0x27, 0xb2, 0x75,
-            0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0,
-            0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84,
-            0x53, 0xd1, 0x00, 0xed, 0x20, 0xfc, 0xb1, 0x5b,
-            0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
-            0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85,
-            0x45, 0xf9, 0x02, 0x7f, 0x50, 0x3c, 0x9f, 0xa8,
-            0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5,
-            0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2,
-            0xcd, 0x0c, 0x13, 0xec, 0x5f, 0x97, 0x44, 0x17,
-            0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
-            0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88,
-            0x46, 0xee, 0xb8, 0x14, 0xde, 0x5e, 0x0b, 0xdb,
-            0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c,
-            0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79,
-            0xe7, 0xc8, 0x37, 0x6d, 0x8d, 0xd5, 0x4e, 0xa9,
-            0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
-            0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6,
-            0xe8, 0xdd, 0x74, 0x1f, 0x4b, 0xbd, 0x8b, 0x8a,
-            0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e,
-            0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e,
-            0xe1, 0xf8, 0x98, 0x11, 0x69, 0xd9, 0x8e, 0x94,
-            0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
-            0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68,
-            0x41, 0x99, 0x2d, 0x0f, 0xb0, 0x54, 0xbb, 0x16]
-
-
-    inv_sbox = [0x52, 0x09, 0x6a, 0xd5, 0x30, 0x36, 0xa5, 0x38,
-                0xbf, 0x40, 0xa3, 0x9e, 0x81, 0xf3, 0xd7, 0xfb,
-                0x7c, 0xe3, 0x39, 0x82, 0x9b, 0x2f, 0xff, 0x87,
-                0x34, 0x8e, 0x43, 0x44, 0xc4, 0xde, 0xe9, 0xcb,
-                0x54, 0x7b, 0x94, 0x32, 0xa6, 0xc2, 0x23, 0x3d,
-                0xee, 0x4c, 0x95, 0x0b, 0x42, 0xfa, 0xc3, 0x4e,
-                0x08, 0x2e, 0xa1, 0x66, 0x28, 0xd9, 0x24, 0xb2,
-                0x76, 0x5b, 0xa2, 0x49, 0x6d, 0x8b, 0xd1, 0x25,
-                0x72, 0xf8, 0xf6, 0x64, 0x86, 0x68, 0x98, 0x16,
-                0xd4, 0xa4, 0x5c, 0xcc, 0x5d, 0x65, 0xb6, 0x92,
-                0x6c, 0x70, 0x48, 0x50, 0xfd, 0xed, 0xb9, 0xda,
-                0x5e, 0x15, 0x46, 0x57, 0xa7, 0x8d, 0x9d, 0x84,
-                0x90, 0xd8, 0xab, 0x00, 0x8c, 0xbc, 0xd3, 0x0a,
-                0xf7, 0xe4, 0x58, 0x05, 0xb8, 0xb3, 0x45, 0x06,
-                0xd0, 0x2c, 0x1e, 0x8f, 0xca, 0x3f, 0x0f, 0x02,
-                0xc1, 0xaf, 0xbd, 0x03, 0x01, 0x13, 0x8a, 0x6b,
-                0x3a, 0x91, 0x11, 0x41, 0x4f, 0x67, 0xdc, 0xea,
-                0x97, 0xf2, 0xcf, 0xce, 0xf0, 0xb4, 0xe6, 0x73,
-                0x96, 0xac, 0x74, 0x22, 0xe7, 0xad, 0x35, 0x85,
-                0xe2, 0xf9, 0x37, 0xe8, 0x1c, 0x75, 0xdf, 0x6e,
-                0x47, 0xf1, 0x1a, 0x71, 0x1d, 0x29, 0xc5, 0x89,
-                0x6f, 0xb7, 0x62, 0x0e, 0xaa, 0x18, 0xbe, 0x1b,
-                0xfc, 0x56, 0x3e, 0x4b, 0xc6, 0xd2, 0x79, 0x20,
-                0x9a, 0xdb, 0xc0, 0xfe, 0x78, 0xcd, 0x5a, 0xf4,
-                0x1f, 0xdd, 0xa8, 0x33, 0x88, 0x07, 0xc7, 0x31,
-                0xb1, 0x12, 0x10, 0x59, 0x27, 0x80, 0xec, 0x5f,
-                0x60, 0x51, 0x7f, 0xa9, 0x19, 0xb5, 0x4a, 0x0d,
-                0x2d, 0xe5, 0x7a, 0x9f, 0x93, 0xc9, 0x9c, 0xef,
-                0xa0, 0xe0, 0x3b, 0x4d, 0xae, 0x2a, 0xf5, 0xb0,
-                0xc8, 0xeb, 0xbb, 0x3c, 0x83, 0x53, 0x99, 0x61,
-                0x17, 0x2b, 0x04, 0x7e, 0xba, 0x77, 0xd6, 0x26,
-                0xe1, 0x69, 0x14, 0x63, 0x55, 0x21, 0x0c, 0x7d]
+    sbox = SBOX
+    inv_sbox = INV_SBOX
+
+
+    # NIST SP 800-38A ECB test vectors as (title, key, plaintext,
+    # ciphertext) used to test the different engines.
+    NIST_TEST_VECTORS = [
+        ("NIST AES-128 test 0.",
+         (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c),
+         (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a),
+         (0x3ad77bb4, 0x0d7a3660, 0xa89ecaf3, 0x2466ef97)),
+        ("NIST AES-128 test 1.",
+         (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c),
+         (0xae2d8a57, 0x1e03ac9c, 0x9eb76fac, 0x45af8e51),
+         (0xf5d3d585, 0x03b9699d, 0xe785895a, 0x96fdbaaf)),
+        ("NIST AES-128 test 2.",
+         (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c),
+         (0x30c81c46, 0xa35ce411, 0xe5fbc119, 0x1a0a52ef),
+         (0x43b1cd7f, 0x598ece23, 0x881b00e3, 0xed030688)),
+        ("NIST AES-128 test 3.",
+         (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c),
+         (0xf69f2445, 0xdf4f9b17, 0xad2b417b, 0xe66c3710),
+         (0x7b0c785e, 0x27e8ad3f, 0x82232071, 0x04725dd4)),
+        ("NIST AES-256 test 0.",
+         (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+          0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4),
+         (0x6bc1bee2, 0x2e409f96, 0xe93d7e11, 0x7393172a),
+         (0xf3eed1bd, 0xb5d2a03c, 0x064b5a7e, 0x3db181f8)),
+        ("NIST AES-256 test 1.",
+         (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+          0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4),
+         (0xae2d8a57, 0x1e03ac9c, 0x9eb76fac, 0x45af8e51),
+         (0x591ccb10, 0xd410ed26, 0xdc5ba74a, 0x31362870)),
+        ("NIST AES-256 test 2.",
+         (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+          0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4),
+         (0x30c81c46, 0xa35ce411, 0xe5fbc119, 0x1a0a52ef),
+         (0xb6ed21b9, 0x9ca6f4f9, 0xf153e7b1, 0xbeafed1d)),
+        ("NIST AES-256 test 3.",
+         (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+          0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4),
+         (0xf69f2445, 0xdf4f9b17, 0xad2b417b, 0xe66c3710),
+         (0x23304b7a, 0x39f9f3ff, 0x067d8d8f, 0x9e24ecc7))]
+
+
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, verbose = True, dump_vars = True, key_cache = None,
+                 trace_hook = None, wide_sbox = False):
+        self.VERBOSE = verbose
+        self.DUMP_VARS = dump_vars
+
+        # Substitute words in SubBytes and InvSubBytes with the 16
+        # bit wide S-box tables. The table based key expansion has
+        # its own tables and does not use them.
+        self.wide_sbox = wide_sbox
+
+        # Without a given trace hook the verbose and dump_vars
+        # flags select a hook that prints the trace.
+        if trace_hook is None and (verbose or dump_vars):
+            trace_hook = PrintTraceHook(verbose, dump_vars)
+        self.trace_hook = trace_hook
+
+        # Unless given a cache, all instances share the module cache.
+        if key_cache is None:
+            key_cache = KEY_CACHE
+        self.key_cache = key_cache
 
 
     #-------------------------------------------------------------------
+    # set_trace_hook()
+    #
+    # Set the trace hook called with trace events from the round
+    # functions and key expansion. The hook is called as
+    # hook(round, step, words) where round is the round index, or
+    # None for events from helper functions, step is the name of
+    # the step and words is a tuple with the resulting 32 bit words.
+    # Setting the hook to None turns off all tracing.
     #-------------------------------------------------------------------
-    def __init__(self, verbose = True, dump_vars = True):
-        self.VERBOSE = verbose
-        self.DUMP_VARS = dump_vars
+    def set_trace_hook(self, trace_hook):
+        self.trace_hook = trace_hook
 
 
     #-------------------------------------------------------------------
@@ -219,7 +367,7 @@ class AES():
     # The specific Galois Multiplication by two for a given byte.
     #-------------------------------------------------------------------
     def gm2(self, b):
-        return ((b << 1) ^ (0x1b & ((b >> 7) * 0xff))) & 0xff
+        return GM2[b]
 
 
     #-------------------------------------------------------------------
@@ -228,7 +376,7 @@ class AES():
     # The specific Galois Multiplication by three for a given byte.
     #-------------------------------------------------------------------
     def gm3(self, b):
-        return self.gm2(b) ^ b
+        return GM3[b]
 
 
     #-------------------------------------------------------------------
@@ -237,7 +385,7 @@ class AES():
     # The specific Galois Multiplication by four for a given byte.
     #-------------------------------------------------------------------
     def gm4(self, b):
-        return self.gm2(self.gm2(b))
+        return GM4[b]
 
 
     #-------------------------------------------------------------------
@@ -246,7 +394,7 @@ class AES():
     # The specific Galois Multiplication by eight for a given byte.
     #-------------------------------------------------------------------
     def gm8(self, b):
-        return self.gm2(self.gm4(b))
+        return GM8[b]
 
 
     #-------------------------------------------------------------------
@@ -255,7 +403,7 @@ class AES():
     # The specific Galois Multiplication by nine for a given byte.
     #-------------------------------------------------------------------
     def gm09(self, b):
-        return self.gm8(b) ^ b
+        return GM09[b]
 
 
     #-------------------------------------------------------------------
@@ -264,7 +412,7 @@ class AES():
     # The specific Galois Multiplication by 11 for a given byte.
     #-------------------------------------------------------------------
     def gm11(self, b):
-        return self.gm8(b) ^ self.gm2(b) ^ b
+        return GM11[b]
 
 
     #-------------------------------------------------------------------
@@ -273,7 +421,7 @@ class AES():
     # The specific Galois Multiplication by 13 for a given byte.
     #-------------------------------------------------------------------
     def gm13(self, b):
-        return self.gm8(b) ^ self.gm4(b) ^ b
+        return GM13[b]
 
 
     #-------------------------------------------------------------------
@@ -282,7 +430,7 @@ class AES():
     # The specific Galois Multiplication by 14 for a given byte.
     #-------------------------------------------------------------------
     def gm14(self, b):
-        return self.gm8(b) ^ self.gm4(b) ^ self.gm2(b)
+        return GM14[b]
 
 
     #-------------------------------------------------------------------
@@ -292,20 +440,18 @@ class AES():
     # given 32-bit word has been used as lookup into the AES S-box.
     #-------------------------------------------------------------------
     def substw(self, w):
-        (b0, b1, b2, b3) = self.w2b(w)
-        s0 = self.sbox[b0]
-        s1 = self.sbox[b1]
-        s2 = self.sbox[b2]
-        s3 = self.sbox[b3]
-        res = self.b2w(s0, s1, s2, s3)
-
-        if (self.VERBOSE):
-            print("Inside substw:")
-            print("b0 = 0x%02x, b1 = 0x%02x, b2 = 0x%02x, b3 = 0x%02x" %
-                  (b0, b1, b2, b3))
-            print("s0 = 0x%02x, s1 = 0x%02x, s2 = 0x%02x, s3 = 0x%02x" %
-                  (s0, s1, s2, s3))
-            print("res = 0x%08x" % (res))
+        if self.wide_sbox:
+            res = WIDE_SBOX.substw(w)
+        else:
+            (b0, b1, b2, b3) = self.w2b(w)
+            s0 = self.sbox[b0]
+            s1 = self.sbox[b1]
+            s2 = self.sbox[b2]
+            s3 = self.sbox[b3]
+            res = self.b2w(s0, s1, s2, s3)
+
+        if self.trace_hook is not None:
+            self.trace_hook(None, "substw", (w, res))
         return res
 
 
@@ -317,20 +463,18 @@ class AES():
     # the inverse AES S-box.
     #-------------------------------------------------------------------
     def inv_substw(self, w):
-        (b0, b1, b2, b3) = self.w2b(w)
-        s0 = self.inv_sbox[b0]
-        s1 = self.inv_sbox[b1]
-        s2 = self.inv_sbox[b2]
-        s3 = self.inv_sbox[b3]
-        res = self.b2w(s0, s1, s2, s3)
-
-        if (self.VERBOSE):
-            print("Inside inv_substw:")
-            print("b0 = 0x%02x, b1 = 0x%02x, b2 = 0x%02x, b3 = 0x%02x" %
-                (b0, b1, b2, b3))
-            print("s0 = 0x%02x, s1 = 0x%02x, s2 = 0x%02x, s3 = 0x%02x" %
-                (s0, s1, s2, s3))
-            print("res = 0x%08x" % (res))
+        if self.wide_sbox:
+            res = WIDE_INV_SBOX.substw(w)
+        else:
+            (b0, b1, b2, b3) = self.w2b(w)
+            s0 = self.inv_sbox[b0]
+            s1 = self.inv_sbox[b1]
+            s2 = self.inv_sbox[b2]
+            s3 = self.inv_sbox[b3]
+            res = self.b2w(s0, s1, s2, s3)
+
+        if self.trace_hook is not None:
+            self.trace_hook(None, "inv_substw", (w, res))
         return res
 
 
@@ -361,24 +505,20 @@ class AES():
         k2 = w2 ^ w1 ^ w0 ^ t
         k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
 
-        if (self.VERBOSE):
-            print("Inside next 128bit key:")
-            print("w0 = 0x%08x, w1 = 0x%08x, w2 = 0x%08x, w3 = 0x%08x" %
-                  (w0, w1, w2, w3))
-            print("rol = 0x%08x, subst = 0x%08x, rcon = 0x%02x, t = 0x%08x" %
-                  (rol, subst, rcon, t))
-            print("k0 = 0x%08x, k1 = 0x%08x, k2 = 0x%08x, k3 = 0x%08x" %
-                  (k0, k1, k2, k3))
+        if self.trace_hook is not None:
+            self.trace_hook(None, "next_128bit_key", (t, k0, k1, k2, k3))
         return (k0, k1, k2, k3)
 
 
     #-------------------------------------------------------------------
     # key_gen128()
     #
-    # Generating the keys for 128 bit keys.
+    # Generating the keys for 128 bit keys. Without a trace hook
+    # the table based key expansion is used.
     #-------------------------------------------------------------------
     def key_gen128(self, key):
-        print("Doing the 128 bit key expansion")
+        if self.trace_hook is None:
+            return key_schedule(key)
 
         round_keys = []
         round_keys.append(key)
@@ -386,15 +526,8 @@ class AES():
         for i in range(10):
             round_keys.append(self.next_128bit_key(round_keys[i], self.get_rcon(i + 1)))
 
-        if (self.VERBOSE):
-            print("Input key:")
-            self.print_block(key)
-            print("")
-
-            print("Generated keys:")
-            for k in round_keys:
-                self.print_block(k)
-            print("")
+        for i in range(len(round_keys)):
+            self.trace_hook(i, "round_key", tuple(round_keys[i]))
 
         return round_keys
 
@@ -418,13 +551,8 @@ class AES():
         k2 = w2 ^ w1 ^ w0 ^ t
         k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
 
-        if (self.DUMP_VARS):
-            print("next_256bit_key_a:")
-            print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-            print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-            print("t = 0x%08x, sw = 0x%08x, rw = 0x%08x" % (t, sw, rw))
-            print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
-            print("")
+        if self.trace_hook is not None:
+            self.trace_hook(None, "next_256bit_key_a", (t, k0, k1, k2, k3))
 
         return (k0, k1, k2, k3)
 
@@ -446,13 +574,8 @@ class AES():
         k2 = w2 ^ w1 ^ w0 ^ t
         k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
 
-        if (self.DUMP_VARS):
-            print("next_256bit_key_b:")
-            print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-            print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-            print("t = 0x%08x" % (t))
-            print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
-            print("")
+        if self.trace_hook is not None:
+            self.trace_hook(None, "next_256bit_key_b", (t, k0, k1, k2, k3))
 
         return (k0, k1, k2, k3)
 
@@ -460,9 +583,13 @@ class AES():
     #-------------------------------------------------------------------
     # key_gen256()
     #
-    # Generating the keys for 256 bit keys.
+    # Generating the keys for 256 bit keys. Without a trace hook
+    # the table based key expansion is used.
     #-------------------------------------------------------------------
     def key_gen256(self, key):
+        if self.trace_hook is None:
+            return key_schedule(key)
+
         round_keys = []
         (k0, k1, k2, k3, k4, k5, k6, k7) = key
 
@@ -481,16 +608,8 @@ class AES():
         k = self.next_256it_key_a(round_keys[12], round_keys[13], self.get_rcon(7))
         round_keys.append(k)
 
-        if (self.VERBOSE):
-            print("Input key:")
-            self.print_block((k0, k1, k2, k3))
-            self.print_block((k4, k5, k6, k7))
-            print("")
-
-            print("Generated keys:")
-            for k in round_keys:
-                self.print_block(k)
-            print("")
+        for i in range(len(round_keys)):
+            self.trace_hook(i, "round_key", round_keys[i])
 
         return round_keys
 
@@ -498,16 +617,10 @@ class AES():
     #-------------------------------------------------------------------
     # get_rcon()
     #
-    # Function implementation of rcon. Calculates rcon for a
-    # given round. This could be implemented as an iterator.
+    # Returns rcon for the given round from the precomputed table.
     #-------------------------------------------------------------------
     def get_rcon(self, round):
-        rcon = 0x8d
-
-        for i in range(0, round):
-            rcon = ((rcon << 1) ^ (0x11b & - (rcon >> 7))) & 0xff
-
-        return rcon
+        return get_rcon(round)
 
 
     #-------------------------------------------------------------------
@@ -522,30 +635,17 @@ class AES():
 
         res_block = (w0 ^ k0, w1 ^ k1, w2 ^ k2, w3 ^ k3)
 
-        if (self.VERBOSE):
-            print("AddRoundKey key, block in and block out:")
-            self.print_block(key)
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
     #-------------------------------------------------------------------
     # mixw()
     #
-    # Perform bit mixing of the given words.
+    # Perform bit mixing of the given words. Uses the word
+    # parallel mix_word().
     #-------------------------------------------------------------------
     def mixw(self, w):
-        (b0, b1, b2, b3) = self.w2b(w)
-
-        mb0 = self.gm2(b0) ^ self.gm3(b1) ^ b2           ^ b3
-        mb1 = b0           ^ self.gm2(b1) ^ self.gm3(b2) ^ b3
-        mb2 = b0           ^ b1           ^ self.gm2(b2) ^ self.gm3(b3)
-        mb3 = self.gm3(b0) ^ b1           ^ b2           ^ self.gm2(b3)
-
-        return self.b2w(mb0, mb1, mb2, mb3)
+        return mix_word(w)
 
 
     #-------------------------------------------------------------------
@@ -556,19 +656,13 @@ class AES():
     def mixcolumns(self, block):
         (c0, c1, c2, c3) = block
 
-        mc0 = self.mixw(c0)
-        mc1 = self.mixw(c1)
-        mc2 = self.mixw(c2)
-        mc3 = self.mixw(c3)
+        mc0 = mix_word(c0)
+        mc1 = mix_word(c1)
+        mc2 = mix_word(c2)
+        mc3 = mix_word(c3)
 
         res_block = (mc0, mc1, mc2, mc3)
 
-        if (self.VERBOSE):
-            print("MixColumns block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -583,12 +677,6 @@ class AES():
         res_block = (self.substw(w0), self.substw(w1),
                     self.substw(w2), self.substw(w3))
 
-        if (self.VERBOSE):
-            print("SubBytes block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -612,12 +700,6 @@ class AES():
 
         res_block = (ws0, ws1, ws2, ws3)
 
-        if (self.VERBOSE):
-            print("ShiftRows block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -631,52 +713,258 @@ class AES():
         tmp_block = block[:]
 
         # Get round keys based on the given key.
+        round_keys = self.key_gen(key)
         if len(key) == 4:
-            round_keys = self.key_gen128(key)
             num_rounds = self.AES_128_ROUNDS
         else:
-            round_keys = self.key_gen256(key)
             num_rounds = self.AES_256_ROUNDS
 
+        trace = self.trace_hook
+
         # Init round
-        print("  Initial AddRoundKeys round.")
         tmp_block4 = self.addroundkey(round_keys[0], block)
+        if trace is not None:
+            trace(0, "input", tuple(block))
+            trace(0, "addroundkey", tmp_block4)
 
         # Main rounds
         for i in range(1 , (num_rounds)):
-            print("")
-            print("  Round %02d" % i)
-            print("  ---------")
-
             tmp_block1 = self.subbytes(tmp_block4)
             tmp_block2 = self.shiftrows(tmp_block1)
             tmp_block3 = self.mixcolumns(tmp_block2)
             tmp_block4 = self.addroundkey(round_keys[i], tmp_block3)
 
+            if trace is not None:
+                trace(i, "subbytes", tmp_block1)
+                trace(i, "shiftrows", tmp_block2)
+                trace(i, "mixcolumns", tmp_block3)
+                trace(i, "addroundkey", tmp_block4)
 
         # Final round
-        print("  Final round.")
         tmp_block1 = self.subbytes(tmp_block4)
         tmp_block2 = self.shiftrows(tmp_block1)
         tmp_block3 = self.addroundkey(round_keys[num_rounds], tmp_block2)
+        if trace is not None:
+            trace(num_rounds, "subbytes", tmp_block1)
+            trace(num_rounds, "shiftrows", tmp_block2)
+            trace(num_rounds, "addroundkey", tmp_block3)
 
         return tmp_block3
 
 
     #-------------------------------------------------------------------
-    # inv_mixw()
+    # next_otf_key()
     #
-    # Perform inverse bit mixing of the given words.
+    # Generate the round key for round i from the previous round
+    # keys in the given key window. Returns the new window with the
+    # round key for round i as the last element. For AES-128 the
+    # window is the previous round key, for AES-256 the previous
+    # two round keys.
     #-------------------------------------------------------------------
-    def inv_mixw(self, w):
-        (b0, b1, b2, b3) = self.w2b(w)
+    def next_otf_key(self, i, key, key_window):
+        if len(key) == 4:
+            return (self.next_128bit_key(key_window[-1], self.get_rcon(i)),)
+
+        if i == 1:
+            return (key_window[-1], tuple(key[4 : 8]))
+
+        if i % 2 == 0:
+            k = self.next_256it_key_a(key_window[0], key_window[1], self.get_rcon(i // 2))
+        else:
+            k = self.next_256it_key_b(key_window[0], key_window[1])
+        return (key_window[1], k)
+
+
+    #-------------------------------------------------------------------
+    # aes_encipher_block_otf()
+    #
+    # Perform AES encipher operation for the given block using the
+    # given key, with the round keys generated on the fly as in the
+    # on-the-fly-keygen branch of the core. Each round key is
+    # generated from the previous ones in the round loop and no key
+    # schedule is stored. Only encipher is supported.
+    #-------------------------------------------------------------------
+    def aes_encipher_block_otf(self, key, block):
+        if len(key) == 4:
+            num_rounds = self.AES_128_ROUNDS
+        else:
+            num_rounds = self.AES_256_ROUNDS
+
+        trace = self.trace_hook
+        key_window = (tuple(key[0 : 4]),)
+
+        # Init round
+        tmp_block4 = self.addroundkey(key_window[-1], block)
+        if trace is not None:
+            trace(0, "input", tuple(block))
+            trace(0, "round_key", key_window[-1])
+            trace(0, "addroundkey", tmp_block4)
+
+        # Main rounds
+        for i in range(1 , (num_rounds)):
+            key_window = self.next_otf_key(i, key, key_window)
+            tmp_block1 = self.subbytes(tmp_block4)
+            tmp_block2 = self.shiftrows(tmp_block1)
+            tmp_block3 = self.mixcolumns(tmp_block2)
+            tmp_block4 = self.addroundkey(key_window[-1], tmp_block3)
+
+            if trace is not None:
+                trace(i, "round_key", key_window[-1])
+                trace(i, "subbytes", tmp_block1)
+                trace(i, "shiftrows", tmp_block2)
+                trace(i, "mixcolumns", tmp_block3)
+                trace(i, "addroundkey", tmp_block4)
+
+        # Final round
+        key_window = self.next_otf_key(num_rounds, key, key_window)
+        tmp_block1 = self.subbytes(tmp_block4)
+        tmp_block2 = self.shiftrows(tmp_block1)
+        tmp_block3 = self.addroundkey(key_window[-1], tmp_block2)
+        if trace is not None:
+            trace(num_rounds, "round_key", key_window[-1])
+            trace(num_rounds, "subbytes", tmp_block1)
+            trace(num_rounds, "shiftrows", tmp_block2)
+            trace(num_rounds, "addroundkey", tmp_block3)
+
+        return tmp_block3
+
+
+    #-------------------------------------------------------------------
+    # key_gen()
+    #
+    # Get the round keys for the given 128 or 256 bit key. The
+    # round keys are looked up in the key schedule cache and are
+    # only generated if the key is not in the cache. With a trace
+    # hook the cache is bypassed so that the key expansion is
+    # always traced.
+    #-------------------------------------------------------------------
+    def key_gen(self, key):
+        if self.trace_hook is not None:
+            return self.expand_key(key)
+        return self.key_cache.lookup(key, self.expand_key)
+
+
+    #-------------------------------------------------------------------
+    # expand_key()
+    #
+    # Generate the round keys for the given 128 or 256 bit key.
+    #-------------------------------------------------------------------
+    def expand_key(self, key):
+        if len(key) == 4:
+            return self.key_gen128(key)
+        else:
+            return self.key_gen256(key)
+
+
+    #-------------------------------------------------------------------
+    # ttable_encipher()
+    #
+    # Perform the AES encipher rounds on the given block using the
+    # given flat round key words and the T-table engine.
+    #-------------------------------------------------------------------
+    def ttable_encipher(self, rk, block):
+        return ttable_encipher_words(rk, len(rk) // 4 - 1, block)
+
+
+    #-------------------------------------------------------------------
+    # equivalent_inverse_keys()
+    #
+    # Generate the decipher round keys for the equivalent inverse
+    # cipher (FIPS-197 5.3.5) from the given round keys. The round
+    # keys are used in reverse order and all keys except the first
+    # and last have been transformed by InvMixColumns.
+    #-------------------------------------------------------------------
+    def equivalent_inverse_keys(self, round_keys):
+        num_rounds = len(round_keys) - 1
+        dec_keys = [tuple(round_keys[num_rounds])]
+
+        for i in range(num_rounds - 1, 0, -1):
+            (k0, k1, k2, k3) = round_keys[i]
+            dec_keys.append((self.inv_mixw(k0), self.inv_mixw(k1),
+                             self.inv_mixw(k2), self.inv_mixw(k3)))
+
+        dec_keys.append(tuple(round_keys[0]))
+        return dec_keys
 
-        mb0 = self.gm14(b0) ^ self.gm11(b1) ^ self.gm13(b2) ^ self.gm09(b3)
-        mb1 = self.gm09(b0) ^ self.gm14(b1) ^ self.gm11(b2) ^ self.gm13(b3)
-        mb2 = self.gm13(b0) ^ self.gm09(b1) ^ self.gm14(b2) ^ self.gm11(b3)
-        mb3 = self.gm11(b0) ^ self.gm13(b1) ^ self.gm09(b2) ^ self.gm14(b3)
 
-        return self.b2w(mb0, mb1, mb2, mb3)
+    #-------------------------------------------------------------------
+    # ttable_decipher()
+    #
+    # Perform the AES decipher rounds on the given block using the
+    # given flat equivalent inverse round key words and the
+    # Td-table engine.
+    #-------------------------------------------------------------------
+    def ttable_decipher(self, dk, block):
+        return ttable_decipher_words(dk, len(dk) // 4 - 1, block)
+
+
+    #-------------------------------------------------------------------
+    # ttable_key_gen()
+    #
+    # Generate the flat encipher round key words and the flat
+    # equivalent inverse round key words for the given key.
+    #-------------------------------------------------------------------
+    def ttable_key_gen(self, key):
+        enc_keys = self.key_gen(key)
+        return ([w for k in enc_keys for w in k],
+                [w for k in self.equivalent_inverse_keys(enc_keys) for w in k])
+
+
+    #-------------------------------------------------------------------
+    # ttable_keys()
+    #
+    # Return the flat round key words for the T-table engine. The
+    # words are kept in TTABLE_KEY_CACHE so that the flattening
+    # and InvMixColumns of the decipher keys are done once per key.
+    # As in key_gen() the cache is bypassed with a trace hook so
+    # that the key expansion is always traced.
+    #-------------------------------------------------------------------
+    def ttable_keys(self, key):
+        if self.trace_hook is not None:
+            return self.ttable_key_gen(key)
+        return TTABLE_KEY_CACHE.lookup(key, self.ttable_key_gen)
+
+
+    #-------------------------------------------------------------------
+    # ttable_decipher_block()
+    #
+    # Perform AES decipher operation for the given block using the
+    # given key and the Td-table engine.
+    #-------------------------------------------------------------------
+    def ttable_decipher_block(self, key, block):
+        (rk, dk) = self.ttable_keys(key)
+        return self.ttable_decipher(dk, block)
+
+
+    #-------------------------------------------------------------------
+    # ttable_encipher_block()
+    #
+    # Perform AES encipher operation for the given block using the
+    # given key and the T-table engine.
+    #-------------------------------------------------------------------
+    def ttable_encipher_block(self, key, block):
+        (rk, dk) = self.ttable_keys(key)
+        return self.ttable_encipher(rk, block)
+
+
+    #-------------------------------------------------------------------
+    # prepare()
+    #
+    # Expand the given key once and return a prepared key object
+    # that can be used to encipher and decipher many blocks.
+    #-------------------------------------------------------------------
+    def prepare(self, key):
+        return AESKey(self, key)
+
+
+    #-------------------------------------------------------------------
+    # inv_mixw()
+    #
+    # Perform inverse bit mixing of the given words. Uses the word
+    # parallel inv_mix_word().
+    #-------------------------------------------------------------------
+    def inv_mixw(self, w):
+        return inv_mix_word(w)
 
 
     #-------------------------------------------------------------------
@@ -687,19 +975,13 @@ class AES():
     def inv_mixcolumns(self, block):
         (c0, c1, c2, c3) = block
 
-        mc0 = self.inv_mixw(c0)
-        mc1 = self.inv_mixw(c1)
-        mc2 = self.inv_mixw(c2)
-        mc3 = self.inv_mixw(c3)
+        mc0 = inv_mix_word(c0)
+        mc1 = inv_mix_word(c1)
+        mc2 = inv_mix_word(c2)
+        mc3 = inv_mix_word(c3)
 
         res_block = (mc0, mc1, mc2, mc3)
 
-        if (self.VERBOSE):
-            print("Inverse MixColumns block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -723,12 +1005,6 @@ class AES():
 
         res_block = (ws0, ws1, ws2, ws3)
 
-        if (self.VERBOSE):
-            print("Inverse ShiftRows block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -743,12 +1019,6 @@ class AES():
         res_block = (self.inv_substw(w0), self.inv_substw(w1),
                      self.inv_substw(w2), self.inv_substw(w3))
 
-        if (self.VERBOSE):
-            print("Inverse SubBytes block in and block out:")
-            self.print_block(block)
-            self.print_block(res_block)
-            print("")
-
         return res_block
 
 
@@ -762,37 +1032,138 @@ class AES():
         tmp_block = block[:]
 
         # Get round keys based on the given key.
+        round_keys = self.key_gen(key)
         if len(key) == 4:
-            round_keys = self.key_gen128(key)
             num_rounds = self.AES_128_ROUNDS
         else:
-            round_keys = self.key_gen256(key)
             num_rounds = self.AES_256_ROUNDS
 
-            # Initial round
-        print("  Initial, partial round.")
+        trace = self.trace_hook
+
+        # Initial round
         tmp_block1 = self.addroundkey(round_keys[len(round_keys) - 1], tmp_block)
         tmp_block2 = self.inv_shiftrows(tmp_block1)
         tmp_block4 = self.inv_subbytes(tmp_block2)
+        if trace is not None:
+            trace(0, "input", tuple(block))
+            trace(0, "addroundkey", tmp_block1)
+            trace(0, "inv_shiftrows", tmp_block2)
+            trace(0, "inv_subbytes", tmp_block4)
 
         # Main rounds
         for i in range(1 , (num_rounds)):
-            print("")
-            print("  Round %02d" % i)
-            print("  ---------")
-
             tmp_block1 = self.addroundkey(round_keys[(len(round_keys) - i - 1)], tmp_block4)
             tmp_block2 = self.inv_mixcolumns(tmp_block1)
             tmp_block3 = self.inv_shiftrows(tmp_block2)
             tmp_block4 = self.inv_subbytes(tmp_block3)
 
+            if trace is not None:
+                trace(i, "addroundkey", tmp_block1)
+                trace(i, "inv_mixcolumns", tmp_block2)
+                trace(i, "inv_shiftrows", tmp_block3)
+                trace(i, "inv_subbytes", tmp_block4)
+
         # Final round
-        print("  Final AddRoundKeys round.")
         res_block = self.addroundkey(round_keys[0], tmp_block4)
+        if trace is not None:
+            trace(num_rounds, "addroundkey", res_block)
 
         return res_block
 
 
+    #-------------------------------------------------------------------
+    # final_key_window()
+    #
+    # Returns the last Nk words of the key schedule for the given
+    # key, i.e. the final round key and for AES-256 also the round
+    # key before it. The words are cached per key in the final key
+    # cache.
+    #-------------------------------------------------------------------
+    def final_key_window(self, key):
+        nk = len(key)
+        return FINAL_KEY_CACHE.lookup(key, lambda k: [expand_key(k)[-nk :]])[0]
+
+
+    #-------------------------------------------------------------------
+    # reverse_key_words()
+    #
+    # Run the key schedule backwards four words. The given window
+    # holds the Nk key words W[s] .. W[s + Nk - 1] and the window
+    # for W[s - 4] .. W[s + Nk - 5] is returned. Each word is given
+    # by W[i - Nk] = W[i] ^ f(W[i - 1]) where f is the same
+    # function as in the forward key schedule.
+    #-------------------------------------------------------------------
+    def reverse_key_words(self, s, key_window):
+        nk = len(key_window)
+        w = list(key_window)
+
+        for i in range(s + nk - 1, s + nk - 5, -1):
+            t = w[nk - 2]
+            if i % nk == 0:
+                t = self.substw(self.rolx(t, 8)) ^ (self.get_rcon(i // nk) << 24)
+            elif nk == 8 and i % nk == 4:
+                t = self.substw(t)
+            w = [w[nk - 1] ^ t] + w[: nk - 1]
+
+        return tuple(w)
+
+
+    #-------------------------------------------------------------------
+    # aes_decipher_block_otf()
+    #
+    # Perform AES decipher operation for the given block using the
+    # given key, with the round keys generated on the fly by running
+    # the key schedule backwards from the final round key. Only the
+    # last Nk key words are kept, not the whole schedule.
+    #-------------------------------------------------------------------
+    def aes_decipher_block_otf(self, key, block):
+        if len(key) == 4:
+            num_rounds = self.AES_128_ROUNDS
+        else:
+            num_rounds = self.AES_256_ROUNDS
+
+        trace = self.trace_hook
+        key_window = self.final_key_window(key)
+        s = 4 * (num_rounds + 1) - len(key)
+
+        # Initial round
+        round_key = key_window[4 * num_rounds - s : 4 * num_rounds - s + 4]
+        tmp_block1 = self.addroundkey(round_key, block)
+        tmp_block2 = self.inv_shiftrows(tmp_block1)
+        tmp_block4 = self.inv_subbytes(tmp_block2)
+        if trace is not None:
+            trace(0, "input", tuple(block))
+            trace(0, "round_key", round_key)
+            trace(0, "addroundkey", tmp_block1)
+            trace(0, "inv_shiftrows", tmp_block2)
+            trace(0, "inv_subbytes", tmp_block4)
+
+        # Main rounds
+        for i in range(1 , (num_rounds + 1)):
+            r = num_rounds - i
+            while s > 4 * r:
+                key_window = self.reverse_key_words(s, key_window)
+                s -= 4
+            round_key = key_window[4 * r - s : 4 * r - s + 4]
+            tmp_block1 = self.addroundkey(round_key, tmp_block4)
+            if trace is not None:
+                trace(i, "round_key", round_key)
+                trace(i, "addroundkey", tmp_block1)
+
+            # The final round is only AddRoundKey.
+            if i == num_rounds:
+                return tmp_block1
+
+            tmp_block2 = self.inv_mixcolumns(tmp_block1)
+            tmp_block3 = self.inv_shiftrows(tmp_block2)
+            tmp_block4 = self.inv_subbytes(tmp_block3)
+
+            if trace is not None:
+                trace(i, "inv_mixcolumns", tmp_block2)
+                trace(i, "inv_shiftrows", tmp_block3)
+                trace(i, "inv_subbytes", tmp_block4)
+
+
     #-------------------------------------------------------------------
     # test_mixcolumns()
     #
@@ -818,20 +1189,504 @@ class AES():
 
 
     #-------------------------------------------------------------------
-    # single_aes_test()
+    # test_gm_tables()
     #
-    # Perform a single AES operation and check result
+    # Test the Galois Multiplication tables against multiplication
+    # by repeated doubling, and mixw and inv_mixw with a known
+    # column.
     #-------------------------------------------------------------------
-    def single_aes_test(self, title, encdec, key, block, expected):
-        print(title)
-        self.print_key(key)
-        self.print_block(block)
-
-        if encdec == "encipher":
-            result = self.aes_encipher_block(key, block)
-        else:
-            result = self.aes_decipher_block(key, block)
-        return self.check_block(result, expected)
+    def test_gm_tables(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   Galois Multiplication table tests")
+        print("   =================================")
+        for b in range(256):
+            x2 = ((b << 1) ^ (0x1b & ((b >> 7) * 0xff))) & 0xff
+            x4 = ((x2 << 1) ^ (0x1b & ((x2 >> 7) * 0xff))) & 0xff
+            x8 = ((x4 << 1) ^ (0x1b & ((x4 >> 7) * 0xff))) & 0xff
+            expected = (x2, x2 ^ b, x4, x8, x8 ^ b, x8 ^ x2 ^ b, x8 ^ x4 ^ b, x8 ^ x4 ^ x2)
+            result = (self.gm2(b), self.gm3(b), self.gm4(b), self.gm8(b),
+                      self.gm09(b), self.gm11(b), self.gm13(b), self.gm14(b))
+            tc += 1
+            if result != expected:
+                print("ERROR. Galois Multiplication of 0x%02x failed." % b)
+                tc_errors += 1
+
+        tc += 2
+        if self.mixw(0xdb135345) != 0x8e4da1bc:
+            print("ERROR. mixw(0xdb135345) = 0x%08x" % self.mixw(0xdb135345))
+            tc_errors += 1
+        if self.inv_mixw(0x8e4da1bc) != 0xdb135345:
+            print("ERROR. inv_mixw(0x8e4da1bc) = 0x%08x" % self.inv_mixw(0x8e4da1bc))
+            tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_swar_mixcolumns()
+    #
+    # Test the word parallel MixColumns and InvMixColumns against
+    # the Galois Multiplication tables. Every byte value is tested
+    # in every row, and the 128 bit versions are tested against
+    # the word versions.
+    #-------------------------------------------------------------------
+    def test_swar_mixcolumns(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   SWAR MixColumns tests")
+        print("   =====================")
+        for i in range(256):
+            w = (i << 24) | (((i * 7) & 0xff) << 16) | (((i * 13 + 5) & 0xff) << 8) | (255 - i)
+            (b0, b1, b2, b3) = (w >> 24, w >> 16 & 0xff, w >> 8 & 0xff, w & 0xff)
+            mix = ((GM2[b0] ^ GM3[b1] ^ b2 ^ b3) << 24 |
+                   (b0 ^ GM2[b1] ^ GM3[b2] ^ b3) << 16 |
+                   (b0 ^ b1 ^ GM2[b2] ^ GM3[b3]) << 8 |
+                   (GM3[b0] ^ b1 ^ b2 ^ GM2[b3]))
+            inv_mix = ((GM14[b0] ^ GM11[b1] ^ GM13[b2] ^ GM09[b3]) << 24 |
+                       (GM09[b0] ^ GM14[b1] ^ GM11[b2] ^ GM13[b3]) << 16 |
+                       (GM13[b0] ^ GM09[b1] ^ GM14[b2] ^ GM11[b3]) << 8 |
+                       (GM11[b0] ^ GM13[b1] ^ GM09[b2] ^ GM14[b3]))
+            tc += 2
+            if mix_word(w) != mix:
+                print("ERROR. mix_word(0x%08x) = 0x%08x, expected 0x%08x" %
+                      (w, mix_word(w), mix))
+                tc_errors += 1
+            if inv_mix_word(w) != inv_mix:
+                print("ERROR. inv_mix_word(0x%08x) = 0x%08x, expected 0x%08x" %
+                      (w, inv_mix_word(w), inv_mix))
+                tc_errors += 1
+
+        for vector in self.NIST_TEST_VECTORS:
+            x = int.from_bytes(BLOCK_STRUCT.pack(*vector[2]), "big")
+            mix = int.from_bytes(BLOCK_STRUCT.pack(*self.mixcolumns(vector[2])), "big")
+            inv_mix = int.from_bytes(BLOCK_STRUCT.pack(*self.inv_mixcolumns(vector[2])), "big")
+            tc += 2
+            if mixcolumns_128(x) != mix:
+                print("ERROR. mixcolumns_128() differs from mix_word().")
+                tc_errors += 1
+            if inv_mixcolumns_128(x) != inv_mix:
+                print("ERROR. inv_mixcolumns_128() differs from inv_mix_word().")
+                tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # single_aes_test()
+    #
+    # Perform a single AES operation and check result
+    #-------------------------------------------------------------------
+    def single_aes_test(self, title, encdec, key, block, expected):
+        print(title)
+        self.print_key(key)
+        self.print_block(block)
+
+        if encdec == "encipher":
+            result = self.aes_encipher_block(key, block)
+        else:
+            result = self.aes_decipher_block(key, block)
+        return self.check_block(result, expected)
+
+
+    #-------------------------------------------------------------------
+    # test_ttable()
+    #
+    # Test the T-table encipher and decipher engines using the NIST
+    # test vectors. The results must also match the results from
+    # the round function based implementation.
+    #-------------------------------------------------------------------
+    def test_ttable(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   AES T-table Encipher tests")
+        print("   ==========================")
+        for (title, key, block, expected) in self.NIST_TEST_VECTORS:
+            print(title)
+            result = self.ttable_encipher_block(key, block)
+            tc_errors += self.check_block(expected, result)
+            tc_errors += self.check_block(self.aes_encipher_block(key, block), result)
+            tc += 2
+
+        print("   AES T-table Decipher tests")
+        print("   ==========================")
+        for (title, key, block, expected) in self.NIST_TEST_VECTORS:
+            print(title)
+            result = self.ttable_decipher_block(key, expected)
+            tc_errors += self.check_block(block, result)
+            tc_errors += self.check_block(self.aes_decipher_block(key, expected), result)
+            tc += 2
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_prepare()
+    #
+    # Test the prepared key object using the NIST test vectors.
+    #-------------------------------------------------------------------
+    def test_prepare(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   AES prepared key tests")
+        print("   ======================")
+        for (title, key, block, expected) in self.NIST_TEST_VECTORS:
+            print(title)
+            prepared_key = self.prepare(key)
+            tc_errors += self.check_block(expected, prepared_key.encrypt_block(block))
+            tc_errors += self.check_block(block, prepared_key.decrypt_block(expected))
+            tc_errors += self.check_block(expected, prepared_key.encrypt_blocks([block])[0])
+            tc_errors += self.check_block(block, prepared_key.decrypt_blocks([expected])[0])
+            tc += 4
+
+        # The flat T-table keys are generated once per key.
+        key = self.NIST_TEST_VECTORS[0][1]
+        aes = AES(verbose = False, dump_vars = False)
+        tc += 1
+        if aes.ttable_keys(key) is not aes.ttable_keys(key):
+            print("ERROR. T-table keys not reused.")
+            tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_key_bank()
+    #
+    # Test the key bank by switching between an AES-128 and an
+    # AES-256 key for every NIST test vector block.
+    #-------------------------------------------------------------------
+    def test_key_bank(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   AES key bank tests")
+        print("   ==================")
+        key_bank = KeyBank(aes = self)
+        vectors128 = [v for v in self.NIST_TEST_VECTORS if len(v[1]) == 4]
+        vectors256 = [v for v in self.NIST_TEST_VECTORS if len(v[1]) == 8]
+        key_bank.load(0, vectors128[0][1])
+        key_bank.load(1, vectors256[0][1])
+
+        for (v128, v256) in zip(vectors128, vectors256):
+            tc += 4
+            tc_errors += self.check_block(v128[3], key_bank.encrypt(0, v128[2]))
+            tc_errors += self.check_block(v256[3], key_bank.encrypt(1, v256[2]))
+            tc_errors += self.check_block(v128[2], key_bank.decrypt(0, v128[3]))
+            tc_errors += self.check_block(v256[2], key_bank.decrypt(1, v256[3]))
+
+        # Reloading a slot evicts the old key.
+        key_bank.load(1, vectors128[0][1])
+        tc += 1
+        tc_errors += self.check_block(vectors128[0][3], key_bank.encrypt(1, vectors128[0][2]))
+
+        tc += 1
+        if (key_bank.loads, key_bank.evictions, key_bank.switches) != (3, 1, 16):
+            print("ERROR. Unexpected key bank counters.")
+            key_bank.print_stats()
+            tc_errors += 1
+
+        key_bank.evict(0)
+        tc += 1
+        try:
+            key_bank.encrypt(0, vectors128[0][2])
+            print("ERROR. Encipher with an empty slot not rejected.")
+            tc_errors += 1
+        except ValueError:
+            pass
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_buffer_api()
+    #
+    # Test the bytes and buffer API of the prepared key object
+    # using the NIST test vectors.
+    #-------------------------------------------------------------------
+    def test_buffer_api(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   AES buffer API tests")
+        print("   ====================")
+        for key_len in (4, 8):
+            vectors = [v for v in self.NIST_TEST_VECTORS if len(v[1]) == key_len]
+            prepared_key = self.prepare(vectors[0][1])
+            plaintext = b"".join([BLOCK_STRUCT.pack(*v[2]) for v in vectors])
+            expected = b"".join([BLOCK_STRUCT.pack(*v[3]) for v in vectors])
+
+            tc += 2
+            if prepared_key.encrypt(plaintext) != expected:
+                print("ERROR. encrypt() of AES-%d vectors failed." % (key_len * 32))
+                tc_errors += 1
+            if prepared_key.decrypt(bytearray(expected)) != plaintext:
+                print("ERROR. decrypt() of AES-%d vectors failed." % (key_len * 32))
+                tc_errors += 1
+
+            # In place processing through memoryviews.
+            buf = bytearray(plaintext)
+            view = memoryview(buf)
+            prepared_key.encrypt_into(view, view)
+            tc += 2
+            if buf != expected:
+                print("ERROR. encrypt_into() of AES-%d vectors failed." % (key_len * 32))
+                tc_errors += 1
+            prepared_key.decrypt_into(view[16:], view[16:])
+            if buf != expected[:16] + plaintext[16:]:
+                print("ERROR. decrypt_into() of AES-%d vectors failed." % (key_len * 32))
+                tc_errors += 1
+
+        tc += 1
+        try:
+            prepared_key.encrypt(bytes(15))
+            print("ERROR. Partial block not rejected.")
+            tc_errors += 1
+        except ValueError:
+            pass
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_wide_sbox()
+    #
+    # Test the wide S-box tables against the byte S-boxes and run
+    # the NIST test vectors with the wide tables in the reference
+    # round functions.
+    #-------------------------------------------------------------------
+    def test_wide_sbox(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   Wide S-box tests")
+        print("   ================")
+        for (wide_sbox, sbox) in ((WIDE_SBOX, self.sbox),
+                                  (WIDE_INV_SBOX, self.inv_sbox)):
+            for i in range(256):
+                w = (i << 24) | (((255 - i) & 0xff) << 16) | (((i * 7) & 0xff) << 8) | (i ^ 0x5a)
+                expected = ((sbox[w >> 24] << 24) | (sbox[w >> 16 & 0xff] << 16) |
+                            (sbox[w >> 8 & 0xff] << 8) | sbox[w & 0xff])
+                tc += 1
+                if wide_sbox.substw(w) != expected:
+                    print("ERROR. Wide substitution of 0x%08x failed." % w)
+                    tc_errors += 1
+            wide_sbox.print_stats()
+
+        wide_aes = AES(verbose = False, dump_vars = False,
+                       key_cache = KeyScheduleCache(), wide_sbox = True)
+        for (title, key, plaintext, expected) in self.NIST_TEST_VECTORS:
+            tc += 2
+            if wide_aes.aes_encipher_block(key, plaintext) != expected:
+                print("ERROR. %s, encipher with wide S-box failed." % title)
+                tc_errors += 1
+            if wide_aes.aes_decipher_block(key, expected) != plaintext:
+                print("ERROR. %s, decipher with wide S-box failed." % title)
+                tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_key_cache()
+    #
+    # Test the key schedule cache. Check that repeated keys are
+    # found in the cache and that the least recently used keys are
+    # evicted when the cache is full.
+    #-------------------------------------------------------------------
+    def test_key_cache(self):
+        tc_errors = 0
+        tc        = 0
+
+        print("   AES key schedule cache tests")
+        print("   ============================")
+        key128 = self.NIST_TEST_VECTORS[0][1]
+        other_key128 = (0x00010203, 0x04050607, 0x08090a0b, 0x0c0d0e0f)
+
+        cache = KeyScheduleCache()
+        first = cache.lookup(key128, self.expand_key)
+        second = cache.lookup(list(key128), self.expand_key)
+        tc += 1
+        if (first is not second) or (cache.hits != 1) or (cache.misses != 1):
+            print("ERROR. Repeated key not found in the cache.")
+            tc_errors += 1
+
+        # Make room for one key only.
+        cache = KeyScheduleCache(cache.size + cache.size // 2)
+        cache.lookup(key128, self.expand_key)
+        cache.lookup(other_key128, self.expand_key)
+        cache.lookup(key128, self.expand_key)
+        tc += 1
+        if (cache.evictions != 2) or (cache.misses != 3) or\
+           (cache.size > cache.max_bytes):
+            print("ERROR. Least recently used key not evicted.")
+            tc_errors += 1
+        cache.print_stats()
+
+        # A cached schedule must give the same result.
+        aes = AES(verbose = self.VERBOSE, dump_vars = self.DUMP_VARS,
+                  key_cache = KeyScheduleCache())
+        for (title, key, block, expected) in self.NIST_TEST_VECTORS:
+            print(title)
+            tc_errors += self.check_block(expected, aes.aes_encipher_block(key, block))
+            tc += 1
+        aes.key_cache.print_stats()
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_trace_hook()
+    #
+    # Test that the trace hook gets the expected events and that
+    # tracing does not change the result.
+    #-------------------------------------------------------------------
+    def test_trace_hook(self):
+        tc_errors = 0
+        tc        = 0
+        events = []
+
+        print("   AES trace hook tests")
+        print("   ====================")
+        (title, key, block, expected) = self.NIST_TEST_VECTORS[0]
+        # The key is in the shared key cache, but with a hook the
+        # round key events must still be generated.
+        AES(verbose = False, dump_vars = False).key_gen(key)
+        aes = AES(verbose = False, dump_vars = False,
+                  trace_hook = lambda r, s, w: events.append((r, s, w)))
+        tc_errors += self.check_block(expected, aes.aes_encipher_block(key, block))
+        tc += 1
+
+        round_events = [e for e in events if e[0] is not None]
+        steps = [e[1] for e in round_events]
+        tc += 1
+        if (steps.count("round_key") != 11) or (steps.count("mixcolumns") != 9) or\
+           (round_events[-1] != (10, "addroundkey", expected)):
+            print("ERROR. Unexpected trace events.")
+            tc_errors += 1
+
+        tc += 1
+        if len([e for e in events if e[1] == "substw"]) != 10 * 4 + 10:
+            print("ERROR. Unexpected number of substw events.")
+            tc_errors += 1
+
+        # The T-table key is cached, but with a hook the round key
+        # events must still be generated.
+        AES(verbose = False, dump_vars = False).ttable_keys(key)
+        del events[:]
+        aes.set_trace_hook(lambda r, s, w: events.append((r, s, w)))
+        aes.prepare(key)
+        tc += 1
+        if [e[1] for e in events].count("round_key") != 11:
+            print("ERROR. Round keys not traced for a cached T-table key.")
+            tc_errors += 1
+
+        # Without a hook no events must be generated.
+        del events[:]
+        aes.set_trace_hook(None)
+        tc_errors += self.check_block(block, aes.aes_decipher_block(key, expected))
+        tc += 2
+        if len(events) != 0:
+            print("ERROR. Trace events generated without a hook.")
+            tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
+
+
+    #-------------------------------------------------------------------
+    # test_otf_encipher()
+    #
+    # Test encipher and decipher with on the fly round key
+    # generation using the NIST test vectors. The round keys in the
+    # trace must be the ones from key expansion, with one round key
+    # per round given before the AddRoundKey of the round.
+    #-------------------------------------------------------------------
+    def test_otf_encipher(self):
+        tc_errors = 0
+        tc        = 0
+        events = []
+
+        print("   AES on the fly key generation tests")
+        print("   ===================================")
+        aes = AES(verbose = False, dump_vars = False)
+        for (title, key, plaintext, expected) in self.NIST_TEST_VECTORS:
+            tc += 2
+            tc_errors += self.check_block(expected, aes.aes_encipher_block_otf(key, plaintext))
+            tc_errors += self.check_block(plaintext, aes.aes_decipher_block_otf(key, expected))
+
+        aes.set_trace_hook(lambda r, s, w: events.append((r, s, w)))
+        for key_len in (4, 8):
+            (title, key, plaintext, expected) =\
+                [v for v in self.NIST_TEST_VECTORS if len(v[1]) == key_len][0]
+            del events[:]
+            aes.aes_encipher_block_otf(key, plaintext)
+            round_events = [e for e in events if e[0] is not None]
+            round_keys = [e[2] for e in round_events if e[1] == "round_key"]
+            order = [(e[0], e[1]) for e in round_events
+                     if e[1] in ("round_key", "addroundkey")]
+            tc += 2
+            if round_keys != [tuple(k) for k in self.expand_key(key)]:
+                print("ERROR. %s, round keys generated on the fly differ." % title)
+                tc_errors += 1
+            if order != [(i, s) for i in range(key_len + 7)
+                         for s in ("round_key", "addroundkey")]:
+                print("ERROR. %s, unexpected order of trace events." % title)
+                tc_errors += 1
+
+            # Decipher gives the round keys in reverse order.
+            del events[:]
+            aes.aes_decipher_block_otf(key, expected)
+            round_keys = [e[2] for e in events if e[1] == "round_key"]
+            tc += 1
+            if round_keys != [tuple(k) for k in self.expand_key(key)][::-1]:
+                print("ERROR. %s, reversed round keys differ." % title)
+                tc_errors += 1
+
+        print("Number of test cases executed: %d" % tc)
+        if (tc_errors == 0):
+            print("All test cases OK.")
+        else:
+            print("Number of failing test cases: %d" % tc_errors)
 
 
     #-------------------------------------------------------------------
@@ -940,6 +1795,576 @@ class AES():
             print("Number of failing test cases: %d" % tc_errors)
 
 
+#-------------------------------------------------------------------
+# gen_te_tables()
+#
+# Generate the encipher T-tables from the given S-box. Te0 holds
+# the column (2s, s, s, 3s) for each S-box output s, that is
+# SubBytes and MixColumns for one byte. Te1..Te3 are Te0 rotated
+# one, two and three bytes right, which takes care of ShiftRows.
+# Te4 holds the S-box output in all four bytes and is used in the
+# final round.
+#-------------------------------------------------------------------
+def gen_te_tables(sbox):
+    te0 = []
+    te1 = []
+    te2 = []
+    te3 = []
+    te4 = []
+
+    for x in range(256):
+        s = sbox[x]
+        s2 = GM2[s]
+        s3 = GM3[s]
+        te0.append((s2 << 24) | (s << 16) | (s << 8) | s3)
+        te1.append((s3 << 24) | (s2 << 16) | (s << 8) | s)
+        te2.append((s << 24) | (s3 << 16) | (s2 << 8) | s)
+        te3.append((s << 24) | (s << 16) | (s3 << 8) | s2)
+        te4.append((s << 24) | (s << 16) | (s << 8) | s)
+
+    return (te0, te1, te2, te3, te4)
+
+
+(TE0, TE1, TE2, TE3, TE4) = gen_te_tables(AES.sbox)
+
+
+#-------------------------------------------------------------------
+# gen_td_tables()
+#
+# Generate the decipher T-tables from the given inverse S-box.
+# Td0 holds the column (14s, 9s, 13s, 11s) for each inverse S-box
+# output s, that is inverse SubBytes and InvMixColumns for one
+# byte. Td1..Td3 are Td0 rotated one, two and three bytes right.
+# Td4 holds the inverse S-box output in all four bytes.
+#-------------------------------------------------------------------
+def gen_td_tables(inv_sbox):
+    td0 = []
+    td1 = []
+    td2 = []
+    td3 = []
+    td4 = []
+
+    for x in range(256):
+        s = inv_sbox[x]
+        s9 = GM09[s]
+        s11 = GM11[s]
+        s13 = GM13[s]
+        s14 = GM14[s]
+        td0.append((s14 << 24) | (s9 << 16) | (s13 << 8) | s11)
+        td1.append((s11 << 24) | (s14 << 16) | (s9 << 8) | s13)
+        td2.append((s13 << 24) | (s11 << 16) | (s14 << 8) | s9)
+        td3.append((s9 << 24) | (s13 << 16) | (s11 << 8) | s14)
+        td4.append((s << 24) | (s << 16) | (s << 8) | s)
+
+    return (td0, td1, td2, td3, td4)
+
+
+(TD0, TD1, TD2, TD3, TD4) = gen_td_tables(AES.inv_sbox)
+
+
+#-------------------------------------------------------------------
+# ttable_encipher_words()
+#
+# Perform the AES encipher rounds on the given block using the
+# given flat sequence of round key words. SubBytes, ShiftRows
+# and MixColumns are merged into the T-tables Te0..Te3, which
+# means that each main round is 16 table lookups and XORs.
+# The final round, that has no MixColumns, uses the Te4 table.
+#-------------------------------------------------------------------
+def ttable_encipher_words(rk, num_rounds, block):
+    te0 = TE0
+    te1 = TE1
+    te2 = TE2
+    te3 = TE3
+    te4 = TE4
+
+    # Init round
+    (s0, s1, s2, s3) = block
+    s0 ^= rk[0]
+    s1 ^= rk[1]
+    s2 ^= rk[2]
+    s3 ^= rk[3]
+
+    # Main rounds
+    for i in range(1, num_rounds):
+        j = 4 * i
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xff] ^\
+             te2[(s2 >> 8) & 0xff] ^ te3[s3 & 0xff] ^ rk[j + 0]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xff] ^\
+             te2[(s3 >> 8) & 0xff] ^ te3[s0 & 0xff] ^ rk[j + 1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xff] ^\
+             te2[(s0 >> 8) & 0xff] ^ te3[s1 & 0xff] ^ rk[j + 2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xff] ^\
+             te2[(s1 >> 8) & 0xff] ^ te3[s2 & 0xff] ^ rk[j + 3]
+        (s0, s1, s2, s3) = (t0, t1, t2, t3)
+
+    # Final round
+    j = 4 * num_rounds
+    r0 = (te4[s0 >> 24] & 0xff000000) ^ (te4[(s1 >> 16) & 0xff] & 0x00ff0000) ^\
+         (te4[(s2 >> 8) & 0xff] & 0x0000ff00) ^ (te4[s3 & 0xff] & 0x000000ff) ^ rk[j + 0]
+    r1 = (te4[s1 >> 24] & 0xff000000) ^ (te4[(s2 >> 16) & 0xff] & 0x00ff0000) ^\
+         (te4[(s3 >> 8) & 0xff] & 0x0000ff00) ^ (te4[s0 & 0xff] & 0x000000ff) ^ rk[j + 1]
+    r2 = (te4[s2 >> 24] & 0xff000000) ^ (te4[(s3 >> 16) & 0xff] & 0x00ff0000) ^\
+         (te4[(s0 >> 8) & 0xff] & 0x0000ff00) ^ (te4[s1 & 0xff] & 0x000000ff) ^ rk[j + 2]
+    r3 = (te4[s3 >> 24] & 0xff000000) ^ (te4[(s0 >> 16) & 0xff] & 0x00ff0000) ^\
+         (te4[(s1 >> 8) & 0xff] & 0x0000ff00) ^ (te4[s2 & 0xff] & 0x000000ff) ^ rk[j + 3]
+
+    return (r0, r1, r2, r3)
+
+
+#-------------------------------------------------------------------
+# ttable_decipher_words()
+#
+# Perform the AES decipher rounds on the given block using the
+# equivalent inverse cipher. The decipher round keys are given as
+# a flat sequence of words starting at the given offset. Inverse
+# SubBytes, inverse ShiftRows and InvMixColumns are merged into
+# the tables Td0..Td3 and the final round uses Td4.
+#-------------------------------------------------------------------
+def ttable_decipher_words(dk, num_rounds, block, offset = 0):
+    td0 = TD0
+    td1 = TD1
+    td2 = TD2
+    td3 = TD3
+    td4 = TD4
+
+    # Init round
+    (s0, s1, s2, s3) = block
+    s0 ^= dk[offset]
+    s1 ^= dk[offset + 1]
+    s2 ^= dk[offset + 2]
+    s3 ^= dk[offset + 3]
+
+    # Main rounds
+    for i in range(1, num_rounds):
+        j = offset + 4 * i
+        t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xff] ^\
+             td2[(s2 >> 8) & 0xff] ^ td3[s1 & 0xff] ^ dk[j + 0]
+        t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xff] ^\
+             td2[(s3 >> 8) & 0xff] ^ td3[s2 & 0xff] ^ dk[j + 1]
+        t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xff] ^\
+             td2[(s0 >> 8) & 0xff] ^ td3[s3 & 0xff] ^ dk[j + 2]
+        t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xff] ^\
+             td2[(s1 >> 8) & 0xff] ^ td3[s0 & 0xff] ^ dk[j + 3]
+        (s0, s1, s2, s3) = (t0, t1, t2, t3)
+
+    # Final round
+    j = offset + 4 * num_rounds
+    r0 = (td4[s0 >> 24] & 0xff000000) ^ (td4[(s3 >> 16) & 0xff] & 0x00ff0000) ^\
+         (td4[(s2 >> 8) & 0xff] & 0x0000ff00) ^ (td4[s1 & 0xff] & 0x000000ff) ^ dk[j + 0]
+    r1 = (td4[s1 >> 24] & 0xff000000) ^ (td4[(s0 >> 16) & 0xff] & 0x00ff0000) ^\
+         (td4[(s3 >> 8) & 0xff] & 0x0000ff00) ^ (td4[s2 & 0xff] & 0x000000ff) ^ dk[j + 1]
+    r2 = (td4[s2 >> 24] & 0xff000000) ^ (td4[(s1 >> 16) & 0xff] & 0x00ff0000) ^\
+         (td4[(s0 >> 8) & 0xff] & 0x0000ff00) ^ (td4[s3 & 0xff] & 0x000000ff) ^ dk[j + 2]
+    r3 = (td4[s3 >> 24] & 0xff000000) ^ (td4[(s2 >> 16) & 0xff] & 0x00ff0000) ^\
+         (td4[(s1 >> 8) & 0xff] & 0x0000ff00) ^ (td4[s0 & 0xff] & 0x000000ff) ^ dk[j + 3]
+
+    return (r0, r1, r2, r3)
+
+
+#-------------------------------------------------------------------
+# PrintTraceHook()
+#
+# Trace hook that prints the trace events. Events from the rounds
+# and the generated round keys are printed if verbose is set.
+# Events from the S-box and key expansion helper functions are
+# printed if dump_vars is set.
+#-------------------------------------------------------------------
+class PrintTraceHook():
+    HELPER_STEPS = ("substw", "inv_substw", "next_128bit_key",
+                    "next_256bit_key_a", "next_256bit_key_b")
+
+
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, verbose = True, dump_vars = True):
+        self.verbose = verbose
+        self.dump_vars = dump_vars
+        self.round = None
+
+
+    #-------------------------------------------------------------------
+    # __call__()
+    #
+    # Print the given trace event.
+    #-------------------------------------------------------------------
+    def __call__(self, round, step, words):
+        words_str = ", ".join(["0x%08x" % w for w in words])
+
+        if step in self.HELPER_STEPS:
+            if self.dump_vars:
+                print("%s: %s" % (step, words_str))
+            return
+
+        if not self.verbose:
+            return
+
+        if step == "round_key":
+            print("Round key %02d: %s" % (round, words_str))
+            return
+
+        if step == "input":
+            self.round = None
+        if round != self.round:
+            self.round = round
+            print("")
+            print("  Round %02d" % round)
+            print("  ---------")
+        print("  %-15s %s" % (step + ":", words_str))
+
+
+#-------------------------------------------------------------------
+# KeyScheduleCache()
+#
+# Size bounded cache of generated round keys indexed by the key.
+# When the estimated memory used by the cached round keys exceeds
+# the given budget the least recently used entries are evicted.
+# A budget of zero bytes disables the cache.
+#-------------------------------------------------------------------
+class KeyScheduleCache():
+    DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    #-------------------------------------------------------------------
+    # entry_size()
+    #
+    # Estimate the number of bytes used by a cache entry.
+    #-------------------------------------------------------------------
+    def entry_size(self, key, round_keys):
+        size = sys.getsizeof(key) + sys.getsizeof(round_keys)
+        for k in round_keys:
+            size += sys.getsizeof(k) + sum([sys.getsizeof(w) for w in k])
+        return size
+
+
+    #-------------------------------------------------------------------
+    # lookup()
+    #
+    # Return the round keys for the given key. If the key is not
+    # in the cache the round keys are generated with the given
+    # key generation function and added to the cache.
+    #-------------------------------------------------------------------
+    def lookup(self, key, key_gen):
+        key = tuple(key)
+        round_keys = self.entries.get(key)
+
+        if round_keys is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return round_keys
+
+        self.misses += 1
+        round_keys = tuple([tuple(k) for k in key_gen(key)])
+
+        entry_size = self.entry_size(key, round_keys)
+        if entry_size > self.max_bytes:
+            return round_keys
+
+        self.entries[key] = round_keys
+        self.size += entry_size
+
+        while self.size > self.max_bytes:
+            (old_key, old_round_keys) = self.entries.popitem(last = False)
+            self.size -= self.entry_size(old_key, old_round_keys)
+            self.evictions += 1
+
+        return round_keys
+
+
+    #-------------------------------------------------------------------
+    # clear()
+    #
+    # Remove all entries from the cache. The counters are kept.
+    #-------------------------------------------------------------------
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+    #-------------------------------------------------------------------
+    # print_stats()
+    #
+    # Print the cache counters.
+    #-------------------------------------------------------------------
+    def print_stats(self):
+        print("Key schedule cache: %d entries, %d of %d bytes used." %
+              (len(self.entries), self.size, self.max_bytes))
+        print("hits = %d, misses = %d, evictions = %d" %
+              (self.hits, self.misses, self.evictions))
+
+
+# The key schedule cache shared by AES instances.
+KEY_CACHE = KeyScheduleCache()
+
+# Cache with the final key words used by aes_decipher_block_otf().
+FINAL_KEY_CACHE = KeyScheduleCache()
+
+# Cache with the flat round key words used by the T-table block
+# functions.
+TTABLE_KEY_CACHE = KeyScheduleCache()
+
+
+#-------------------------------------------------------------------
+# AESKey()
+#
+# A prepared AES key. The key is expanded once when the object
+# is created and the round keys are then reused for every block.
+# The encipher round keys followed by the round keys for the
+# equivalent inverse cipher are stored as 32 bit words in one
+# flat array.
+#-------------------------------------------------------------------
+class AESKey():
+    __slots__ = ("aes", "num_rounds", "round_keys")
+
+
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, aes, key):
+        (rk, dk) = aes.ttable_keys(key)
+
+        self.aes = aes
+        self.num_rounds = len(rk) // 4 - 1
+        self.round_keys = array('I', rk)
+        self.round_keys.extend(dk)
+
+
+    #-------------------------------------------------------------------
+    # encrypt_block()
+    #
+    # Encipher the given block.
+    #-------------------------------------------------------------------
+    def encrypt_block(self, block):
+        return ttable_encipher_words(self.round_keys, self.num_rounds, block)
+
+
+    #-------------------------------------------------------------------
+    # encrypt_blocks()
+    #
+    # Encipher the given sequence of blocks. Returns a list with
+    # the resulting blocks.
+    #-------------------------------------------------------------------
+    def encrypt_blocks(self, blocks):
+        rk = self.round_keys
+        num_rounds = self.num_rounds
+        return [ttable_encipher_words(rk, num_rounds, block) for block in blocks]
+
+
+    #-------------------------------------------------------------------
+    # decrypt_block()
+    #
+    # Decipher the given block.
+    #-------------------------------------------------------------------
+    def decrypt_block(self, block):
+        return ttable_decipher_words(self.round_keys, self.num_rounds, block,
+                                     4 * (self.num_rounds + 1))
+
+
+    #-------------------------------------------------------------------
+    # decrypt_blocks()
+    #
+    # Decipher the given sequence of blocks. Returns a list with
+    # the resulting blocks.
+    #-------------------------------------------------------------------
+    def decrypt_blocks(self, blocks):
+        rk = self.round_keys
+        num_rounds = self.num_rounds
+        offset = 4 * (num_rounds + 1)
+        return [ttable_decipher_words(rk, num_rounds, block, offset) for block in blocks]
+
+
+    #-------------------------------------------------------------------
+    # encrypt_into()
+    #
+    # Encipher the blocks in the bytes-like object src in ECB mode
+    # and write the result to the writable buffer dst. The blocks
+    # are unpacked and packed directly between the buffers and the
+    # round function.
+    #-------------------------------------------------------------------
+    def encrypt_into(self, dst, src):
+        check_buffers(dst, src)
+        rk = self.round_keys
+        num_rounds = self.num_rounds
+        pack_into = BLOCK_STRUCT.pack_into
+
+        offset = 0
+        for block in BLOCK_STRUCT.iter_unpack(src):
+            pack_into(dst, offset, *ttable_encipher_words(rk, num_rounds, block))
+            offset += 16
+
+
+    #-------------------------------------------------------------------
+    # decrypt_into()
+    #
+    # Decipher the blocks in the bytes-like object src in ECB mode
+    # and write the result to the writable buffer dst.
+    #-------------------------------------------------------------------
+    def decrypt_into(self, dst, src):
+        check_buffers(dst, src)
+        rk = self.round_keys
+        num_rounds = self.num_rounds
+        key_offset = 4 * (num_rounds + 1)
+        pack_into = BLOCK_STRUCT.pack_into
+
+        offset = 0
+        for block in BLOCK_STRUCT.iter_unpack(src):
+            pack_into(dst, offset, *ttable_decipher_words(rk, num_rounds, block,
+                                                          key_offset))
+            offset += 16
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given bytes-like object in ECB mode. The length
+    # must be a multiple of the block size.
+    #-------------------------------------------------------------------
+    def encrypt(self, data):
+        res = bytearray(memoryview(data).nbytes)
+        self.encrypt_into(res, data)
+        return bytes(res)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given bytes-like object in ECB mode. The length
+    # must be a multiple of the block size.
+    #-------------------------------------------------------------------
+    def decrypt(self, data):
+        res = bytearray(memoryview(data).nbytes)
+        self.decrypt_into(res, data)
+        return bytes(res)
+
+
+#-------------------------------------------------------------------
+# check_buffers()
+#
+# Check that src is a whole number of blocks and that dst is
+# large enough to hold the result.
+#-------------------------------------------------------------------
+def check_buffers(dst, src):
+    src_len = memoryview(src).nbytes
+    if src_len % 16 != 0:
+        raise ValueError("Data length must be a multiple of 16 bytes.")
+    if memoryview(dst).nbytes < src_len:
+        raise ValueError("Destination buffer is smaller than the data.")
+
+
+#-------------------------------------------------------------------
+# class KeyBank
+#
+# Bank of slots with prepared keys, as in the dual-keys branch of
+# the core. Each slot holds the expanded encipher and decipher
+# round keys for a key, so switching between the keys in the
+# slots is only a lookup. Loads, evictions and switches between
+# slots are counted.
+#-------------------------------------------------------------------
+class KeyBank():
+    __slots__ = ("aes", "slots", "current", "loads", "evictions", "switches")
+
+    DEFAULT_NUM_SLOTS = 2
+
+
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, num_slots = DEFAULT_NUM_SLOTS, aes = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        self.aes = aes
+        self.slots = [None] * num_slots
+        self.current = None
+        self.loads = 0
+        self.evictions = 0
+        self.switches = 0
+
+
+    #-------------------------------------------------------------------
+    # load()
+    #
+    # Expand the given key into the given slot. A key already in
+    # the slot is evicted.
+    #-------------------------------------------------------------------
+    def load(self, slot, key):
+        if self.slots[slot] is not None:
+            self.evictions += 1
+        self.slots[slot] = self.aes.prepare(key)
+        self.loads += 1
+
+
+    #-------------------------------------------------------------------
+    # evict()
+    #
+    # Remove the key in the given slot.
+    #-------------------------------------------------------------------
+    def evict(self, slot):
+        if self.slots[slot] is not None:
+            self.slots[slot] = None
+            self.evictions += 1
+
+
+    #-------------------------------------------------------------------
+    # get_key()
+    #
+    # Return the prepared key in the given slot.
+    #-------------------------------------------------------------------
+    def get_key(self, slot):
+        prepared_key = self.slots[slot]
+        if prepared_key is None:
+            raise ValueError("No key loaded in slot %d." % slot)
+
+        if slot != self.current:
+            self.current = slot
+            self.switches += 1
+        return prepared_key
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given block with the key in the given slot.
+    #-------------------------------------------------------------------
+    def encrypt(self, slot, block):
+        prepared_key = self.get_key(slot)
+        return ttable_encipher_words(prepared_key.round_keys,
+                                     prepared_key.num_rounds, block)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given block with the key in the given slot.
+    #-------------------------------------------------------------------
+    def decrypt(self, slot, block):
+        prepared_key = self.get_key(slot)
+        num_rounds = prepared_key.num_rounds
+        return ttable_decipher_words(prepared_key.round_keys, num_rounds,
+                                     block, 4 * (num_rounds + 1))
+
+
+    #-------------------------------------------------------------------
+    # print_stats()
+    #
+    # Print the bank counters.
+    #-------------------------------------------------------------------
+    def print_stats(self):
+        print("Key bank: %d of %d slots loaded." %
+              (len([k for k in self.slots if k is not None]), len(self.slots)))
+        print("loads = %d, evictions = %d, switches = %d" %
+              (self.loads, self.evictions, self.switches))
+
+
 #-------------------------------------------------------------------
 # __name__
 # Python thingy which allows the file to be run standalone as
@@ -950,7 +2375,17 @@ if __name__=="__main__":
     print("============================")
     print
     my_aes = AES()
+    my_aes.test_gm_tables()
+    my_aes.test_swar_mixcolumns()
     my_aes.test_aes()
+    my_aes.test_ttable()
+    my_aes.test_prepare()
+    my_aes.test_buffer_api()
+    my_aes.test_key_bank()
+    my_aes.test_wide_sbox()
+    my_aes.test_key_cache()
+    my_aes.test_trace_hook()
+    my_aes.test_otf_encipher()
     sys.exit(0)
 
 
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_batcher.py
+# --------------
+# Key affinity batcher for streams of (key, block) requests with
+# interleaved keys. Requests are grouped by key and processed in
+# single key batches, with the results in the original order.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+from collections import OrderedDict
+
+from aes import AES
+from aes_engines import batch_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_WINDOW = 4096
+DEFAULT_MAX_ENGINES = 64
+DEFAULT_MAX_STATS = 1024
+
+# Request that closes the current window so that the requests
+# read so far are processed without waiting for more requests.
+FLUSH = object()
+
+
+#-------------------------------------------------------------------
+# class KeyBatcher
+#
+# Batching layer for a stream of (key, block) requests where the
+# keys are interleaved. The requests are read in windows of at
+# most window requests. Within a window the requests are grouped
+# by key, each group is processed as one batch by an engine for
+# the key and the results are returned in the original order.
+# The engines and the batch metrics for the most recently used
+# keys are kept.
+#
+# A window is also closed by a FLUSH request, and with max_delay
+# set when a request arrives more than max_delay seconds after
+# the first request in the window. The delay is only checked as
+# requests arrive, so a producer that may stall should send FLUSH
+# to get the requests already read processed.
+#-------------------------------------------------------------------
+class KeyBatcher():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, window = DEFAULT_WINDOW, engine_factory = batch_engine,
+                 max_engines = DEFAULT_MAX_ENGINES, aes = None,
+                 max_delay = None, max_stats = DEFAULT_MAX_STATS):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        self.aes = aes
+        self.window = window
+        self.engine_factory = engine_factory
+        self.max_engines = max_engines
+        self.max_delay = max_delay
+        self.max_stats = max_stats
+        self.engines = OrderedDict()
+        self.key_stats = OrderedDict()
+
+
+    #-------------------------------------------------------------------
+    # get_engine()
+    #
+    # Return the engine for the given key, creating it if needed.
+    #-------------------------------------------------------------------
+    def get_engine(self, key):
+        engine = self.engines.get(key)
+        if engine is not None:
+            self.engines.move_to_end(key)
+            return engine
+
+        engine = self.engine_factory(key, self.aes)
+        self.engines[key] = engine
+        if len(self.engines) > self.max_engines:
+            self.engines.popitem(last = False)
+        return engine
+
+
+    #-------------------------------------------------------------------
+    # run_window()
+    #
+    # Process the given list of requests grouped by key. Returns
+    # the resulting blocks in the order of the requests.
+    #-------------------------------------------------------------------
+    def run_window(self, requests, decrypt):
+        groups = {}
+        for (i, (key, block)) in enumerate(requests):
+            if len(block) != 16:
+                raise ValueError("Block %d is %d bytes, not 16 bytes." % (i, len(block)))
+            groups.setdefault(tuple(key), []).append(i)
+
+        results = [None] * len(requests)
+        for (key, indices) in groups.items():
+            engine = self.get_engine(key)
+            data = b"".join([requests[i][1] for i in indices])
+            if decrypt:
+                data = engine.decrypt(data)
+            else:
+                data = engine.encrypt(data)
+
+            for (j, i) in enumerate(indices):
+                results[i] = data[16 * j : 16 * j + 16]
+
+            self.update_stats(key, len(indices))
+
+        return results
+
+
+    #-------------------------------------------------------------------
+    # update_stats()
+    #
+    # Add a batch with the given number of blocks to the metrics
+    # for the key. Metrics are kept for at most max_stats keys.
+    #-------------------------------------------------------------------
+    def update_stats(self, key, num_blocks):
+        if self.max_stats == 0:
+            return
+
+        (batches, blocks) = self.key_stats.pop(key, (0, 0))
+        self.key_stats[key] = (batches + 1, blocks + num_blocks)
+        if len(self.key_stats) > self.max_stats:
+            self.key_stats.popitem(last = False)
+
+
+    #-------------------------------------------------------------------
+    # read_window()
+    #
+    # Read the next window of requests from the given iterator.
+    # Returns the requests and a flag that is set when the
+    # iterator is exhausted.
+    #-------------------------------------------------------------------
+    def read_window(self, requests):
+        window = []
+        deadline = None
+
+        while len(window) < self.window:
+            request = next(requests, None)
+            if request is None:
+                return (window, True)
+            if request is FLUSH:
+                break
+
+            window.append(request)
+            if self.max_delay is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_delay
+                elif time.monotonic() >= deadline:
+                    break
+
+        return (window, False)
+
+
+    #-------------------------------------------------------------------
+    # process()
+    #
+    # Generator that processes the given iterable of (key, block)
+    # requests one window at a time and yields the resulting
+    # blocks in the order of the requests.
+    #-------------------------------------------------------------------
+    def process(self, requests, decrypt = False):
+        requests = iter(requests)
+        done = False
+        while not done:
+            (window, done) = self.read_window(requests)
+            if window:
+                yield from self.run_window(window, decrypt)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given (key, block) requests. Yields the
+    # resulting blocks as bytes in the order of the requests.
+    #-------------------------------------------------------------------
+    def encrypt(self, requests):
+        return self.process(requests, False)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given (key, block) requests. Yields the
+    # resulting blocks as bytes in the order of the requests.
+    #-------------------------------------------------------------------
+    def decrypt(self, requests):
+        return self.process(requests, True)
+
+
+    #-------------------------------------------------------------------
+    # batch_sizes()
+    #
+    # Return a dict with the number of batches, number of blocks and
+    # mean batch size for each of the most recently used keys.
+    #-------------------------------------------------------------------
+    def batch_sizes(self):
+        return dict([(key, (num_batches, num_blocks, num_blocks / num_batches))
+                     for (key, (num_batches, num_blocks)) in self.key_stats.items()])
+
+
+    #-------------------------------------------------------------------
+    # print_stats()
+    #
+    # Print the batch size metrics for each key.
+    #-------------------------------------------------------------------
+    def print_stats(self):
+        for (key, (num_batches, num_blocks, mean_size)) in self.batch_sizes().items():
+            print("key 0x%08x...: %d batches, %d blocks, %.1f blocks/batch" %
+                  (key[0], num_batches, num_blocks, mean_size))
+
+
+#-------------------------------------------------------------------
+# gen_requests()
+#
+# Generate a stream of requests with the given keys interleaved.
+#-------------------------------------------------------------------
+def gen_requests(keys, num_requests):
+    requests = []
+    for i in range(num_requests):
+        key = keys[(i * 7 + i // 5) % len(keys)]
+        block = bytes([(i + j * 17) & 0xff for j in range(16)])
+        requests.append((key, block))
+    return requests
+
+
+#-------------------------------------------------------------------
+# test_key_batcher()
+#
+# Test that the batched results match the AES model for each
+# request and are returned in the original order.
+#-------------------------------------------------------------------
+def test_key_batcher():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    keys = [AES.NIST_TEST_VECTORS[0][1], AES.NIST_TEST_VECTORS[4][1],
+            (0x00010203, 0x04050607, 0x08090a0b, 0x0c0d0e0f)]
+    requests = gen_requests(keys, 300)
+    prepared_keys = dict([(k, aes.prepare(k)) for k in keys])
+    expected = [prepared_keys[k].encrypt(b) for (k, b) in requests]
+
+    batcher = KeyBatcher(window = 64, aes = aes)
+    ciphertext = list(batcher.encrypt(requests))
+    tc += 2
+    if ciphertext != expected:
+        print("Error: Batched encipher differs from the AES model.")
+        tc_errors += 1
+    plaintext = list(batcher.decrypt(zip([k for (k, b) in requests], ciphertext)))
+    if plaintext != [b for (k, b) in requests]:
+        print("Error: Batched decipher failed.")
+        tc_errors += 1
+
+    # Five windows per pass, two passes.
+    stats = batcher.batch_sizes()
+    tc += 2
+    if sum([s[1] for s in stats.values()]) != 600:
+        print("Error: Block count in the batch metrics is wrong.")
+        tc_errors += 1
+    if [s[0] for s in stats.values()] != [10, 10, 10]:
+        print("Error: Unexpected number of batches per key.")
+        batcher.print_stats()
+        tc_errors += 1
+
+    # FLUSH closes a window early, giving six windows with all
+    # three keys in each.
+    batcher = KeyBatcher(window = 64, aes = aes)
+    ciphertext = list(batcher.encrypt(requests[: 10] + [FLUSH] + requests[10 :]))
+    tc += 2
+    if ciphertext != expected:
+        print("Error: Batched encipher with FLUSH differs from the AES model.")
+        tc_errors += 1
+    if sum([s[0] for s in batcher.batch_sizes().values()]) != 18:
+        print("Error: FLUSH did not close the window.")
+        batcher.print_stats()
+        tc_errors += 1
+
+    batcher = KeyBatcher(window = 64, aes = aes, max_stats = 2)
+    list(batcher.encrypt(requests))
+    tc += 1
+    if len(batcher.batch_sizes()) != 2:
+        print("Error: Metrics kept for %d keys, not 2." % len(batcher.batch_sizes()))
+        tc_errors += 1
+
+    # A window is closed when a request arrives after max_delay,
+    # which with no delay gives ten windows of two requests with
+    # two keys each.
+    batcher = KeyBatcher(window = 64, aes = aes, max_delay = 0.0)
+    ciphertext = list(batcher.encrypt(requests[: 20]))
+    tc += 2
+    if ciphertext != expected[: 20]:
+        print("Error: Batched encipher with max_delay differs from the AES model.")
+        tc_errors += 1
+    if sum([s[0] for s in batcher.batch_sizes().values()]) != 20:
+        print("Error: max_delay did not close the windows.")
+        batcher.print_stats()
+        tc_errors += 1
+
+    tc += 1
+    try:
+        list(batcher.encrypt([(keys[0], bytes(15))]))
+        print("Error: Short block not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Compare the batcher with a key expansion per request and with
+# a prepared key per request.
+#-------------------------------------------------------------------
+def test_performance():
+    aes = AES(verbose = False, dump_vars = False)
+    keys = [tuple([(i * 0x9e3779b9 + j) & 0xffffffff for j in range(4)]) for i in range(8)]
+    requests = gen_requests(keys, 50000)
+
+    batcher = KeyBatcher(aes = aes)
+    start = time.perf_counter()
+    for block in batcher.encrypt(requests):
+        pass
+    elapsed = time.perf_counter() - start
+    print("KeyBatcher:            %.0f blocks/s" % (len(requests) / elapsed))
+    batcher.print_stats()
+
+    start = time.perf_counter()
+    for (key, block) in requests:
+        aes.prepare(key).encrypt(block)
+    elapsed = time.perf_counter() - start
+    print("prepare() per request: %.0f blocks/s" % (len(requests) / elapsed))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the key batcher.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the key affinity batcher")
+    print("================================")
+
+    test_key_batcher()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_batcher.py
+#=======================================================================
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_bitslice.py
+# ---------------
+# Bitsliced AES engine using Python integers as arbitrary
+# wide registers. Each state bit holds the bit for all blocks in
+# a batch and the S-box is implemented as a Boolean circuit.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+
+from aes import AES
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_WIDTH = 1024
+
+
+#-------------------------------------------------------------------
+# sbox_circuit()
+#
+# The AES S-box as a Boolean circuit by Boyar and Peralta with
+# 32 AND and 83 XOR/XNOR gates. The circuit is a top linear
+# transform, a shared non-linear GF(2^8) inversion and a bottom
+# linear transform. x0 is the most significant bit of the input
+# byte and s0 the most significant bit of the output byte.
+# Each variable holds one bit for all blocks in the batch. The
+# XNOR gates are implemented as XOR with the given all ones mask.
+#-------------------------------------------------------------------
+def sbox_circuit(x0, x1, x2, x3, x4, x5, x6, x7, ones):
+    # Top linear transform.
+    y14 = x3 ^ x5
+    y13 = x0 ^ x6
+    y9 = x0 ^ x3
+    y8 = x0 ^ x5
+    t0 = x1 ^ x2
+    y1 = t0 ^ x7
+    y4 = y1 ^ x3
+    y12 = y13 ^ y14
+    y2 = y1 ^ x0
+    y5 = y1 ^ x6
+    y3 = y5 ^ y8
+    t1 = x4 ^ y12
+    y15 = t1 ^ x5
+    y20 = t1 ^ x1
+    y6 = y15 ^ x7
+    y10 = y15 ^ t0
+    y11 = y20 ^ y9
+    y7 = x7 ^ y11
+    y17 = y10 ^ y11
+    y19 = y10 ^ y8
+    y16 = t0 ^ y11
+    y21 = y13 ^ y16
+    y18 = x0 ^ y16
+
+    # Non-linear section.
+    t2 = y12 & y15
+    t3 = y3 & y6
+    t4 = t3 ^ t2
+    t5 = y4 & x7
+    t6 = t5 ^ t2
+    t7 = y13 & y16
+    t8 = y5 & y1
+    t9 = t8 ^ t7
+    t10 = y2 & y7
+    t11 = t10 ^ t7
+    t12 = y9 & y11
+    t13 = y14 & y17
+    t14 = t13 ^ t12
+    t15 = y8 & y10
+    t16 = t15 ^ t12
+    t17 = t4 ^ t14
+    t18 = t6 ^ t16
+    t19 = t9 ^ t14
+    t20 = t11 ^ t16
+    t21 = t17 ^ y20
+    t22 = t18 ^ y19
+    t23 = t19 ^ y21
+    t24 = t20 ^ y18
+
+    t25 = t21 ^ t22
+    t26 = t21 & t23
+    t27 = t24 ^ t26
+    t28 = t25 & t27
+    t29 = t28 ^ t22
+    t30 = t23 ^ t24
+    t31 = t22 ^ t26
+    t32 = t31 & t30
+    t33 = t32 ^ t24
+    t34 = t23 ^ t33
+    t35 = t27 ^ t33
+    t36 = t24 & t35
+    t37 = t36 ^ t34
+    t38 = t27 ^ t36
+    t39 = t29 & t38
+    t40 = t25 ^ t39
+
+    t41 = t40 ^ t37
+    t42 = t29 ^ t33
+    t43 = t29 ^ t40
+    t44 = t33 ^ t37
+    t45 = t42 ^ t41
+    z0 = t44 & y15
+    z1 = t37 & y6
+    z2 = t33 & x7
+    z3 = t43 & y16
+    z4 = t40 & y1
+    z5 = t29 & y7
+    z6 = t42 & y11
+    z7 = t45 & y17
+    z8 = t41 & y10
+    z9 = t44 & y12
+    z10 = t37 & y3
+    z11 = t33 & y4
+    z12 = t43 & y13
+    z13 = t40 & y5
+    z14 = t29 & y2
+    z15 = t42 & y9
+    z16 = t45 & y14
+    z17 = t41 & y8
+
+    # Bottom linear transform.
+    t46 = z15 ^ z16
+    t47 = z10 ^ z11
+    t48 = z5 ^ z13
+    t49 = z9 ^ z10
+    t50 = z2 ^ z12
+    t51 = z2 ^ z5
+    t52 = z7 ^ z8
+    t53 = z0 ^ z3
+    t54 = z6 ^ z7
+    t55 = z16 ^ z17
+    t56 = z12 ^ t48
+    t57 = t50 ^ t53
+    t58 = z4 ^ t46
+    t59 = z3 ^ t54
+    t60 = t46 ^ t57
+    t61 = z14 ^ t57
+    t62 = t52 ^ t58
+    t63 = t49 ^ t58
+    t64 = z4 ^ t59
+    t65 = t61 ^ t62
+    t66 = z1 ^ t63
+    s0 = t59 ^ t63
+    s6 = t56 ^ t62 ^ ones
+    s7 = t48 ^ t60 ^ ones
+    t67 = t64 ^ t65
+    s3 = t53 ^ t66
+    s4 = t51 ^ t66
+    s5 = t47 ^ t65
+    s1 = t64 ^ s3 ^ ones
+    s2 = t55 ^ t67 ^ ones
+
+    return [s0, s1, s2, s3, s4, s5, s6, s7]
+
+
+#-------------------------------------------------------------------
+# inv_affine()
+#
+# The inverse of the affine transform in the S-box on a bitsliced
+# byte given with the most significant bit first.
+#-------------------------------------------------------------------
+def inv_affine(y, ones):
+    (y0, y1, y2, y3, y4, y5, y6, y7) = y
+    return [y6 ^ y3 ^ y1,
+            y7 ^ y4 ^ y2,
+            y0 ^ y5 ^ y3,
+            y1 ^ y6 ^ y4,
+            y2 ^ y7 ^ y5,
+            y3 ^ y0 ^ y6 ^ ones,
+            y4 ^ y1 ^ y7,
+            y5 ^ y2 ^ y0 ^ ones]
+
+
+#-------------------------------------------------------------------
+# inv_sbox_circuit()
+#
+# The inverse S-box on a bitsliced byte. Since the S-box is the
+# GF(2^8) inversion followed by the affine transform A, the
+# inverse S-box is A^-1(S(A^-1(y))) and can reuse the S-box
+# circuit.
+#-------------------------------------------------------------------
+def inv_sbox_circuit(y, ones):
+    return inv_affine(sbox_circuit(*(inv_affine(y, ones) + [ones])), ones)
+
+
+#-------------------------------------------------------------------
+# xtime()
+#
+# Multiplication by two in GF(2^8) of a bitsliced byte given
+# with the most significant bit first. This is only rewiring and
+# three XORs for the reduction with 0x1b.
+#-------------------------------------------------------------------
+def xtime(a):
+    (a0, a1, a2, a3, a4, a5, a6, a7) = a
+    return [a1, a2, a3, a4 ^ a0, a5 ^ a0, a6, a7 ^ a0, a0]
+
+
+#-------------------------------------------------------------------
+# xor_bytes()
+#
+# XOR of two bitsliced bytes.
+#-------------------------------------------------------------------
+def xor_bytes(a, b):
+    return [a[i] ^ b[i] for i in range(8)]
+
+
+#-------------------------------------------------------------------
+# mixcolumns()
+#
+# MixColumns on the given bitsliced state, a list of 16 bytes
+# where each byte is a list of eight slices.
+#-------------------------------------------------------------------
+def mixcolumns(state):
+    res = []
+    for c in range(4):
+        (a0, a1, a2, a3) = state[4 * c : 4 * c + 4]
+        t = [a0[i] ^ a1[i] ^ a2[i] ^ a3[i] for i in range(8)]
+        for (x, y) in ((a0, a1), (a1, a2), (a2, a3), (a3, a0)):
+            xt = xtime(xor_bytes(x, y))
+            res.append([x[i] ^ t[i] ^ xt[i] for i in range(8)])
+    return res
+
+
+#-------------------------------------------------------------------
+# inv_mixcolumns()
+#
+# InvMixColumns on the given bitsliced state. This is done as
+# a multiplication of each column with (05, 00, 04, 00), which
+# only needs xtime, followed by MixColumns.
+#-------------------------------------------------------------------
+def inv_mixcolumns(state):
+    pre = []
+    for c in range(4):
+        (a0, a1, a2, a3) = state[4 * c : 4 * c + 4]
+        u = xtime(xtime(xor_bytes(a0, a2)))
+        v = xtime(xtime(xor_bytes(a1, a3)))
+        pre.extend([xor_bytes(a0, u), xor_bytes(a1, v),
+                    xor_bytes(a2, u), xor_bytes(a3, v)])
+    return mixcolumns(pre)
+
+
+#-------------------------------------------------------------------
+# shiftrows()
+#
+# ShiftRows on the given bitsliced state. Only rewiring.
+#-------------------------------------------------------------------
+def shiftrows(state):
+    return [state[4 * ((c + r) % 4) + r] for c in range(4) for r in range(4)]
+
+
+#-------------------------------------------------------------------
+# inv_shiftrows()
+#
+# Inverse ShiftRows on the given bitsliced state. Only rewiring.
+#-------------------------------------------------------------------
+def inv_shiftrows(state):
+    return [state[4 * ((c - r) % 4) + r] for c in range(4) for r in range(4)]
+
+
+#-------------------------------------------------------------------
+# addroundkey()
+#
+# AddRoundKey on the given bitsliced state. The key is the same
+# for all blocks, so each slice is either inverted or left as is
+# depending on the key bit. The round key is given as a list of
+# the slice indices where the key bit is set.
+#-------------------------------------------------------------------
+def addroundkey(state, key_bits, ones):
+    for i in key_bits:
+        byte = state[i >> 3]
+        byte[i & 7] ^= ones
+    return state
+
+
+#-------------------------------------------------------------------
+# key_bit_indices()
+#
+# Convert a round key given as four words to the list of set
+# bits as indices 8 * byte + bit, with bit 0 being the most
+# significant bit of the byte.
+#-------------------------------------------------------------------
+def key_bit_indices(round_key):
+    indices = []
+    for (i, w) in enumerate(round_key):
+        for b in range(32):
+            if (w >> (31 - b)) & 1:
+                indices.append(32 * i + b)
+    return indices
+
+
+#-------------------------------------------------------------------
+# BitslicedAES()
+#
+# Bitsliced AES engine using Python integers as wide registers.
+# Each of the 128 state bits is one integer that holds that bit
+# for all blocks in the batch, so AND and XOR on the integers
+# process the whole batch at once. The S-box is the Boolean
+# circuit above, which means that the engine is table free.
+#-------------------------------------------------------------------
+class BitslicedAES():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, width = DEFAULT_WIDTH, aes = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        round_keys = aes.key_gen(key)
+        self.num_rounds = len(round_keys) - 1
+        self.key_bits = [key_bit_indices(k) for k in round_keys]
+        self.width = width
+        self.masks = {}
+
+
+    #-------------------------------------------------------------------
+    # get_masks()
+    #
+    # Get the masks used when transposing a batch with the given
+    # number of blocks between bytes and slices.
+    #-------------------------------------------------------------------
+    def get_masks(self, n):
+        if n not in self.masks:
+            self.masks[n] = (int.from_bytes(b"\x01" * n, "little"),
+                             int.from_bytes(b"\x03\x00" * (n // 2), "little"),
+                             int.from_bytes(b"\x0f\x00\x00\x00" * (n // 4), "little"),
+                             int.from_bytes((b"\xff" + b"\x00" * 7) * (n // 8), "little"))
+        return self.masks[n]
+
+
+    #-------------------------------------------------------------------
+    # to_slices()
+    #
+    # Transpose n blocks given as bytes to the bitsliced state.
+    # Bit j in a slice is the bit for block j. n must be a
+    # multiple of eight. The bits of each byte position are first
+    # spread to one bit per byte, then packed eight bits per 64 bit
+    # group with shifts and masks and finally gathered into one bit
+    # per block with a byte slice.
+    #-------------------------------------------------------------------
+    def to_slices(self, data, n):
+        (m0, m1, m2, m3) = self.get_masks(n)
+        state = []
+
+        for p in range(16):
+            col = int.from_bytes(data[p::16], "little")
+            byte = []
+            for i in range(8):
+                x = (col >> (7 - i)) & m0
+                x = (x | (x >> 7)) & m1
+                x = (x | (x >> 14)) & m2
+                x = (x | (x >> 28)) & m3
+                byte.append(int.from_bytes(x.to_bytes(n, "little")[::8], "little"))
+            state.append(byte)
+
+        return state
+
+
+    #-------------------------------------------------------------------
+    # from_slices()
+    #
+    # Transpose the bitsliced state back to n blocks as bytes.
+    # This is the reverse of to_slices().
+    #-------------------------------------------------------------------
+    def from_slices(self, state, n):
+        (m0, m1, m2, m3) = self.get_masks(n)
+        res = bytearray(16 * n)
+        spread = bytearray(n)
+
+        for p in range(16):
+            col = 0
+            for i in range(8):
+                spread[::8] = state[p][i].to_bytes(n // 8, "little")
+                x = int.from_bytes(spread, "little")
+                x = (x | (x << 28)) & m2
+                x = (x | (x << 14)) & m1
+                x = (x | (x << 7)) & m0
+                col |= x << (7 - i)
+            res[p::16] = col.to_bytes(n, "little")
+
+        return res
+
+
+    #-------------------------------------------------------------------
+    # encipher_slices()
+    #
+    # Perform the AES encipher rounds on the given bitsliced state.
+    #-------------------------------------------------------------------
+    def encipher_slices(self, state, ones):
+        state = addroundkey(state, self.key_bits[0], ones)
+
+        for i in range(1, self.num_rounds + 1):
+            state = [sbox_circuit(*(b + [ones])) for b in state]
+            state = shiftrows(state)
+            if i < self.num_rounds:
+                state = mixcolumns(state)
+            state = addroundkey(state, self.key_bits[i], ones)
+
+        return state
+
+
+    #-------------------------------------------------------------------
+    # decipher_slices()
+    #
+    # Perform the AES decipher rounds on the given bitsliced state.
+    #-------------------------------------------------------------------
+    def decipher_slices(self, state, ones):
+        state = addroundkey(state, self.key_bits[self.num_rounds], ones)
+
+        for i in range(self.num_rounds - 1, -1, -1):
+            state = inv_shiftrows(state)
+            state = [inv_sbox_circuit(b, ones) for b in state]
+            state = addroundkey(state, self.key_bits[i], ones)
+            if i > 0:
+                state = inv_mixcolumns(state)
+
+        return state
+
+
+    #-------------------------------------------------------------------
+    # process()
+    #
+    # Process the given data in batches of at most width blocks
+    # with the given slice function. The last batch is padded to
+    # a multiple of eight blocks.
+    #-------------------------------------------------------------------
+    def process(self, data, slice_func):
+        if len(data) % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes.")
+
+        data = memoryview(data).cast("B")
+        res = bytearray()
+
+        for start in range(0, len(data), 16 * self.width):
+            batch = bytes(data[start : start + 16 * self.width])
+            num_blocks = len(batch) // 16
+            n = (num_blocks + 7) & ~7
+            batch += bytes(16 * (n - num_blocks))
+
+            ones = (1 << n) - 1
+            state = slice_func(self.to_slices(batch, n), ones)
+            res += self.from_slices(state, n)[: 16 * num_blocks]
+
+        return bytes(res)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def encrypt(self, data):
+        return self.process(data, self.encipher_slices)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def decrypt(self, data):
+        return self.process(data, self.decipher_slices)
+
+
+#-------------------------------------------------------------------
+# block_bytes()
+#
+# Convert a block given as four 32 bit words to bytes.
+#-------------------------------------------------------------------
+def block_bytes(block):
+    return b"".join([w.to_bytes(4, "big") for w in block])
+
+
+#-------------------------------------------------------------------
+# test_sbox_circuit()
+#
+# Test the S-box and inverse S-box circuits against the S-box
+# tables for all 256 inputs at once.
+#-------------------------------------------------------------------
+def test_sbox_circuit():
+    ones = (1 << 256) - 1
+    x = [0] * 8
+    for v in range(256):
+        for i in range(8):
+            x[i] |= ((v >> (7 - i)) & 1) << v
+
+    tc_errors = 0
+    for (name, res, table) in (("S-box", sbox_circuit(*(x + [ones])), AES.sbox),
+                               ("Inverse S-box", inv_sbox_circuit(x, ones),
+                                AES.inv_sbox)):
+        for v in range(256):
+            s = 0
+            for i in range(8):
+                s |= ((res[i] >> v) & 1) << (7 - i)
+            if s != table[v]:
+                print("Error: %s circuit gives 0x%02x for 0x%02x, expected 0x%02x." %
+                      (name, s, v, table[v]))
+                tc_errors += 1
+                break
+
+    return tc_errors
+
+
+#-------------------------------------------------------------------
+# test_bitsliced_aes()
+#
+# Test the bitsliced engine using the NIST test vectors. All
+# vectors for a key are processed in one batch, and a larger
+# batch is checked against the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_bitsliced_aes():
+    tc_errors = test_sbox_circuit()
+    tc        = 2
+    aes = AES(verbose = False, dump_vars = False)
+
+    for key_len in (4, 8):
+        vectors = [v for v in AES.NIST_TEST_VECTORS if len(v[1]) == key_len]
+        key = vectors[0][1]
+        plaintext = b"".join([block_bytes(v[2]) for v in vectors])
+        expected = b"".join([block_bytes(v[3]) for v in vectors])
+        engine = BitslicedAES(key, 64, aes)
+
+        tc += 2
+        if engine.encrypt(plaintext) != expected:
+            print("Error: Encipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+        if engine.decrypt(expected) != plaintext:
+            print("Error: Decipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+        # Several batches with a partial last batch.
+        prepared_key = aes.prepare(key)
+        blocks = [(i, i * 0x01010101, ~i & 0xffffffff, key[0] ^ i) for i in range(150)]
+        data = b"".join([block_bytes(b) for b in blocks])
+        expected = b"".join([block_bytes(b) for b in prepared_key.encrypt_blocks(blocks)])
+        ciphertext = engine.encrypt(data)
+        tc += 2
+        if ciphertext != expected:
+            print("Error: Result for AES-%d differs from the AES model." % (key_len * 32))
+            tc_errors += 1
+        if engine.decrypt(ciphertext) != data:
+            print("Error: Decipher of batches for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the throughput for different batch widths.
+#-------------------------------------------------------------------
+def test_performance():
+    key = AES.NIST_TEST_VECTORS[0][1]
+
+    for width in (64, 256, 1024, 4096):
+        engine = BitslicedAES(key, width)
+        data = bytes(range(256)) * (width // 16)
+        start = time.perf_counter()
+        engine.encrypt(data)
+        elapsed = time.perf_counter() - start
+        print("width %4d: %.1f kB/s" % (width, len(data) / elapsed / 1e3))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the bitsliced AES engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the bitsliced AES engine")
+    print("================================")
+
+    test_bitsliced_aes()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_bitslice.py
+#=======================================================================
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_byteslice.py
+# ----------------
+# Byte-sliced AES engine that processes a whole buffer of blocks
+# one round at a time using bytes.translate() for the S-box and
+# big integers with word parallel masks for the linear layers.
+# Only uses the Python standard library.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+
+from aes import AES, BLOCK_STRUCT
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_WIDTH = 4096
+
+SBOX = bytes(AES.sbox)
+INV_SBOX = bytes(AES.inv_sbox)
+
+# Source position for each byte position after ShiftRows and
+# InvShiftRows. Byte p in a block is row p % 4 in column p // 4.
+SHIFTROWS = [4 * ((p // 4 + p % 4) % 4) + p % 4 for p in range(16)]
+INV_SHIFTROWS = [4 * ((p // 4 - p % 4) % 4) + p % 4 for p in range(16)]
+
+
+#-------------------------------------------------------------------
+# permute()
+#
+# Permute the bytes in all blocks in the given buffer. Each
+# byte position is moved as one slice over all blocks.
+#-------------------------------------------------------------------
+def permute(state, perm):
+    res = bytearray(len(state))
+    for p in range(16):
+        res[p::16] = state[perm[p]::16]
+    return res
+
+
+#-------------------------------------------------------------------
+# class BytesliceAES
+#
+# AES engine that processes all blocks in a buffer one round at
+# a time. SubBytes is done with bytes.translate() and ShiftRows
+# as a byte permutation. MixColumns and AddRoundKey are done
+# with the buffer as one big integer where each block is four
+# big endian words, using the same SWAR operations as
+# mixcolumns_128() in the AES model.
+#-------------------------------------------------------------------
+class BytesliceAES():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, width = DEFAULT_WIDTH, aes = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        round_keys = aes.key_gen(key)
+        self.num_rounds = len(round_keys) - 1
+        self.key_bytes = [BLOCK_STRUCT.pack(*k) for k in round_keys]
+        self.width = width
+        self.consts = None
+
+
+    #-------------------------------------------------------------------
+    # build_consts()
+    #
+    # Build the round keys repeated for n blocks and the masks used
+    # for xtime and to rotate all words in a buffer of n blocks.
+    #-------------------------------------------------------------------
+    def build_consts(self, n):
+        keys = [int.from_bytes(k * n, "big") for k in self.key_bytes]
+        masks = [int.from_bytes(b"\x7f" * (16 * n), "big"),
+                 int.from_bytes(b"\x01" * (16 * n), "big")]
+        for i in (1, 2, 3):
+            lo = int.from_bytes((b"\x00" * (4 - i) + b"\xff" * i) * (4 * n), "big")
+            masks.append((8 * i, 32 - 8 * i, lo, ((1 << (128 * n)) - 1) ^ lo))
+        return (keys, masks)
+
+
+    #-------------------------------------------------------------------
+    # get_consts()
+    #
+    # Get the constants for n blocks. Only the constants for a
+    # full batch of width blocks are kept. The constants repeat
+    # for each block, so for a shorter batch they are the low
+    # 128 * n bits of the full batch constants.
+    #-------------------------------------------------------------------
+    def get_consts(self, n):
+        if n > self.width:
+            return self.build_consts(n)
+        if self.consts is None:
+            self.consts = self.build_consts(self.width)
+        if n == self.width:
+            return self.consts
+
+        (keys, masks) = self.consts
+        m = (1 << (128 * n)) - 1
+        return ([k & m for k in keys],
+                [masks[0] & m, masks[1] & m] +
+                [(left, right, lo & m, hi & m) for (left, right, lo, hi) in masks[2 :]])
+
+
+    #-------------------------------------------------------------------
+    # encipher_buffer()
+    #
+    # Perform the AES encipher rounds on a buffer of n blocks.
+    #-------------------------------------------------------------------
+    def encipher_buffer(self, data, n):
+        (keys, masks) = self.get_consts(n)
+        length = 16 * n
+        x = int.from_bytes(data, "big") ^ keys[0]
+
+        for i in range(1, self.num_rounds + 1):
+            state = x.to_bytes(length, "big").translate(SBOX)
+            state = permute(state, SHIFTROWS)
+            x = int.from_bytes(state, "big")
+            if i < self.num_rounds:
+                x = mixcolumns(x, masks)
+            x ^= keys[i]
+
+        return x.to_bytes(length, "big")
+
+
+    #-------------------------------------------------------------------
+    # decipher_buffer()
+    #
+    # Perform the AES decipher rounds on a buffer of n blocks.
+    #-------------------------------------------------------------------
+    def decipher_buffer(self, data, n):
+        (keys, masks) = self.get_consts(n)
+        length = 16 * n
+        x = int.from_bytes(data, "big") ^ keys[self.num_rounds]
+
+        for i in range(self.num_rounds - 1, -1, -1):
+            state = permute(x.to_bytes(length, "big"), INV_SHIFTROWS)
+            x = int.from_bytes(state.translate(INV_SBOX), "big") ^ keys[i]
+            if i > 0:
+                x = inv_mixcolumns(x, masks)
+
+        return x.to_bytes(length, "big")
+
+
+    #-------------------------------------------------------------------
+    # process()
+    #
+    # Process the given data in batches of at most width blocks
+    # with the given buffer function.
+    #-------------------------------------------------------------------
+    def process(self, data, buffer_func):
+        data = memoryview(data).cast("B")
+        if len(data) % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes.")
+
+        res = bytearray()
+        for start in range(0, len(data), 16 * self.width):
+            batch = data[start : start + 16 * self.width]
+            res += buffer_func(batch, len(batch) // 16)
+
+        return bytes(res)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def encrypt(self, data):
+        return self.process(data, self.encipher_buffer)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def decrypt(self, data):
+        return self.process(data, self.decipher_buffer)
+
+
+#-------------------------------------------------------------------
+# rotate()
+#
+# Rotate all 32 bit words in the buffer x left by the number of
+# bytes given by the mask tuple. After rotation byte row r
+# in each column holds the byte from row r + i.
+#-------------------------------------------------------------------
+def rotate(x, mask):
+    (left, right, lo, hi) = mask
+    return ((x << left) & hi) | ((x >> right) & lo)
+
+
+#-------------------------------------------------------------------
+# xtime()
+#
+# Multiply all bytes in the buffer x by x in GF(2^8).
+#-------------------------------------------------------------------
+def xtime(x, masks):
+    return ((x & masks[0]) << 1) ^ (((x >> 7) & masks[1]) * 0x1b)
+
+
+#-------------------------------------------------------------------
+# mixcolumns()
+#
+# MixColumns on all columns in the buffer x. Uses
+# 2a0 ^ 3a1 ^ a2 ^ a3 = xtime(a0 ^ a1) ^ a1 ^ a2 ^ a3 with the
+# rotated columns.
+#-------------------------------------------------------------------
+def mixcolumns(x, masks):
+    r1 = rotate(x, masks[2])
+    r2 = rotate(x, masks[3])
+    r3 = rotate(x, masks[4])
+    return xtime(x ^ r1, masks) ^ r1 ^ r2 ^ r3
+
+
+#-------------------------------------------------------------------
+# inv_mixcolumns()
+#
+# InvMixColumns on all columns in the buffer x. The columns are
+# first multiplied with (05, 00, 04, 00) after which MixColumns
+# gives the inverse.
+#-------------------------------------------------------------------
+def inv_mixcolumns(x, masks):
+    u = xtime(xtime(x ^ rotate(x, masks[3]), masks), masks)
+    return mixcolumns(x ^ u, masks)
+
+
+#-------------------------------------------------------------------
+# block_bytes()
+#
+# Convert a block given as four 32 bit words to bytes.
+#-------------------------------------------------------------------
+def block_bytes(block):
+    return BLOCK_STRUCT.pack(*block)
+
+
+#-------------------------------------------------------------------
+# test_byteslice_aes()
+#
+# Test the byte-sliced engine using the NIST test vectors. All
+# vectors for a key are processed in one batch, and several
+# batches are checked against the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_byteslice_aes():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+
+    for key_len in (4, 8):
+        vectors = [v for v in AES.NIST_TEST_VECTORS if len(v[1]) == key_len]
+        key = vectors[0][1]
+        plaintext = b"".join([block_bytes(v[2]) for v in vectors])
+        expected = b"".join([block_bytes(v[3]) for v in vectors])
+        engine = BytesliceAES(key, 64, aes)
+
+        tc += 2
+        if engine.encrypt(plaintext) != expected:
+            print("Error: Encipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+        if engine.decrypt(expected) != plaintext:
+            print("Error: Decipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+        # Several batches with a partial last batch.
+        prepared_key = aes.prepare(key)
+        data = bytes(range(256)) * 9 + bytes(range(96))
+        expected = prepared_key.encrypt(data)
+        ciphertext = engine.encrypt(data)
+        tc += 2
+        if ciphertext != expected:
+            print("Error: Result for AES-%d differs from the AES model." % (key_len * 32))
+            tc_errors += 1
+        if engine.decrypt(ciphertext) != data:
+            print("Error: Decipher of batches for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+    # Batches shorter than the width use the low part of the full
+    # batch constants.
+    for length in (1, 2, 7, 63):
+        tc += 1
+        if engine.encrypt(data[: 16 * length]) != expected[: 16 * length]:
+            print("Error: Short batch of %d blocks differs from the AES model." % length)
+            tc_errors += 1
+
+    tc += 1
+    try:
+        engine.encrypt(bytes(17))
+        print("Error: Partial block not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the throughput for different batch widths.
+#-------------------------------------------------------------------
+def test_performance():
+    key = AES.NIST_TEST_VECTORS[0][1]
+    data = bytes(range(256)) * 4096
+
+    for width in (256, 1024, 4096, 16384):
+        engine = BytesliceAES(key, width)
+        start = time.perf_counter()
+        engine.encrypt(data)
+        elapsed = time.perf_counter() - start
+        print("width %5d: %.2f MB/s" % (width, len(data) / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the byte-sliced AES engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the byte-sliced AES engine")
+    print("==================================")
+
+    test_byteslice_aes()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_byteslice.py
+#=======================================================================
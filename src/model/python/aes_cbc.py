@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_cbc.py
+# ----------
+# CBC mode with PKCS#7 padding on top of the AES model. Encipher
+# is serial while decipher processes all blocks as one batch.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+
+from aes import AES, BLOCK_STRUCT, ttable_encipher_words
+from aes_engines import batch_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+# CBC test vectors from NIST SP 800-38A, F.2.1 and F.2.5. The
+# plaintext is the same as for the ECB vectors in the AES model.
+CBC_TEST_VECTORS = [
+    ("CBC-AES128", AES.NIST_TEST_VECTORS[0][1],
+     bytes.fromhex("000102030405060708090a0b0c0d0e0f"),
+     bytes.fromhex("7649abac8119b246cee98e9b12e9197d"
+                   "5086cb9b507219ee95db113a917678b2"
+                   "73bed6b8e3c1743b7116e69e22229516"
+                   "3ff1caa1681fac09120eca307586e1a7")),
+    ("CBC-AES256", AES.NIST_TEST_VECTORS[4][1],
+     bytes.fromhex("000102030405060708090a0b0c0d0e0f"),
+     bytes.fromhex("f58c4c04d6e5f1ba779eabfb5f7bfbd6"
+                   "9cfc4e967edb808d679f777bc6702c7d"
+                   "39f23369a9d9bacfa530e26304231461"
+                   "b2eb05e2c39be9fcda6c19078c6a9d1b"))]
+
+
+#-------------------------------------------------------------------
+# pkcs7_pad()
+#
+# Pad the given data to a multiple of the block size with
+# PKCS#7 padding. A full block of padding is added to data that
+# is already a multiple of the block size.
+#-------------------------------------------------------------------
+def pkcs7_pad(data):
+    pad_len = 16 - (len(data) % 16)
+    return bytes(data) + bytes([pad_len]) * pad_len
+
+
+#-------------------------------------------------------------------
+# pkcs7_unpad()
+#
+# Remove PKCS#7 padding from the given data. Raises ValueError
+# if the padding is not valid.
+#-------------------------------------------------------------------
+def pkcs7_unpad(data):
+    if len(data) == 0 or len(data) % 16 != 0:
+        raise ValueError("Padded data length must be a non zero multiple of 16 bytes.")
+
+    pad_len = data[-1]
+    if pad_len < 1 or pad_len > 16 or data[-pad_len :] != bytes([pad_len]) * pad_len:
+        raise ValueError("Invalid PKCS#7 padding.")
+    return bytes(data[: -pad_len])
+
+
+#-------------------------------------------------------------------
+# class CBC
+#
+# CBC mode on top of the AES model. Encipher is serial, with each
+# block processed by the T-table rounds of a prepared key.
+# Decipher has no dependency between the blocks so all blocks are
+# deciphered as one batch by the batch engine, after which the
+# result is XORed with the IV and the ciphertext shifted one block.
+#-------------------------------------------------------------------
+class CBC():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, aes = None, engine = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+        if engine is None:
+            engine = batch_engine(key, aes)
+
+        self.prepared_key = aes.prepare(key)
+        self.engine = engine
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given data with the given IV. With padding set
+    # PKCS#7 padding is added, otherwise the data length must be a
+    # multiple of the block size.
+    #-------------------------------------------------------------------
+    def encrypt(self, iv, data, padding = True):
+        check_iv(iv)
+        if padding:
+            data = pkcs7_pad(data)
+        elif len(data) % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes.")
+
+        rk = self.prepared_key.round_keys
+        num_rounds = self.prepared_key.num_rounds
+        pack_into = BLOCK_STRUCT.pack_into
+        res = bytearray(len(data))
+
+        (c0, c1, c2, c3) = BLOCK_STRUCT.unpack(iv)
+        offset = 0
+        for (p0, p1, p2, p3) in BLOCK_STRUCT.iter_unpack(data):
+            (c0, c1, c2, c3) = ttable_encipher_words(rk, num_rounds,
+                                                     (p0 ^ c0, p1 ^ c1, p2 ^ c2, p3 ^ c3))
+            pack_into(res, offset, c0, c1, c2, c3)
+            offset += 16
+
+        return bytes(res)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given data with the given IV. With padding set
+    # the PKCS#7 padding is checked and removed.
+    #-------------------------------------------------------------------
+    def decrypt(self, iv, data, padding = True):
+        check_iv(iv)
+        if len(data) % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes.")
+        if len(data) == 0:
+            return pkcs7_unpad(data) if padding else b""
+
+        data = bytes(data)
+        blocks = self.engine.decrypt(data)
+        chain = bytes(iv) + data[: -16]
+        res = int.from_bytes(blocks, "big") ^ int.from_bytes(chain, "big")
+        res = res.to_bytes(len(data), "big")
+
+        if padding:
+            return pkcs7_unpad(res)
+        return res
+
+
+#-------------------------------------------------------------------
+# check_iv()
+#
+# Check that the IV is one block.
+#-------------------------------------------------------------------
+def check_iv(iv):
+    if len(iv) != 16:
+        raise ValueError("IV must be 16 bytes, not %d bytes." % len(iv))
+
+
+#-------------------------------------------------------------------
+# test_cbc()
+#
+# Test CBC mode using the NIST test vectors, and padding with
+# all data lengths up to three blocks.
+#-------------------------------------------------------------------
+def test_cbc():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    plaintext = b"".join([BLOCK_STRUCT.pack(*v[2]) for v in AES.NIST_TEST_VECTORS[0 : 4]])
+
+    for (title, key, iv, expected) in CBC_TEST_VECTORS:
+        cbc = CBC(key, aes)
+        tc += 2
+        if cbc.encrypt(iv, plaintext, padding = False) != expected:
+            print("Error: %s, encipher failed." % title)
+            tc_errors += 1
+        if cbc.decrypt(iv, expected, padding = False) != plaintext:
+            print("Error: %s, decipher failed." % title)
+            tc_errors += 1
+
+    # PKCS#7 padding, checked against OpenSSL for "abc".
+    (title, key, iv, expected) = CBC_TEST_VECTORS[0]
+    cbc = CBC(key, aes)
+    tc += 1
+    if cbc.encrypt(iv, b"abc") != bytes.fromhex("f327e7290b9b923d29d949db2c9f75cc"):
+        print("Error: Padded encipher of 'abc' failed.")
+        tc_errors += 1
+
+    for length in range(49):
+        data = bytes(range(length))
+        ciphertext = cbc.encrypt(iv, data)
+        tc += 2
+        if len(ciphertext) != (length // 16 + 1) * 16:
+            print("Error: Padded length is wrong for %d bytes." % length)
+            tc_errors += 1
+        if cbc.decrypt(iv, ciphertext) != data:
+            print("Error: Padded round trip failed for %d bytes." % length)
+            tc_errors += 1
+
+    tc += 2
+    try:
+        cbc.decrypt(iv, cbc.encrypt(iv, bytes(15) + b"\x02", padding = False))
+        print("Error: Invalid padding not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+    try:
+        cbc.encrypt(iv, bytes(17), padding = False)
+        print("Error: Partial block without padding not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the serial encipher and batched decipher throughput.
+#-------------------------------------------------------------------
+def test_performance():
+    (title, key, iv, expected) = CBC_TEST_VECTORS[0]
+    cbc = CBC(key)
+    data = bytes(range(256)) * 1024
+
+    start = time.perf_counter()
+    ciphertext = cbc.encrypt(iv, data, padding = False)
+    elapsed = time.perf_counter() - start
+    print("encrypt: %.2f MB/s" % (len(data) / elapsed / 1e6))
+
+    start = time.perf_counter()
+    cbc.decrypt(iv, ciphertext, padding = False)
+    elapsed = time.perf_counter() - start
+    print("decrypt: %.2f MB/s" % (len(data) / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests CBC mode.
+#-------------------------------------------------------------------
+def main():
+    print("Testing AES CBC mode")
+    print("====================")
+
+    test_cbc()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_cbc.py
+#=======================================================================
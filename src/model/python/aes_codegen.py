@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_codegen.py
+# --------------
+# Code generator that compiles fully unrolled encipher and
+# decipher functions for a given key. The round key words are
+# inlined as constants and the T-tables are bound to locals.
+#
+# Note: The generated code, and any code cache written to disk,
+# contains the key material.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+import marshal
+import hmac
+import hashlib
+import tempfile
+import importlib.util
+from collections import OrderedDict
+
+from aes import AES, TE0, TE1, TE2, TE3, TE4, TD0, TD1, TD2, TD3, TD4
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_MAX_KEYS = 64
+
+# The tables bound as locals in the generated functions.
+TABLES = {"te0" : TE0, "te1" : TE1, "te2" : TE2, "te3" : TE3, "te4" : TE4,
+          "td0" : TD0, "td1" : TD1, "td2" : TD2, "td3" : TD3, "td4" : TD4}
+
+# Order of the source words for the columns in a round.
+ENC_ORDER = ((0, 1, 2, 3), (1, 2, 3, 0), (2, 3, 0, 1), (3, 0, 1, 2))
+DEC_ORDER = ((0, 3, 2, 1), (1, 0, 3, 2), (2, 1, 0, 3), (3, 2, 1, 0))
+
+
+#-------------------------------------------------------------------
+# gen_rounds_source()
+#
+# Generate the source for a function with all rounds unrolled
+# and the round key words as constants. The tables are bound
+# as locals with default arguments. t is the table prefix and
+# order the source words for each column.
+#-------------------------------------------------------------------
+def gen_rounds_source(name, t, order, rk, num_rounds):
+    src = ["def %s(block, %s0=%s0, %s1=%s1, %s2=%s2, %s3=%s3, %s4=%s4):" %
+           ((name,) + (t, t) * 5),
+           "    (s0, s1, s2, s3) = block",
+           "    s0 ^= 0x%08x" % rk[0],
+           "    s1 ^= 0x%08x" % rk[1],
+           "    s2 ^= 0x%08x" % rk[2],
+           "    s3 ^= 0x%08x" % rk[3]]
+
+    (a, b) = ("s", "t")
+    for i in range(1, num_rounds):
+        for c in range(4):
+            (w0, w1, w2, w3) = order[c]
+            src.append("    %s%d = %s0[%s%d >> 24] ^ %s1[(%s%d >> 16) & 0xff] ^ "
+                       "%s2[(%s%d >> 8) & 0xff] ^ %s3[%s%d & 0xff] ^ 0x%08x" %
+                       (b, c, t, a, w0, t, a, w1, t, a, w2, t, a, w3, rk[4 * i + c]))
+        (a, b) = (b, a)
+
+    for c in range(4):
+        (w0, w1, w2, w3) = order[c]
+        src.append("    %s%d = (%s4[%s%d >> 24] & 0xff000000) ^ "
+                   "(%s4[(%s%d >> 16) & 0xff] & 0x00ff0000) ^ "
+                   "(%s4[(%s%d >> 8) & 0xff] & 0x0000ff00) ^ "
+                   "(%s4[%s%d & 0xff] & 0x000000ff) ^ 0x%08x" %
+                   (b, c, t, a, w0, t, a, w1, t, a, w2, t, a, w3, rk[4 * num_rounds + c]))
+    src.append("    return (%s0, %s1, %s2, %s3)" % (b, b, b, b))
+
+    return "\n".join(src) + "\n"
+
+
+#-------------------------------------------------------------------
+# gen_key_source()
+#
+# Generate the source for the encipher and decipher functions
+# for the given prepared key.
+#-------------------------------------------------------------------
+def gen_key_source(prepared_key):
+    nr = prepared_key.num_rounds
+    rk = prepared_key.round_keys
+    offset = 4 * (nr + 1)
+
+    return (gen_rounds_source("encipher", "te", ENC_ORDER, rk[: offset], nr) + "\n" +
+            gen_rounds_source("decipher", "td", DEC_ORDER, rk[offset :], nr))
+
+
+#-------------------------------------------------------------------
+# load_code()
+#
+# Execute the given code object and return the generated
+# encipher and decipher functions.
+#-------------------------------------------------------------------
+def load_code(code):
+    namespace = dict(TABLES)
+    exec(code, namespace)
+    return (namespace["encipher"], namespace["decipher"])
+
+
+#-------------------------------------------------------------------
+# class CodeCache
+#
+# Cache with the generated functions for the most recently used
+# keys. The code can also be persisted to a directory on disk.
+#
+# Note that the generated code contains the round keys as
+# constants. The files in the cache directory therefore contain
+# key material and must be protected as the keys themselves. The
+# directory is created with mode 0700. File names and contents
+# are authenticated with HMAC using the salt, and files that fail
+# the check are removed and the code compiled again. Without a
+# given salt a random salt is used, which makes the files usable
+# only by this process. Code is not persisted by default.
+#-------------------------------------------------------------------
+class CodeCache():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, max_keys = DEFAULT_MAX_KEYS, cache_dir = None, salt = None):
+        if salt is None:
+            salt = os.urandom(32)
+
+        self.max_keys = max_keys
+        self.cache_dir = cache_dir
+        self.salt = bytes(salt)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_loads = 0
+        self.bad_files = 0
+        self.write_errors = 0
+        self.compiles = 0
+
+
+    #-------------------------------------------------------------------
+    # cache_path()
+    #
+    # Get the path to the file for the given key in the cache
+    # directory. The name is a HMAC of the key and the Python
+    # bytecode version since marshal is version specific.
+    #-------------------------------------------------------------------
+    def cache_path(self, key):
+        digest = hmac.new(self.salt, importlib.util.MAGIC_NUMBER +
+                          b"".join([w.to_bytes(4, "big") for w in key]), hashlib.sha256)
+        return os.path.join(self.cache_dir, "aes_%s.bin" % digest.hexdigest()[:32])
+
+
+    #-------------------------------------------------------------------
+    # file_tag()
+    #
+    # Get the HMAC that authenticates the given file contents
+    # stored at the given path.
+    #-------------------------------------------------------------------
+    def file_tag(self, path, data):
+        return hmac.new(self.salt, os.path.basename(path).encode() + data,
+                        hashlib.sha256).digest()
+
+
+    #-------------------------------------------------------------------
+    # load_file()
+    #
+    # Load the code object from the given file. Returns None if the
+    # file does not exist or can not be read. A file that is
+    # truncated, corrupt or fails the HMAC check is removed.
+    #-------------------------------------------------------------------
+    def load_file(self, path):
+        try:
+            with open(path, "rb") as f:
+                contents = f.read()
+        except OSError:
+            return None
+
+        (tag, data) = (contents[: 32], contents[32 :])
+        if hmac.compare_digest(tag, self.file_tag(path, data)):
+            try:
+                return marshal.loads(data)
+            except (EOFError, ValueError, TypeError):
+                pass
+
+        self.bad_files += 1
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+    #-------------------------------------------------------------------
+    # store_file()
+    #
+    # Store the code object in the given file. The file is written
+    # to a temporary file in the cache directory and then moved in
+    # place, so a reader never sees a partial file. The disk cache
+    # is best effort, so a failed write is counted and ignored.
+    #-------------------------------------------------------------------
+    def store_file(self, path, code):
+        data = marshal.dumps(code)
+        try:
+            os.makedirs(self.cache_dir, mode = 0o700, exist_ok = True)
+            (fd, tmp_path) = tempfile.mkstemp(dir = self.cache_dir, suffix = ".tmp")
+        except OSError:
+            self.write_errors += 1
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.file_tag(path, data) + data)
+            os.replace(tmp_path, path)
+        except BaseException as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            if not isinstance(e, OSError):
+                raise
+            self.write_errors += 1
+
+
+    #-------------------------------------------------------------------
+    # get_code()
+    #
+    # Get the code object for the given key from disk or by
+    # generating and compiling the source.
+    #-------------------------------------------------------------------
+    def get_code(self, key, aes):
+        path = None
+        if self.cache_dir is not None:
+            path = self.cache_path(key)
+            code = self.load_file(path)
+            if code is not None:
+                self.disk_loads += 1
+                return code
+
+        code = compile(gen_key_source(aes.prepare(key)), "<aes_codegen>", "exec")
+        self.compiles += 1
+
+        if path is not None:
+            self.store_file(path, code)
+
+        return code
+
+
+    #-------------------------------------------------------------------
+    # lookup()
+    #
+    # Get the encipher and decipher functions for the given key.
+    #-------------------------------------------------------------------
+    def lookup(self, key, aes):
+        cache_key = tuple(key)
+        if cache_key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(cache_key)
+            return self.entries[cache_key]
+
+        self.misses += 1
+        funcs = load_code(self.get_code(cache_key, aes))
+        self.entries[cache_key] = funcs
+        if len(self.entries) > self.max_keys:
+            self.entries.popitem(last = False)
+        return funcs
+
+
+    #-------------------------------------------------------------------
+    # clear()
+    #
+    # Remove all entries from the in memory cache.
+    #-------------------------------------------------------------------
+    def clear(self):
+        self.entries.clear()
+
+
+    #-------------------------------------------------------------------
+    # print_stats()
+    #-------------------------------------------------------------------
+    def print_stats(self):
+        print("Code cache: %d keys, %d hits, %d misses, %d compiles, %d disk loads, "
+              "%d bad files, %d write errors" %
+              (len(self.entries), self.hits, self.misses, self.compiles, self.disk_loads,
+               self.bad_files, self.write_errors))
+
+
+CODE_CACHE = CodeCache()
+
+
+#-------------------------------------------------------------------
+# class CompiledAES
+#
+# AES engine with the encipher and decipher functions generated
+# and compiled for the given key. The generated functions are
+# bound directly as encrypt_block and decrypt_block.
+#-------------------------------------------------------------------
+class CompiledAES():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, aes = None, code_cache = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+        if code_cache is None:
+            code_cache = CODE_CACHE
+
+        (self.encrypt_block, self.decrypt_block) = code_cache.lookup(key, aes)
+
+
+    #-------------------------------------------------------------------
+    # encrypt_blocks()
+    #
+    # Encipher the given blocks.
+    #-------------------------------------------------------------------
+    def encrypt_blocks(self, blocks):
+        return list(map(self.encrypt_block, blocks))
+
+
+    #-------------------------------------------------------------------
+    # decrypt_blocks()
+    #
+    # Decipher the given blocks.
+    #-------------------------------------------------------------------
+    def decrypt_blocks(self, blocks):
+        return list(map(self.decrypt_block, blocks))
+
+
+#-------------------------------------------------------------------
+# test_compiled_aes()
+#
+# Test the generated functions using the NIST test vectors, the
+# in memory cache and the cache on disk.
+#-------------------------------------------------------------------
+def test_compiled_aes():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    code_cache = CodeCache(max_keys = 1)
+
+    for (title, key, plaintext, expected) in AES.NIST_TEST_VECTORS:
+        engine = CompiledAES(key, aes, code_cache)
+        tc += 2
+        result = engine.encrypt_block(plaintext)
+        if result != expected:
+            print("Error: %s, encipher gave 0x%08x 0x%08x 0x%08x 0x%08x" %
+                  ((title,) + result))
+            tc_errors += 1
+        if engine.decrypt_block(expected) != plaintext:
+            print("Error: %s, decipher failed." % title)
+            tc_errors += 1
+
+    # Two keys with four vectors each and room for one key.
+    tc += 1
+    if (code_cache.hits, code_cache.misses) != (6, 2):
+        print("Error: Expected 6 hits and 2 misses, got %d and %d." %
+              (code_cache.hits, code_cache.misses))
+        tc_errors += 1
+
+    # Persist to a temporary directory and load back with the same
+    # salt. Then damage the file, which must be detected.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, "cache")
+        salt = b"test salt"
+        (title, key, plaintext, expected) = AES.NIST_TEST_VECTORS[4]
+        CompiledAES(key, aes, CodeCache(cache_dir = cache_dir, salt = salt))
+        disk_cache = CodeCache(cache_dir = cache_dir, salt = salt)
+        engine = CompiledAES(key, aes, disk_cache)
+        tc += 3
+        if (disk_cache.disk_loads, disk_cache.compiles) != (1, 0):
+            print("Error: Code was not loaded from the cache directory.")
+            tc_errors += 1
+        if engine.encrypt_block(plaintext) != expected:
+            print("Error: %s, encipher with code from disk failed." % title)
+            tc_errors += 1
+        if os.stat(cache_dir).st_mode & 0o077:
+            print("Error: Cache directory is accessible by others.")
+            tc_errors += 1
+
+        other_cache = CodeCache(cache_dir = cache_dir)
+        CompiledAES(key, aes, other_cache)
+        tc += 1
+        if other_cache.disk_loads != 0:
+            print("Error: Code loaded with a different salt.")
+            tc_errors += 1
+
+        path = disk_cache.cache_path(tuple(key))
+        for damage in (lambda d: d[: len(d) // 2], lambda d: d[: -1] + bytes([d[-1] ^ 1])):
+            with open(path, "rb") as f:
+                contents = f.read()
+            with open(path, "wb") as f:
+                f.write(damage(contents))
+            disk_cache = CodeCache(cache_dir = cache_dir, salt = salt)
+            engine = CompiledAES(key, aes, disk_cache)
+            tc += 2
+            if (disk_cache.bad_files, disk_cache.compiles) != (1, 1):
+                print("Error: Damaged cache file not detected.")
+                tc_errors += 1
+            if engine.encrypt_block(plaintext) != expected:
+                print("Error: %s, encipher after damaged cache file failed." % title)
+                tc_errors += 1
+
+        # A cache directory that can not be created must not make
+        # the engine fail.
+        blocker = os.path.join(tmp_dir, "file")
+        open(blocker, "wb").close()
+        disk_cache = CodeCache(cache_dir = os.path.join(blocker, "cache"))
+        engine = CompiledAES(key, aes, disk_cache)
+        tc += 2
+        if disk_cache.write_errors != 1:
+            print("Error: Failed cache write not counted.")
+            tc_errors += 1
+        if engine.encrypt_block(plaintext) != expected:
+            print("Error: %s, encipher after failed cache write failed." % title)
+            tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the compile time and the single block latency compared
+# to the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_performance():
+    aes = AES(verbose = False, dump_vars = False)
+    num_blocks = 20000
+
+    for key_len in (4, 8):
+        vectors = [v for v in AES.NIST_TEST_VECTORS if len(v[1]) == key_len]
+        (title, key, block, expected) = vectors[0]
+
+        start = time.perf_counter()
+        engine = CompiledAES(key, aes, CodeCache())
+        elapsed = time.perf_counter() - start
+        print("AES-%d compile:                    %.2f ms" % (key_len * 32, elapsed * 1e3))
+
+        for (name, func) in (("CompiledAES.encrypt_block", engine.encrypt_block),
+                             ("AESKey.encrypt_block", aes.prepare(key).encrypt_block)):
+            start = time.perf_counter()
+            for i in range(num_blocks):
+                func(block)
+            elapsed = time.perf_counter() - start
+            print("AES-%d %-27s %.2f us/block" %
+                  (key_len * 32, name + ":", elapsed / num_blocks * 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the code generated AES engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the code generated AES engine")
+    print("=====================================")
+
+    test_compiled_aes()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_codegen.py
+#=======================================================================
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_ctr.py
+# ----------
+# CTR mode on top of the AES model with a configurable counter
+# layout, random access to the keystream and keystream generation
+# in batches, optionally split over a process pool.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aes import AES, BLOCK_STRUCT
+from aes_engines import batch_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_BATCH_BLOCKS = 4096
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+COUNTER_BITS = (32, 64, 128)
+
+# CTR test vectors from NIST SP 800-38A, F.5.1 and F.5.5. The
+# initial counter block is f0f1...feff for both.
+CTR_TEST_VECTORS = [
+    ("CTR-AES128", AES.NIST_TEST_VECTORS[0][1],
+     bytes.fromhex("874d6191b620e3261bef6864990db6ce"
+                   "9806f66b7970fdff8617187bb9fffdff"
+                   "5ae4df3edbd5d35e5b4f09020db03eab"
+                   "1e031dda2fbe03d1792170a0f3009cee")),
+    ("CTR-AES256", AES.NIST_TEST_VECTORS[4][1],
+     bytes.fromhex("601ec313775789a5b7a7f504bbf3d228"
+                   "f443e3ca4d62b59aca84e990cacaf5c5"
+                   "2b0930daa23de94ce87017ba2d84988d"
+                   "dfc9c58db67aada613c2dd08457941a6"))]
+
+
+#-------------------------------------------------------------------
+# class CTR
+#
+# CTR mode on top of the AES model. The counter block is the
+# nonce followed by a 32, 64 or 128 bit big endian counter which
+# wraps within its field. At most 2^counter_bits blocks can be
+# processed from the initial counter, after which the keystream
+# would repeat. The position in the keystream can be set to any
+# byte offset with seek(), and the keystream is generated in
+# batches by the batch engine.
+#-------------------------------------------------------------------
+class CTR():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, nonce, counter_bits = 32, initial_counter = 0,
+                 aes = None, engine = None, batch_blocks = DEFAULT_BATCH_BLOCKS):
+        if counter_bits not in COUNTER_BITS:
+            raise ValueError("Counter must be 32, 64 or 128 bits, not %d bits." % counter_bits)
+        if len(nonce) * 8 + counter_bits != 128:
+            raise ValueError("Nonce must be %d bytes with a %d bit counter." %
+                             ((128 - counter_bits) // 8, counter_bits))
+        self.custom_engine = engine is not None
+        if engine is None:
+            engine = batch_engine(key, aes)
+
+        self.key = tuple(key)
+        self.nonce = bytes(nonce)
+        self.counter_bits = counter_bits
+        self.counter_mask = (1 << counter_bits) - 1
+        self.initial_counter = initial_counter & self.counter_mask
+        self.max_bytes = 16 << counter_bits
+        self.engine = engine
+        self.batch_blocks = batch_blocks
+        self.position = 0
+
+
+    #-------------------------------------------------------------------
+    # seek()
+    #
+    # Set the position in the keystream to the given byte offset.
+    #-------------------------------------------------------------------
+    def seek(self, offset):
+        if offset < 0 or offset > self.max_bytes:
+            raise ValueError("Offset must be between 0 and %d." % self.max_bytes)
+        self.position = offset
+
+
+    #-------------------------------------------------------------------
+    # check_length()
+    #
+    # Check that length bytes from the given offset do not pass the
+    # end of the keystream.
+    #-------------------------------------------------------------------
+    def check_length(self, offset, length):
+        if offset + length > self.max_bytes:
+            raise ValueError("Keystream with a %d bit counter exhausted." % self.counter_bits)
+
+
+    #-------------------------------------------------------------------
+    # tell()
+    #
+    # Return the current byte offset in the keystream.
+    #-------------------------------------------------------------------
+    def tell(self):
+        return self.position
+
+
+    #-------------------------------------------------------------------
+    # counter_blocks()
+    #
+    # Return the num_blocks counter blocks starting at the given
+    # block index as bytes.
+    #-------------------------------------------------------------------
+    def counter_blocks(self, block_index, num_blocks):
+        nonce = self.nonce
+        mask = self.counter_mask
+        counter_len = self.counter_bits // 8
+        counter = self.initial_counter + block_index
+
+        return b"".join([nonce + ((counter + i) & mask).to_bytes(counter_len, "big")
+                         for i in range(num_blocks)])
+
+
+    #-------------------------------------------------------------------
+    # keystream()
+    #
+    # Return num_blocks keystream blocks starting at the given
+    # block index.
+    #-------------------------------------------------------------------
+    def keystream(self, block_index, num_blocks):
+        self.check_length(16 * block_index, 16 * num_blocks)
+        return self.engine.encrypt(self.counter_blocks(block_index, num_blocks))
+
+
+    #-------------------------------------------------------------------
+    # crypt()
+    #
+    # Encipher or decipher the given data at the current position
+    # and advance the position. The keystream is generated and
+    # XORed with the data one batch at a time.
+    #-------------------------------------------------------------------
+    def crypt(self, data):
+        data = memoryview(data).cast("B")
+        self.check_length(self.position, len(data))
+        res = bytearray()
+        done = 0
+
+        while done < len(data):
+            (block_index, skip) = divmod(self.position, 16)
+            length = min(len(data) - done, 16 * self.batch_blocks - skip)
+            num_blocks = (skip + length + 15) // 16
+            stream = self.keystream(block_index, num_blocks)[skip : skip + length]
+            chunk = int.from_bytes(data[done : done + length], "big") ^\
+                    int.from_bytes(stream, "big")
+            res += chunk.to_bytes(length, "big")
+            done += length
+            self.position += length
+
+        return bytes(res)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given data at the current position.
+    #-------------------------------------------------------------------
+    def encrypt(self, data):
+        return self.crypt(data)
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given data at the current position.
+    #-------------------------------------------------------------------
+    def decrypt(self, data):
+        return self.crypt(data)
+
+
+    #-------------------------------------------------------------------
+    # crypt_parallel()
+    #
+    # Encipher or decipher the given data at the current position
+    # with the counter range split into one segment per worker
+    # process. Data smaller than min_bytes is processed in this
+    # process. The workers use the default batch engine, so a CTR
+    # created with a custom engine is rejected.
+    #-------------------------------------------------------------------
+    def crypt_parallel(self, data, workers = None, min_bytes = PARALLEL_MIN_BYTES):
+        if self.custom_engine:
+            raise ValueError("crypt_parallel() does not support a custom engine.")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if len(data) < min_bytes or workers < 2:
+            return self.crypt(data)
+
+        data = memoryview(data).cast("B")
+        self.check_length(self.position, len(data))
+        segment_len = (len(data) // workers + 15) & ~15
+        params = (self.key, self.nonce, self.counter_bits, self.initial_counter,
+                  self.batch_blocks)
+        offsets = range(0, len(data), segment_len)
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = [executor.submit(crypt_segment, params, self.position + start,
+                                       bytes(data[start : start + segment_len]))
+                       for start in offsets]
+            res = b"".join([f.result() for f in futures])
+
+        self.position += len(data)
+        return res
+
+
+#-------------------------------------------------------------------
+# crypt_segment()
+#
+# Worker function for crypt_parallel(). Processes one segment of
+# the data at the given offset in the keystream.
+#-------------------------------------------------------------------
+def crypt_segment(params, offset, data):
+    (key, nonce, counter_bits, initial_counter, batch_blocks) = params
+    ctr = CTR(key, nonce, counter_bits, initial_counter, batch_blocks = batch_blocks)
+    ctr.seek(offset)
+    return ctr.crypt(data)
+
+
+#-------------------------------------------------------------------
+# test_ctr()
+#
+# Test CTR mode using the NIST test vectors with all counter
+# layouts, seek to arbitrary offsets, counter wrap and the
+# process pool path.
+#-------------------------------------------------------------------
+def test_ctr():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    plaintext = b"".join([BLOCK_STRUCT.pack(*v[2]) for v in AES.NIST_TEST_VECTORS[0 : 4]])
+    counter_block = bytes.fromhex("f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff")
+
+    for (title, key, expected) in CTR_TEST_VECTORS:
+        for counter_bits in COUNTER_BITS:
+            nonce_len = 16 - counter_bits // 8
+            ctr = CTR(key, counter_block[: nonce_len], counter_bits,
+                      int.from_bytes(counter_block[nonce_len :], "big"), aes)
+            tc += 2
+            if ctr.encrypt(plaintext) != expected:
+                print("Error: %s, encipher with %d bit counter failed." % (title, counter_bits))
+                tc_errors += 1
+            ctr.seek(0)
+            if ctr.decrypt(expected) != plaintext:
+                print("Error: %s, decipher with %d bit counter failed." % (title, counter_bits))
+                tc_errors += 1
+
+    # Random access with small batches so that reads cross batches.
+    (title, key, expected) = CTR_TEST_VECTORS[0]
+    ctr = CTR(key, b"\x01" * 8, 64, 5, aes, batch_blocks = 3)
+    data = bytes(range(256)) * 4
+    ciphertext = ctr.encrypt(data)
+    for (offset, length) in ((0, 1), (7, 50), (16, 16), (100, 333), (1000, 24)):
+        ctr.seek(offset)
+        tc += 1
+        if ctr.decrypt(ciphertext[offset : offset + length]) != data[offset : offset + length]:
+            print("Error: Decipher after seek to %d failed." % offset)
+            tc_errors += 1
+
+    # The counter wraps within its field.
+    ctr = CTR(key, bytes(12), 32, 0xffffffff, aes)
+    prepared_key = aes.prepare(key)
+    tc += 1
+    if ctr.encrypt(bytes(32)) != prepared_key.encrypt(bytes(12) + b"\xff" * 4 + bytes(16)):
+        print("Error: Counter wrap failed.")
+        tc_errors += 1
+
+    # The counter value wraps but the keystream from the initial
+    # counter must not repeat.
+    ctr = CTR(key, bytes(12), 32, 5, aes)
+    ctr.seek(16 * (2**32 - 1))
+    ctr.crypt(bytes(16))
+    for (offset, length) in ((16 * (2**32 - 1), 17), (16 * 2**32 + 1, 0)):
+        tc += 1
+        try:
+            ctr.seek(offset)
+            ctr.crypt(bytes(length))
+            print("Error: Keystream past the counter range not rejected.")
+            tc_errors += 1
+        except ValueError:
+            pass
+
+    ctr = CTR(key, bytes(8), 64, 0, aes)
+    data = bytes(range(256)) * 64
+    expected = ctr.crypt(data)
+    ctr.seek(0)
+    tc += 1
+    if ctr.crypt_parallel(data, workers = 2, min_bytes = 0) != expected:
+        print("Error: Parallel CTR differs from serial CTR.")
+        tc_errors += 1
+
+    tc += 1
+    try:
+        CTR(key, bytes(8), 64, engine = ctr.engine).crypt_parallel(data, 2, 0)
+        print("Error: Custom engine not rejected by crypt_parallel().")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    tc += 1
+    try:
+        CTR(key, bytes(12), 64)
+        print("Error: Wrong nonce length not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the throughput in this process and with the process
+# pool, and the time for a random access read.
+#-------------------------------------------------------------------
+def test_performance():
+    key = AES.NIST_TEST_VECTORS[0][1]
+    ctr = CTR(key, bytes(12))
+    data = bytes(8 * 1024 * 1024)
+
+    for (name, func) in (("crypt", ctr.crypt), ("crypt_parallel", ctr.crypt_parallel)):
+        ctr.seek(0)
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        print("%-15s %.1f MB/s" % (name + ":", len(data) / elapsed / 1e6))
+
+    start = time.perf_counter()
+    ctr.seek(7 * 1024 * 1024 * 1024 + 5)
+    ctr.crypt(bytes(4096))
+    elapsed = time.perf_counter() - start
+    print("4 kB read at 7 GB offset: %.2f ms" % (elapsed * 1e3))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests CTR mode.
+#-------------------------------------------------------------------
+def main():
+    print("Testing AES CTR mode")
+    print("====================")
+
+    test_ctr()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_ctr.py
+#=======================================================================
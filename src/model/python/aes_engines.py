@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_engines.py
+# --------------
+# Selection of the batch engine used for processing many blocks
+# under one key. NumPy is optional.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+
+from aes import AES
+from aes_byteslice import BytesliceAES
+
+try:
+    from aes_numpy import NumpyAES
+    HAVE_NUMPY = True
+except ImportError:
+    HAVE_NUMPY = False
+
+
+#-------------------------------------------------------------------
+# batch_engine()
+#
+# Return the fastest available engine for processing many blocks
+# under the given key. The NumPy engine is used if NumPy can be
+# imported, otherwise the byte-sliced engine. Both engines have
+# encrypt() and decrypt() methods taking and returning bytes.
+#-------------------------------------------------------------------
+def batch_engine(key, aes = None):
+    if HAVE_NUMPY:
+        return NumpyAES(key, aes)
+    return BytesliceAES(key, aes = aes)
+
+
+#-------------------------------------------------------------------
+# test_batch_engine()
+#
+# Test the selected engine using the NIST test vectors.
+#-------------------------------------------------------------------
+def test_batch_engine():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+
+    for (title, key, plaintext, expected) in AES.NIST_TEST_VECTORS:
+        engine = batch_engine(key, aes)
+        plaintext = b"".join([w.to_bytes(4, "big") for w in plaintext])
+        expected = b"".join([w.to_bytes(4, "big") for w in expected])
+        tc += 2
+        if engine.encrypt(plaintext) != expected:
+            print("Error: %s, encipher failed." % title)
+            tc_errors += 1
+        if engine.decrypt(expected) != plaintext:
+            print("Error: %s, decipher failed." % title)
+            tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the selected batch engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the batch engine")
+    print("========================")
+    print("Engine: %s" % ("NumpyAES" if HAVE_NUMPY else "BytesliceAES"))
+
+    test_batch_engine()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_engines.py
+#=======================================================================
@@ -0,0 +1,844 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_gcm.py
+# ----------
+# GCM mode on top of the AES model. GHASH uses per key Shoup
+# tables with 4 or 8 bit entries instead of bit serial
+# multiplication in GF(2^128). Large messages can be split over
+# a process pool with the segment hashes combined using powers
+# of H.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+import struct
+import os
+import hmac
+from concurrent.futures import ProcessPoolExecutor
+
+from aes import AES
+from aes_ctr import CTR
+from aes_engines import batch_engine
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+TABLE_BITS = (4, 8)
+
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+# The reduction polynomial x^128 + x^7 + x^2 + x + 1 in the
+# reflected bit order used by GCM.
+GF128_R = 0xe1 << 120
+
+# GCM test vectors from the GCM specification submitted with
+# NIST SP 800-38D, test cases 1-6 and 13-16. Test cases 5 and 6
+# use 64 and 480 bit IVs.
+GCM_PLAINTEXT = bytes.fromhex("d9313225f88406e5a55909c5aff5269a"
+                              "86a7a9531534f7da2e4c303d8a318a72"
+                              "1c3c0c95956809532fcf0e2449a6b525"
+                              "b16aedf5aa0de657ba637b391aafd255")
+GCM_AAD = bytes.fromhex("feedfacedeadbeeffeedfacedeadbeefabaddad2")
+GCM_KEY = bytes.fromhex("feffe9928665731c6d6a8f9467308308")
+GCM_IV = bytes.fromhex("cafebabefacedbaddecaf888")
+
+GCM_TEST_VECTORS = [
+    ("Test case 1", bytes(16), bytes(12), b"", b"", b"",
+     bytes.fromhex("58e2fccefa7e3061367f1d57a4e7455a")),
+    ("Test case 2", bytes(16), bytes(12), bytes(16), b"",
+     bytes.fromhex("0388dace60b6a392f328c2b971b2fe78"),
+     bytes.fromhex("ab6e47d42cec13bdf53a67b21257bddf")),
+    ("Test case 3", GCM_KEY, GCM_IV, GCM_PLAINTEXT, b"",
+     bytes.fromhex("42831ec2217774244b7221b784d0d49c"
+                   "e3aa212f2c02a4e035c17e2329aca12e"
+                   "21d514b25466931c7d8f6a5aac84aa05"
+                   "1ba30b396a0aac973d58e091473f5985"),
+     bytes.fromhex("4d5c2af327cd64a62cf35abd2ba6fab4")),
+    ("Test case 4", GCM_KEY, GCM_IV, GCM_PLAINTEXT[: 60], GCM_AAD,
+     bytes.fromhex("42831ec2217774244b7221b784d0d49c"
+                   "e3aa212f2c02a4e035c17e2329aca12e"
+                   "21d514b25466931c7d8f6a5aac84aa05"
+                   "1ba30b396a0aac973d58e091"),
+     bytes.fromhex("5bc94fbc3221a5db94fae95ae7121a47")),
+    ("Test case 5", GCM_KEY, bytes.fromhex("cafebabefacedbad"),
+     GCM_PLAINTEXT[: 60], GCM_AAD,
+     bytes.fromhex("61353b4c2806934a777ff51fa22a4755"
+                   "699b2a714fcdc6f83766e5f97b6c7423"
+                   "73806900e49f24b22b097544d4896b42"
+                   "4989b5e1ebac0f07c23f4598"),
+     bytes.fromhex("3612d2e79e3b0785561be14aaca2fccb")),
+    ("Test case 6", GCM_KEY,
+     bytes.fromhex("9313225df88406e555909c5aff5269aa"
+                   "6a7a9538534f7da1e4c303d2a318a728"
+                   "c3c0c95156809539fcf0e2429a6b5254"
+                   "16aedbf5a0de6a57a637b39b"),
+     GCM_PLAINTEXT[: 60], GCM_AAD,
+     bytes.fromhex("8ce24998625615b603a033aca13fb894"
+                   "be9112a5c3a211a8ba262a3cca7e2ca7"
+                   "01e4a9a4fba43c90ccdcb281d48c7c6f"
+                   "d62875d2aca417034c34aee5"),
+     bytes.fromhex("619cc5aefffe0bfa462af43c1699d050")),
+    ("Test case 13", bytes(32), bytes(12), b"", b"", b"",
+     bytes.fromhex("530f8afbc74536b9a963b4f1c4cb738b")),
+    ("Test case 14", bytes(32), bytes(12), bytes(16), b"",
+     bytes.fromhex("cea7403d4d606b6e074ec5d3baf39d18"),
+     bytes.fromhex("d0d1c8a799996bf0265b98b5d48ab919")),
+    ("Test case 15", GCM_KEY * 2, GCM_IV, GCM_PLAINTEXT, b"",
+     bytes.fromhex("522dc1f099567d07f47f37a32a84427d"
+                   "643a8cdcbfe5c0c97598a2bd2555d1aa"
+                   "8cb08e48590dbb3da7b08b1056828838"
+                   "c5f61e6393ba7a0abcc9f662898015ad"),
+     bytes.fromhex("b094dac5d93471bdec1a502270e3cc6c")),
+    ("Test case 16", GCM_KEY * 2, GCM_IV, GCM_PLAINTEXT[: 60], GCM_AAD,
+     bytes.fromhex("522dc1f099567d07f47f37a32a84427d"
+                   "643a8cdcbfe5c0c97598a2bd2555d1aa"
+                   "8cb08e48590dbb3da7b08b1056828838"
+                   "c5f61e6393ba7a0abcc9f662"),
+     bytes.fromhex("76fc6ece0f4e1768cddf8853bb2d551b"))]
+
+
+#-------------------------------------------------------------------
+# gf128_mult()
+#
+# Bit serial multiplication of x and y in GF(2^128) as specified
+# in SP 800-38D. Bit 127 of the integers is the coefficient for
+# x^0. Used to build and check the tables.
+#-------------------------------------------------------------------
+def gf128_mult(x, y):
+    z = 0
+    v = y
+    for i in range(127, -1, -1):
+        if (x >> i) & 1:
+            z ^= v
+        v = (v >> 1) ^ (GF128_R if v & 1 else 0)
+    return z
+
+
+#-------------------------------------------------------------------
+# gen_m_table()
+#
+# Generate the Shoup table with H multiplied by every polynomial
+# of the given number of bits. The most significant bit of the
+# table index is the coefficient for x^0.
+#-------------------------------------------------------------------
+def gen_m_table(h, bits):
+    m = [0] * (1 << bits)
+    v = h
+    for i in range(bits - 1, -1, -1):
+        m[1 << i] = v
+        v = (v >> 1) ^ (GF128_R if v & 1 else 0)
+
+    for n in range(1, 1 << bits):
+        if n & (n - 1):
+            m[n] = m[n & (n - 1)] ^ m[n & -n]
+    return m
+
+
+#-------------------------------------------------------------------
+# gen_r_table()
+#
+# Generate the table with the reduction of the given number of
+# bits shifted out when multiplying by x^bits.
+#-------------------------------------------------------------------
+def gen_r_table(bits):
+    r = []
+    for n in range(1 << bits):
+        v = n
+        for i in range(bits):
+            v = (v >> 1) ^ (GF128_R if v & 1 else 0)
+        r.append(v)
+    return r
+
+
+R_TABLES = {4 : gen_r_table(4), 8 : gen_r_table(8)}
+
+
+#-------------------------------------------------------------------
+# key_words()
+#
+# Convert a key given as bytes to the tuple of words used by the
+# AES model.
+#-------------------------------------------------------------------
+def key_words(key):
+    return struct.unpack(">%dI" % (len(key) // 4), key)
+
+
+#-------------------------------------------------------------------
+# class GHash
+#
+# GHASH with per key Shoup tables. With 4 bit tables H is
+# multiplied one nibble at a time using 16 entry tables, with 8
+# bit tables one byte at a time using 256 entry tables.
+#-------------------------------------------------------------------
+class GHash():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, h, table_bits = 8):
+        if table_bits not in TABLE_BITS:
+            raise ValueError("Table must be 4 or 8 bits, not %d bits." % table_bits)
+
+        start = time.perf_counter()
+        self.h = h
+        self.table_bits = table_bits
+        self.m = gen_m_table(h, table_bits)
+        self.r = R_TABLES[table_bits]
+        self.powers = [h]
+        self.build_time = time.perf_counter() - start
+
+
+    #-------------------------------------------------------------------
+    # mult_h()
+    #
+    # Multiply x with H.
+    #-------------------------------------------------------------------
+    def mult_h(self, x):
+        return self.update(0, x.to_bytes(16, "big"))
+
+
+    #-------------------------------------------------------------------
+    # h_power()
+    #
+    # Return H^k. The table with H^(2^i) is extended as needed and
+    # kept with the key.
+    #-------------------------------------------------------------------
+    def h_power(self, k):
+        if k < 1:
+            raise ValueError("Power must be at least 1.")
+        while len(self.powers) < k.bit_length():
+            self.powers.append(gf128_mult(self.powers[-1], self.powers[-1]))
+
+        res = None
+        for i in range(k.bit_length()):
+            if (k >> i) & 1:
+                res = self.powers[i] if res is None else gf128_mult(res, self.powers[i])
+        return res
+
+
+    #-------------------------------------------------------------------
+    # combine()
+    #
+    # Return the GHASH state after the state y has been followed
+    # by a segment of num_blocks blocks. x is the GHASH of the
+    # segment alone, starting from zero.
+    #-------------------------------------------------------------------
+    def combine(self, y, x, num_blocks):
+        if y == 0 or num_blocks == 0:
+            return y ^ x
+        return gf128_mult(y, self.h_power(num_blocks)) ^ x
+
+
+    #-------------------------------------------------------------------
+    # update()
+    #
+    # Update the GHASH state y with the given data. A final
+    # partial block is padded with zeros.
+    #-------------------------------------------------------------------
+    def update(self, y, data):
+        if len(data) % 16:
+            data = bytes(data) + bytes(16 - len(data) % 16)
+        if self.table_bits == 8:
+            return self.update8(y, data)
+        return self.update4(y, data)
+
+
+    #-------------------------------------------------------------------
+    # update8()
+    #
+    # Update with whole blocks using the 8 bit tables. The bytes of
+    # each block are processed starting with the highest degree.
+    #-------------------------------------------------------------------
+    def update8(self, y, data):
+        m = self.m
+        r = self.r
+        for i in range(0, len(data), 16):
+            z = 0
+            for b in (y ^ int.from_bytes(data[i : i + 16], "big")).to_bytes(16, "little"):
+                z = (z >> 8) ^ r[z & 0xff] ^ m[b]
+            y = z
+        return y
+
+
+    #-------------------------------------------------------------------
+    # update4()
+    #
+    # Update with whole blocks using the 4 bit tables.
+    #-------------------------------------------------------------------
+    def update4(self, y, data):
+        m = self.m
+        r = self.r
+        for i in range(0, len(data), 16):
+            z = 0
+            for b in (y ^ int.from_bytes(data[i : i + 16], "big")).to_bytes(16, "little"):
+                z = (z >> 4) ^ r[z & 0xf] ^ m[b & 0xf]
+                z = (z >> 4) ^ r[z & 0xf] ^ m[b >> 4]
+            y = z
+        return y
+
+
+    #-------------------------------------------------------------------
+    # memory_size()
+    #
+    # Return the size in bytes of the per key table.
+    #-------------------------------------------------------------------
+    def memory_size(self):
+        return sys.getsizeof(self.m) + sum([sys.getsizeof(v) for v in self.m])
+
+
+#-------------------------------------------------------------------
+# class GCMStream
+#
+# Incremental GCM encipher or decipher with one IV. AAD is added
+# with update_aad() before the data is processed with update().
+# finalize() returns the tag, or checks the given tag when
+# deciphering.
+#-------------------------------------------------------------------
+class GCMStream():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, gcm, iv, decrypt = False):
+        j0 = gcm.j0(iv)
+        self.ghash = gcm.ghash
+        self.decrypt = decrypt
+        self.ctr = CTR(gcm.key, j0[: 12], 32, int.from_bytes(j0[12 :], "big"),
+                       engine = gcm.engine)
+        self.tag_mask = int.from_bytes(self.ctr.keystream(0, 1), "big")
+        self.ctr.seek(16)
+        self.y = 0
+        self.pending = b""
+        self.aad_len = 0
+        self.data_len = 0
+        self.data_started = False
+        self.done = False
+
+
+    #-------------------------------------------------------------------
+    # absorb()
+    #
+    # Add data to GHASH, keeping a final partial block pending.
+    #-------------------------------------------------------------------
+    def absorb(self, data):
+        data = self.pending + bytes(data)
+        full = len(data) - len(data) % 16
+        self.y = self.ghash.update(self.y, data[: full])
+        self.pending = data[full :]
+
+
+    #-------------------------------------------------------------------
+    # flush()
+    #
+    # Add the pending partial block padded with zeros.
+    #-------------------------------------------------------------------
+    def flush(self):
+        self.y = self.ghash.update(self.y, self.pending)
+        self.pending = b""
+
+
+    #-------------------------------------------------------------------
+    # update_aad()
+    #
+    # Add additional authenticated data.
+    #-------------------------------------------------------------------
+    def update_aad(self, data):
+        if self.done:
+            raise ValueError("GCM stream already finalized.")
+        if self.data_started:
+            raise ValueError("AAD must be added before the data.")
+        self.absorb(data)
+        self.aad_len += len(data)
+
+
+    #-------------------------------------------------------------------
+    # update()
+    #
+    # Encipher or decipher the given data and return the result.
+    #-------------------------------------------------------------------
+    def update(self, data):
+        if self.done:
+            raise ValueError("GCM stream already finalized.")
+        if not self.data_started:
+            self.flush()
+            self.data_started = True
+
+        res = self.ctr.crypt(data)
+        self.absorb(data if self.decrypt else res)
+        self.data_len += len(data)
+        return res
+
+
+    #-------------------------------------------------------------------
+    # finalize()
+    #
+    # Complete GHASH with the length block and return the tag.
+    # When deciphering the tag is compared with the given tag and
+    # ValueError raised if they differ.
+    #-------------------------------------------------------------------
+    def finalize(self, tag = None):
+        if self.done:
+            raise ValueError("GCM stream already finalized.")
+        self.done = True
+
+        self.flush()
+        lengths = struct.pack(">QQ", self.aad_len * 8, self.data_len * 8)
+        y = self.ghash.update(self.y, lengths)
+        res = (y ^ self.tag_mask).to_bytes(16, "big")
+
+        if self.decrypt:
+            if tag is None or not hmac.compare_digest(res, bytes(tag)):
+                raise ValueError("GCM tag mismatch.")
+        return res
+
+
+#-------------------------------------------------------------------
+# class GCM
+#
+# GCM mode on top of the AES model. The keystream is generated
+# by CTR mode with a 32 bit counter and GHASH uses the per key
+# Shoup tables of the selected size.
+#-------------------------------------------------------------------
+class GCM():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, table_bits = 8, aes = None, engine = None):
+        self.custom_engine = engine is not None
+        if engine is None:
+            engine = batch_engine(key, aes)
+
+        self.key = tuple(key)
+        self.engine = engine
+        self.ghash = GHash(int.from_bytes(engine.encrypt(bytes(16)), "big"), table_bits)
+
+
+    #-------------------------------------------------------------------
+    # j0()
+    #
+    # Return the pre-counter block for the given IV. A 96 bit IV is
+    # used directly, other lengths are hashed with GHASH.
+    #-------------------------------------------------------------------
+    def j0(self, iv):
+        if len(iv) == 0:
+            raise ValueError("IV must not be empty.")
+        if len(iv) == 12:
+            return bytes(iv) + b"\x00\x00\x00\x01"
+
+        y = self.ghash.update(0, iv)
+        y = self.ghash.update(y, struct.pack(">QQ", 0, len(iv) * 8))
+        return y.to_bytes(16, "big")
+
+
+    #-------------------------------------------------------------------
+    # encryptor()
+    #
+    # Return an incremental encipher stream for the given IV.
+    #-------------------------------------------------------------------
+    def encryptor(self, iv):
+        return GCMStream(self, iv)
+
+
+    #-------------------------------------------------------------------
+    # decryptor()
+    #
+    # Return an incremental decipher stream for the given IV.
+    #-------------------------------------------------------------------
+    def decryptor(self, iv):
+        return GCMStream(self, iv, decrypt = True)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given data and authenticate it together with
+    # the AAD. Returns the ciphertext and the tag.
+    #-------------------------------------------------------------------
+    def encrypt(self, iv, data, aad = b""):
+        stream = self.encryptor(iv)
+        stream.update_aad(aad)
+        res = stream.update(data)
+        return (res, stream.finalize())
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Check the tag and decipher the given data. Raises ValueError
+    # if the tag does not match.
+    #-------------------------------------------------------------------
+    def decrypt(self, iv, data, tag, aad = b""):
+        stream = self.decryptor(iv)
+        stream.update_aad(aad)
+        res = stream.update(data)
+        stream.finalize(tag)
+        return res
+
+
+    #-------------------------------------------------------------------
+    # encrypt_parallel()
+    #
+    # Encipher the given data like encrypt() with the work split
+    # over a process pool. Data smaller than min_bytes is processed
+    # in this process.
+    #-------------------------------------------------------------------
+    def encrypt_parallel(self, iv, data, aad = b"", workers = None,
+                         min_bytes = PARALLEL_MIN_BYTES):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if len(data) < min_bytes or workers < 2:
+            return self.encrypt(iv, data, aad)
+        return self.crypt_parallel(iv, data, aad, False, workers)
+
+
+    #-------------------------------------------------------------------
+    # decrypt_parallel()
+    #
+    # Check the tag and decipher the given data like decrypt() with
+    # the work split over a process pool.
+    #-------------------------------------------------------------------
+    def decrypt_parallel(self, iv, data, tag, aad = b"", workers = None,
+                         min_bytes = PARALLEL_MIN_BYTES):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if len(data) < min_bytes or workers < 2:
+            return self.decrypt(iv, data, tag, aad)
+
+        (res, expected) = self.crypt_parallel(iv, data, aad, True, workers)
+        if not hmac.compare_digest(expected, bytes(tag)):
+            raise ValueError("GCM tag mismatch.")
+        return res
+
+
+    #-------------------------------------------------------------------
+    # crypt_parallel()
+    #
+    # Encipher or decipher the data with one segment per worker
+    # process. Each worker generates the keystream for its segment
+    # and the GHASH of the segment ciphertext starting from zero.
+    # The segment hashes are then combined in order using powers
+    # of H. Returns the result and the tag. The workers use the
+    # default batch engine, so a GCM created with a custom engine
+    # is rejected.
+    #-------------------------------------------------------------------
+    def crypt_parallel(self, iv, data, aad, decrypt, workers):
+        if self.custom_engine:
+            raise ValueError("Parallel GCM does not support a custom engine.")
+        j0 = self.j0(iv)
+        data = memoryview(data).cast("B")
+        segment_len = max(16, (len(data) // workers + 15) & ~15)
+        params = (self.key, self.ghash.h, self.ghash.table_bits,
+                  j0[: 12], int.from_bytes(j0[12 :], "big"))
+        offsets = range(0, len(data), segment_len)
+
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = [executor.submit(crypt_segment, params, start,
+                                       bytes(data[start : start + segment_len]), decrypt)
+                       for start in offsets]
+            segments = [f.result() for f in futures]
+
+        y = self.ghash.update(0, aad)
+        for (res, x) in segments:
+            y = self.ghash.combine(y, x, (len(res) + 15) // 16)
+        y = self.ghash.update(y, struct.pack(">QQ", len(aad) * 8, len(data) * 8))
+        tag_mask = int.from_bytes(self.engine.encrypt(j0), "big")
+
+        return (b"".join([res for (res, x) in segments]),
+                (y ^ tag_mask).to_bytes(16, "big"))
+
+
+#-------------------------------------------------------------------
+# crypt_segment()
+#
+# Worker function for GCM.crypt_parallel(). Processes one segment
+# of the data at the given offset and returns the result and the
+# GHASH of the segment ciphertext.
+#-------------------------------------------------------------------
+def crypt_segment(params, offset, data, decrypt):
+    (key, h, table_bits, nonce, counter) = params
+    ctr = CTR(key, nonce, 32, counter)
+    ctr.seek(16 + offset)
+    res = ctr.crypt(data)
+    ghash = GHash(h, table_bits)
+    return (res, ghash.update(0, data if decrypt else res))
+
+
+#-------------------------------------------------------------------
+# test_ghash()
+#
+# Test the table driven multiplication against the bit serial
+# multiplication for both table sizes.
+#-------------------------------------------------------------------
+def test_ghash():
+    tc_errors = 0
+    tc        = 0
+    values = [0, 1, 1 << 127, (1 << 128) - 1, 0x66e94bd4ef8a2c3b884cfa59ca342b2e,
+              0x0388dace60b6a392f328c2b971b2fe78, 0xb83b533708bf535d0aa6e52980d53b78]
+
+    for table_bits in TABLE_BITS:
+        for h in values:
+            ghash = GHash(h, table_bits)
+            for x in values:
+                tc += 1
+                if ghash.mult_h(x) != gf128_mult(x, h):
+                    print("Error: %d bit table, %032x * %032x failed." % (table_bits, x, h))
+                    tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_gcm()
+#
+# Test GCM mode using the test vectors for both table sizes,
+# incremental processing with uneven pieces, a non 96 bit IV and
+# rejection of a wrong tag.
+#-------------------------------------------------------------------
+def test_gcm():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+
+    for (title, key, iv, plaintext, aad, expected, tag) in GCM_TEST_VECTORS:
+        for table_bits in TABLE_BITS:
+            gcm = GCM(key_words(key), table_bits, aes)
+            tc += 2
+            if gcm.encrypt(iv, plaintext, aad) != (expected, tag):
+                print("Error: %s, encipher with %d bit table failed." % (title, table_bits))
+                tc_errors += 1
+            if gcm.decrypt(iv, expected, tag, aad) != plaintext:
+                print("Error: %s, decipher with %d bit table failed." % (title, table_bits))
+                tc_errors += 1
+
+    # AAD after an empty update() must be rejected, for both
+    # encipher and decipher.
+    (title, key, iv, plaintext, aad, expected, tag) = GCM_TEST_VECTORS[3]
+    gcm = GCM(key_words(key), aes = aes)
+    for stream in (gcm.encryptor(iv), gcm.decryptor(iv)):
+        stream.update_aad(b"abc")
+        stream.update(b"")
+        tc += 1
+        try:
+            stream.update_aad(b"def")
+            print("Error: AAD after update() not rejected.")
+            tc_errors += 1
+        except ValueError:
+            pass
+
+    # Incremental processing in pieces that do not match blocks.
+    (title, key, iv, plaintext, aad, expected, tag) = GCM_TEST_VECTORS[3]
+    gcm = GCM(key_words(key), aes = aes)
+    for size in (1, 5, 16, 17):
+        stream = gcm.encryptor(iv)
+        for i in range(0, len(aad), size):
+            stream.update_aad(aad[i : i + size])
+        res = b"".join([stream.update(plaintext[i : i + size])
+                        for i in range(0, len(plaintext), size)])
+        tc += 1
+        if (res, stream.finalize()) != (expected, tag):
+            print("Error: Incremental encipher in %d byte pieces failed." % size)
+            tc_errors += 1
+
+    # A non 96 bit IV is hashed, the result must differ from the
+    # 96 bit IV and still round trip.
+    (ciphertext, long_tag) = gcm.encrypt(iv + b"\x00", plaintext, aad)
+    tc += 2
+    if ciphertext == expected:
+        print("Error: 104 bit IV gives the same ciphertext as the 96 bit IV.")
+        tc_errors += 1
+    if gcm.decrypt(iv + b"\x00", ciphertext, long_tag, aad) != plaintext:
+        print("Error: Round trip with 104 bit IV failed.")
+        tc_errors += 1
+
+    for (data, bad_tag, bad_aad) in ((expected[: -1] + b"\x00", tag, aad),
+                                     (expected, tag[: -1] + b"\x00", aad),
+                                     (expected, tag, aad + b"\x00")):
+        tc += 1
+        try:
+            gcm.decrypt(iv, data, bad_tag, bad_aad)
+            print("Error: Modified message not rejected.")
+            tc_errors += 1
+        except ValueError:
+            pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_parallel()
+#
+# Test the powers of H, combining GHASH of segments and that the
+# process pool path gives the same result as the serial path.
+#-------------------------------------------------------------------
+def test_parallel():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    (title, key, iv, plaintext, aad, expected, tag) = GCM_TEST_VECTORS[3]
+    data = bytes(range(256)) * 16
+
+    for table_bits in TABLE_BITS:
+        gcm = GCM(key_words(key), table_bits, aes)
+        ghash = gcm.ghash
+
+        power = ghash.h
+        for k in range(1, 70):
+            tc += 1
+            if ghash.h_power(k) != power:
+                print("Error: %d bit table, H^%d failed." % (table_bits, k))
+                tc_errors += 1
+            power = ghash.mult_h(power)
+
+        whole = ghash.update(0, data[: 1000])
+        for split in (0, 16, 512, 992):
+            y = ghash.update(0, data[: split])
+            y = ghash.combine(y, ghash.update(0, data[split : 1000]), (1000 - split + 15) // 16)
+            tc += 1
+            if y != whole:
+                print("Error: %d bit table, combine at %d failed." % (table_bits, split))
+                tc_errors += 1
+
+        for (length, workers) in ((0, 2), (15, 2), (4096, 2), (4000, 3)):
+            tc += 2
+            (ciphertext, ctag) = gcm.encrypt(iv, data[: length], aad)
+            if gcm.encrypt_parallel(iv, data[: length], aad, workers, 0) != (ciphertext, ctag):
+                print("Error: %d bit table, parallel encipher of %d bytes failed." %
+                      (table_bits, length))
+                tc_errors += 1
+            if gcm.decrypt_parallel(iv, ciphertext, ctag, aad, workers, 0) != data[: length]:
+                print("Error: %d bit table, parallel decipher of %d bytes failed." %
+                      (table_bits, length))
+                tc_errors += 1
+
+    tc += 1
+    try:
+        GCM(key_words(key), engine = gcm.engine).encrypt_parallel(iv, data, aad, 2, 0)
+        print("Error: Custom engine not rejected by parallel GCM.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    tc += 1
+    try:
+        gcm.decrypt_parallel(iv, expected, tag[: -1] + b"\x00", aad, 2, 0)
+        print("Error: Parallel decipher did not reject a wrong tag.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the GHASH and GCM throughput and the table size and
+# build time for both table sizes.
+#-------------------------------------------------------------------
+def test_performance():
+    key = key_words(GCM_KEY)
+    data = bytes(range(256)) * 1024
+
+    for table_bits in TABLE_BITS:
+        gcm = GCM(key, table_bits)
+        ghash = gcm.ghash
+
+        start = time.perf_counter()
+        ghash.update(0, data)
+        ghash_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        gcm.encrypt(GCM_IV, data)
+        gcm_elapsed = time.perf_counter() - start
+
+        print("%d bit table: %d bytes, built in %.2f ms" %
+              (table_bits, ghash.memory_size(), ghash.build_time * 1e3))
+        print("  ghash: %.2f MB/s, gcm: %.2f MB/s" %
+              (len(data) / ghash_elapsed / 1e6, len(data) / gcm_elapsed / 1e6))
+
+    gcm = GCM(key)
+    data = data * 4
+    start = time.perf_counter()
+    gcm.encrypt_parallel(GCM_IV, data, min_bytes = 0)
+    elapsed = time.perf_counter() - start
+    print("gcm parallel, %d workers: %.2f MB/s" %
+          (os.cpu_count() or 1, len(data) / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests GHASH and GCM mode.
+#-------------------------------------------------------------------
+def main():
+    print("Testing AES GCM mode")
+    print("====================")
+
+    test_ghash()
+    test_gcm()
+    test_parallel()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_gcm.py
+#=======================================================================
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_int128.py
+# -------------
+# AES engine with the state as a single 128 bit Python int.
+# Round keys are pre-packed 128 bit ints, AddRoundKey is one XOR
+# and ShiftRows is a mask and rotate permutation.
+#
+# This is a reference for the 128 bit int state, not a fast
+# path. Single block encipher is at best on par with the T-table
+# AESKey.encrypt_block(), also for blocks given as bytes, and
+# decipher is slower since InvMixColumns costs more than
+# MixColumns. Use AESKey for low latency single blocks.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+
+from aes import AES, BLOCK_STRUCT, mixcolumns_128, inv_mixcolumns_128
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+SBOX = bytes(AES.sbox)
+INV_SBOX = bytes(AES.inv_sbox)
+
+# Masks for the four rows. Row r is byte r in each column word.
+ROW0 = 0xff000000ff000000ff000000ff000000
+ROW1 = 0x00ff000000ff000000ff000000ff0000
+ROW2 = 0x0000ff000000ff000000ff000000ff00
+ROW3 = 0x000000ff000000ff000000ff000000ff
+
+
+#-------------------------------------------------------------------
+# block_to_int()
+#
+# Convert a block given as four 32 bit words to a 128 bit int.
+#-------------------------------------------------------------------
+def block_to_int(block):
+    (w0, w1, w2, w3) = block
+    return (w0 << 96) | (w1 << 64) | (w2 << 32) | w3
+
+
+#-------------------------------------------------------------------
+# int_to_block()
+#
+# Convert a 128 bit int to a block given as four 32 bit words.
+#-------------------------------------------------------------------
+def int_to_block(x):
+    return (x >> 96, (x >> 64) & 0xffffffff, (x >> 32) & 0xffffffff, x & 0xffffffff)
+
+
+#-------------------------------------------------------------------
+# shiftrows()
+#
+# ShiftRows on a 128 bit state. Row r takes the bytes from the
+# columns r steps to the right, which is the state rotated left
+# by r words and masked with the row mask.
+#-------------------------------------------------------------------
+def shiftrows(x):
+    return ((x & ROW0) |
+            (((x << 32) | (x >> 96)) & ROW1) |
+            (((x << 64) | (x >> 64)) & ROW2) |
+            (((x << 96) | (x >> 32)) & ROW3))
+
+
+#-------------------------------------------------------------------
+# inv_shiftrows()
+#
+# Inverse ShiftRows on a 128 bit state.
+#-------------------------------------------------------------------
+def inv_shiftrows(x):
+    return ((x & ROW0) |
+            (((x >> 32) | (x << 96)) & ROW1) |
+            (((x >> 64) | (x << 64)) & ROW2) |
+            (((x >> 96) | (x << 32)) & ROW3))
+
+
+#-------------------------------------------------------------------
+# class Int128AES
+#
+# AES engine where the state is a single 128 bit int with column
+# 0 in the most significant word, and the round keys are packed
+# the same way. AddRoundKey is one XOR, ShiftRows is a mask and
+# rotate permutation, SubBytes is bytes.translate() on the
+# state bytes and MixColumns is mixcolumns_128() from the AES
+# model.
+#-------------------------------------------------------------------
+class Int128AES():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, aes = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        self.round_keys = tuple([block_to_int(k) for k in aes.key_gen(key)])
+        self.num_rounds = len(self.round_keys) - 1
+
+
+    #-------------------------------------------------------------------
+    # encipher()
+    #
+    # Encipher the given 128 bit int.
+    #-------------------------------------------------------------------
+    def encipher(self, x):
+        rk = self.round_keys
+        x ^= rk[0]
+
+        for i in range(1, self.num_rounds):
+            x = shiftrows(int.from_bytes(x.to_bytes(16, "big").translate(SBOX), "big"))
+            x = mixcolumns_128(x) ^ rk[i]
+
+        x = shiftrows(int.from_bytes(x.to_bytes(16, "big").translate(SBOX), "big"))
+        return x ^ rk[self.num_rounds]
+
+
+    #-------------------------------------------------------------------
+    # decipher()
+    #
+    # Decipher the given 128 bit int.
+    #-------------------------------------------------------------------
+    def decipher(self, x):
+        rk = self.round_keys
+        x ^= rk[self.num_rounds]
+
+        for i in range(self.num_rounds - 1, 0, -1):
+            x = inv_shiftrows(x)
+            x = int.from_bytes(x.to_bytes(16, "big").translate(INV_SBOX), "big")
+            x = inv_mixcolumns_128(x ^ rk[i])
+
+        x = inv_shiftrows(x)
+        x = int.from_bytes(x.to_bytes(16, "big").translate(INV_SBOX), "big")
+        return x ^ rk[0]
+
+
+    #-------------------------------------------------------------------
+    # encrypt_block()
+    #
+    # Encipher a block given as four 32 bit words.
+    #-------------------------------------------------------------------
+    def encrypt_block(self, block):
+        return int_to_block(self.encipher(block_to_int(block)))
+
+
+    #-------------------------------------------------------------------
+    # decrypt_block()
+    #
+    # Decipher a block given as four 32 bit words.
+    #-------------------------------------------------------------------
+    def decrypt_block(self, block):
+        return int_to_block(self.decipher(block_to_int(block)))
+
+
+#-------------------------------------------------------------------
+# test_int128_aes()
+#
+# Test the 128 bit int engine using the NIST test vectors and
+# against the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_int128_aes():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+
+    for (title, key, plaintext, expected) in AES.NIST_TEST_VECTORS:
+        engine = Int128AES(key, aes)
+        tc += 2
+        result = engine.encrypt_block(plaintext)
+        if result != expected:
+            print("Error: %s, encipher gave 0x%08x 0x%08x 0x%08x 0x%08x" %
+                  ((title,) + result))
+            tc_errors += 1
+        if engine.decrypt_block(expected) != plaintext:
+            print("Error: %s, decipher failed." % title)
+            tc_errors += 1
+
+    for key in (AES.NIST_TEST_VECTORS[0][1], AES.NIST_TEST_VECTORS[4][1]):
+        engine = Int128AES(key, aes)
+        prepared_key = aes.prepare(key)
+        for i in range(16):
+            block = (i * 0x01010101, ~i & 0xffffffff, i << 24, key[0] ^ i)
+            tc += 1
+            if engine.encrypt_block(block) != prepared_key.encrypt_block(block):
+                print("Error: Result differs from the AES model for block %d." % i)
+                tc_errors += 1
+
+    tc += 2
+    x = 0x000102030405060708090a0b0c0d0e0f
+    if shiftrows(x) != 0x00050a0f04090e03080d02070c01060b:
+        print("Error: shiftrows() gave 0x%032x" % shiftrows(x))
+        tc_errors += 1
+    if inv_shiftrows(shiftrows(x)) != x:
+        print("Error: inv_shiftrows() is not the inverse of shiftrows().")
+        tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the single block encipher and decipher latency, with
+# blocks as words and as bytes, compared to the prepared key in
+# the AES model.
+#-------------------------------------------------------------------
+def test_performance():
+    key = AES.NIST_TEST_VECTORS[0][1]
+    block = AES.NIST_TEST_VECTORS[0][2]
+    data = BLOCK_STRUCT.pack(*block)
+    engine = Int128AES(key)
+    prepared_key = AES(verbose = False, dump_vars = False).prepare(key)
+    x = block_to_int(block)
+
+    tests = (("Int128AES.encipher:", engine.encipher, x),
+             ("AESKey.encrypt_block:", prepared_key.encrypt_block, block),
+             ("Int128AES.decipher:", engine.decipher, x),
+             ("AESKey.decrypt_block:", prepared_key.decrypt_block, block),
+             ("Int128AES, bytes:",
+              lambda b: engine.encipher(int.from_bytes(b, "big")).to_bytes(16, "big"), data),
+             ("AESKey.encrypt, bytes:", prepared_key.encrypt, data))
+
+    num_blocks = 20000
+    for (name, func, arg) in tests:
+        start = time.perf_counter()
+        for i in range(num_blocks):
+            func(arg)
+        elapsed = time.perf_counter() - start
+        print("%-23s %.2f us/block" % (name, elapsed / num_blocks * 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the 128 bit int AES engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the 128 bit int AES engine")
+    print("==================================")
+
+    test_int128_aes()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_int128.py
+#=======================================================================
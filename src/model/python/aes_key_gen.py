@@ -45,80 +45,28 @@
 #-------------------------------------------------------------------
 import sys
 
+from aes_key_expansion import get_rcon, key_schedule, sub_word
+
 
 #-------------------------------------------------------------------
 # Constants.
 #-------------------------------------------------------------------
 VERBOSE = True
 
-DUMP_VARS = True
-
 AES_128_ROUNDS = 10
 AES_256_ROUNDS = 14
 
 
-sbox = [0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5,
-        0x30, 0x01, 0x67, 0x2b, 0xfe, 0xd7, 0xab, 0x76,
-        0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0,
-        0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0,
-        0xb7, 0xfd, 0x93, 0x26, 0x36, 0x3f, 0xf7, 0xcc,
-        0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
-        0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a,
-        0x07, 0x12, 0x80, 0xe2, 0xeb, 0x27, 0xb2, 0x75,
-        0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0,
-        0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84,
-        0x53, 0xd1, 0x00, 0xed, 0x20, 0xfc, 0xb1, 0x5b,
-        0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
-        0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85,
-        0x45, 0xf9, 0x02, 0x7f, 0x50, 0x3c, 0x9f, 0xa8,
-        0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5,
-        0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2,
-        0xcd, 0x0c, 0x13, 0xec, 0x5f, 0x97, 0x44, 0x17,
-        0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
-        0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88,
-        0x46, 0xee, 0xb8, 0x14, 0xde, 0x5e, 0x0b, 0xdb,
-        0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c,
-        0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79,
-        0xe7, 0xc8, 0x37, 0x6d, 0x8d, 0xd5, 0x4e, 0xa9,
-        0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
-        0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6,
-        0xe8, 0xdd, 0x74, 0x1f, 0x4b, 0xbd, 0x8b, 0x8a,
-        0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e,
-        0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e,
-        0xe1, 0xf8, 0x98, 0x11, 0x69, 0xd9, 0x8e, 0x94,
-        0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
-        0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68,
-        0x41, 0x99, 0x2d, 0x0f, 0xb0, 0x54, 0xbb, 0x16]
-
 
 #-------------------------------------------------------------------
 # substw()
 #
 # Returns a 32-bit word in which each of the bytes in the
 # given 32-bit word has been used as lookup into the AES S-box.
+# Kept for callers, the key expansion uses its own tables.
 #-------------------------------------------------------------------
 def substw(w):
-    b0 = w >> 24
-    b1 = w >> 16 & 0xff
-    b2 = w >> 8 & 0xff
-    b3 = w & 0xff
-
-    s0 = sbox[b0]
-    s1 = sbox[b1]
-    s2 = sbox[b2]
-    s3 = sbox[b3]
-
-    res = (s0 << 24) + (s1 << 16) + (s2 << 8) + s3
-
-    if VERBOSE:
-        print("Inside substw:")
-        print("b0 = 0x%02x, b1 = 0x%02x, b2 = 0x%02x, b3 = 0x%02x" %
-              (b0, b1, b2, b3))
-        print("s0 = 0x%02x, s1 = 0x%02x, s2 = 0x%02x, s3 = 0x%02x" %
-              (s0, s1, s2, s3))
-        print("res = 0x%08x" % (res))
-
-    return res
+    return sub_word(w)
 
 
 #-------------------------------------------------------------------
@@ -131,57 +79,28 @@ def rol8(w):
 
 
 #-------------------------------------------------------------------
-# next_128bit_key()
+# next_key_words()
 #
-# Generate the next four key words for aes-128 based on given
-# rcon and previous key words.
+# Generate the next four key words from the given four words and
+# the word t added to the first word.
 #-------------------------------------------------------------------
-def next_128bit_key(prev_key, rcon):
-    (w0, w1, w2, w3) = prev_key
-
-    rol = rol8(w3)
-    subst = substw(rol)
-    t = subst ^ (rcon << 24)
-
+def next_key_words(words, t):
+    (w0, w1, w2, w3) = words
     k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if VERBOSE:
-        print("Inside next 128bit key:")
-        print("w0 = 0x%08x, w1 = 0x%08x, w2 = 0x%08x, w3 = 0x%08x" %
-              (w0, w1, w2, w3))
-        print("rol = 0x%08x, subst = 0x%08x, rcon = 0x%02x, t = 0x%08x" %
-              (rol, subst, rcon, t))
-        print("k0 = 0x%08x, k1 = 0x%08x, k2 = 0x%08x, k3 = 0x%08x" %
-              (k0, k1, k2, k3))
-
+    k1 = w1 ^ k0
+    k2 = w2 ^ k1
+    k3 = w3 ^ k2
     return (k0, k1, k2, k3)
 
 
 #-------------------------------------------------------------------
-# key_gen128()
+# next_128bit_key()
 #
-# Generating the keys for 128 bit keys.
+# Generate the next four key words for aes-128 based on given
+# rcon and previous key words.
 #-------------------------------------------------------------------
-def key_gen128(key):
-    round_keys = []
-
-    round_keys.append(key)
-
-    round_keys.append(next_128bit_key(round_keys[0], get_rcon(1)))
-    round_keys.append(next_128bit_key(round_keys[1], get_rcon(2)))
-    round_keys.append(next_128bit_key(round_keys[2], get_rcon(3)))
-    round_keys.append(next_128bit_key(round_keys[3], get_rcon(4)))
-    round_keys.append(next_128bit_key(round_keys[4], get_rcon(5)))
-    round_keys.append(next_128bit_key(round_keys[5], get_rcon(6)))
-    round_keys.append(next_128bit_key(round_keys[6], get_rcon(7)))
-    round_keys.append(next_128bit_key(round_keys[7], get_rcon(8)))
-    round_keys.append(next_128bit_key(round_keys[8], get_rcon(9)))
-    round_keys.append(next_128bit_key(round_keys[9], get_rcon(10)))
-
-    return round_keys
+def next_128bit_key(prev_key, rcon):
+    return next_key_words(prev_key, substw(rol8(prev_key[3])) ^ (rcon << 24))
 
 
 #-------------------------------------------------------------------
@@ -191,27 +110,7 @@ def key_gen128(key):
 # based on given rcon and the previous two keys.
 #-------------------------------------------------------------------
 def next_256it_key_a(key0, key1, rcon):
-    (w0, w1, w2, w3) = key0
-    (w4, w5, w6, w7) = key1
-
-    sw = substw(rol8(w7))
-    rw = (rcon << 24)
-    t = sw ^ rw
-
-    k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if (DUMP_VARS):
-        print("next_256bit_key_a:")
-        print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-        print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-        print("t = 0x%08x, sw = 0x%08x, rw = 0x%08x" % (t, sw, rw))
-        print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
-        print("")
-
-    return (k0, k1, k2, k3)
+    return next_key_words(key0, substw(rol8(key1[3])) ^ (rcon << 24))
 
 
 #-------------------------------------------------------------------
@@ -221,25 +120,16 @@ def next_256it_key_a(key0, key1, rcon):
 # based on given previous eight keywords.
 #-------------------------------------------------------------------
 def next_256it_key_b(key0, key1):
-    (w0, w1, w2, w3) = key0
-    (w4, w5, w6, w7) = key1
+    return next_key_words(key0, substw(key1[3]))
 
-    t = substw(w7)
-
-    k0 = w0 ^ t
-    k1 = w1 ^ w0 ^ t
-    k2 = w2 ^ w1 ^ w0 ^ t
-    k3 = w3 ^ w2 ^ w1 ^ w0 ^ t
-
-    if (DUMP_VARS):
-        print("next_256bit_key_b:")
-        print("w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x, w0 = 0x%08x" % (w0, w1, w2, w3))
-        print("w4 = 0x%08x, w5 = 0x%08x, w6 = 0x%08x, w7 = 0x%08x" % (w4, w5, w6, w7))
-        print("t = 0x%08x" % (t))
-        print("k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x, k0 = 0x%08x" % (k0, k1, k2, k3))
-        print("")
 
-    return (k0, k1, k2, k3)
+#-------------------------------------------------------------------
+# key_gen128()
+#
+# Generating the keys for 128 bit keys.
+#-------------------------------------------------------------------
+def key_gen128(key):
+    return key_schedule(key)
 
 
 #-------------------------------------------------------------------
@@ -248,56 +138,20 @@ def next_256it_key_b(key0, key1):
 # Generating the keys for 256 bit keys.
 #-------------------------------------------------------------------
 def key_gen256(key):
-    round_keys = []
-    (k0, k1, k2, k3, k4, k5, k6, k7) = key
-
-    round_keys.append((k0, k1, k2, k3))
-    round_keys.append((k4, k5, k6, k7))
-
-    j = 1
-    for i in range(0, (AES_256_ROUNDS - 2), 2):
-        k = next_256it_key_a(round_keys[i], round_keys[i + 1], get_rcon(j))
-        round_keys.append(k)
-        k = next_256it_key_b(round_keys[i + 1], round_keys[i + 2])
-        round_keys.append(k)
-        j += 1
-
-    # One final key needs to be generated.
-    k = next_256it_key_a(round_keys[12], round_keys[13], get_rcon(7))
-    round_keys.append(k)
-
-    return round_keys
+    return key_schedule(key)
 
 
 #-------------------------------------------------------------------
 # key_gen()
 #
-# The actual key generation.
+# The actual key generation, done by the table based key
+# expansion in the key expansion module.
 #-------------------------------------------------------------------
 def key_gen(key):
     if VERBOSE:
         print("Generating keys for AES-%d." % (len(key) * 32))
 
-    if (len(key) * 32) == 128:
-        return key_gen128(key)
-
-    else:
-        return key_gen256(key)
-
-
-#-------------------------------------------------------------------
-# get_rcon()
-#
-# Function implementation of rcon. Calculates rcon for a
-# given round. This could be implemented as an iterator.
-#-------------------------------------------------------------------
-def get_rcon(round):
-    rcon = 0x8d
-
-    for i in range(0, round):
-        rcon = ((rcon << 1) ^ (0x11b & - (rcon >> 7))) & 0xff
-
-    return rcon
+    return key_schedule(key)
 
 
 #-------------------------------------------------------------------
@@ -540,6 +394,28 @@ def test_key_expansion():
     print("")
 
 
+#-------------------------------------------------------------------
+# test_key_helpers()
+#
+# Check that the word level helpers give the same round keys as
+# the key expansion.
+#-------------------------------------------------------------------
+def test_key_helpers():
+    key128 = (0x2b7e1516, 0x28aed2a6, 0xabf71588, 0x09cf4f3c)
+    key256 = (0x603deb10, 0x15ca71be, 0x2b73aef0, 0x857d7781,
+              0x1f352c07, 0x3b6108d7, 0x2d9810a3, 0x0914dff4)
+    round_keys = key_schedule(key256)
+
+    if next_128bit_key(key128, get_rcon(1)) != key_schedule(key128)[1]:
+        print("Error: next_128bit_key() differs from the key expansion.")
+    elif next_256it_key_a(round_keys[0], round_keys[1], get_rcon(1)) != round_keys[2]:
+        print("Error: next_256it_key_a() differs from the key expansion.")
+    elif next_256it_key_b(round_keys[1], round_keys[2]) != round_keys[3]:
+        print("Error: next_256it_key_b() differs from the key expansion.")
+    else:
+        print("Key helpers correct.")
+
+
 #-------------------------------------------------------------------
 # main()
 #
@@ -551,6 +427,7 @@ def main():
     print
 
     test_key_expansion()
+    test_key_helpers()
 
 
 #-------------------------------------------------------------------
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_numpy.py
+# ------------
+# Batch AES engine using NumPy. Many blocks under one key are
+# processed at once with the T-table rounds done as array
+# operations on whole columns of blocks.
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+import numpy as np
+
+from aes import AES, TE0, TE1, TE2, TE3, TE4, TD0, TD1, TD2, TD3, TD4
+from aes_key_expansion import RCON
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+# The T-tables as arrays for fancy indexing with whole columns.
+TE = np.array([TE0, TE1, TE2, TE3, TE4], dtype = np.uint32)
+TD = np.array([TD0, TD1, TD2, TD3, TD4], dtype = np.uint32)
+
+FINAL_MASKS = (np.uint32(0xff000000), np.uint32(0x00ff0000),
+               np.uint32(0x0000ff00), np.uint32(0x000000ff))
+
+RCON_WORDS = np.array([r << 24 for r in RCON], dtype = np.uint32)
+
+
+#-------------------------------------------------------------------
+# to_words()
+#
+# Convert the given blocks, either as a (N, 4) array of 32 bit
+# words or a (N, 16) array of bytes, to a (N, 4) uint32 array.
+# Returns the words and a flag telling if the blocks were bytes.
+#-------------------------------------------------------------------
+def to_words(blocks):
+    blocks = np.asarray(blocks)
+
+    if blocks.ndim == 2 and blocks.shape[1] == 16:
+        words = np.ascontiguousarray(blocks, dtype = np.uint8).view('>u4')
+        return (words.astype(np.uint32), True)
+
+    if blocks.ndim == 2 and blocks.shape[1] == 4:
+        return (blocks.astype(np.uint32, copy = False), False)
+
+    raise ValueError("Blocks must be a (N, 4) word or (N, 16) byte array.")
+
+
+#-------------------------------------------------------------------
+# from_words()
+#
+# Convert the given (N, 4) uint32 array to blocks of bytes
+# if as_bytes is set.
+#-------------------------------------------------------------------
+def from_words(words, as_bytes):
+    if as_bytes:
+        return words.astype('>u4').view(np.uint8).reshape(-1, 16)
+    return words
+
+
+#-------------------------------------------------------------------
+# ttable_rounds()
+#
+# Perform all rounds on the given (N, 4) array of blocks using
+# the given (rounds + 1, 4) array of round keys and the given
+# tables. The columns used for the bytes in a new column are
+# given by step, which is 1 for ShiftRows and 3 for inverse
+# ShiftRows. Each round is 16 table lookups and XORs over whole
+# columns of the blocks.
+#-------------------------------------------------------------------
+def ttable_rounds(words, round_keys, tables, step):
+    (t0, t1, t2, t3, t4) = tables
+    num_rounds = round_keys.shape[0] - 1
+    s = [words[:, c] ^ round_keys[0, c] for c in range(4)]
+
+    for i in range(1, num_rounds):
+        s = [t0[s[c] >> 24] ^
+             t1[(s[(c + step) % 4] >> 16) & 0xff] ^
+             t2[(s[(c + 2 * step) % 4] >> 8) & 0xff] ^
+             t3[s[(c + 3 * step) % 4] & 0xff] ^
+             round_keys[i, c] for c in range(4)]
+
+    (m0, m1, m2, m3) = FINAL_MASKS
+    res = np.empty((words.shape[0], 4), dtype = np.uint32)
+    for c in range(4):
+        res[:, c] = (t4[s[c] >> 24] & m0) ^\
+                    (t4[(s[(c + step) % 4] >> 16) & 0xff] & m1) ^\
+                    (t4[(s[(c + 2 * step) % 4] >> 8) & 0xff] & m2) ^\
+                    (t4[s[(c + 3 * step) % 4] & 0xff] & m3) ^\
+                    round_keys[num_rounds, c]
+    return res
+
+
+#-------------------------------------------------------------------
+# key_gen_batch()
+#
+# Expand many keys at once. The keys are given as a (K, 4) or
+# (K, 8) array of 32 bit words and the round keys are returned
+# as a (K, rounds + 1, 4) uint32 array. Each step of the key
+# expansion is done for all keys with whole column operations,
+# following next_128bit_key() and next_256it_key_a/b() in the
+# AES model. The S-box lookups use TE4 with the final round
+# masks to place the substituted bytes.
+#-------------------------------------------------------------------
+def key_gen_batch(keys):
+    keys = np.asarray(keys)
+    if keys.ndim != 2 or keys.shape[1] not in (4, 8):
+        raise ValueError("Keys must be a (K, 4) or (K, 8) array of words.")
+
+    nk = keys.shape[1]
+    num_rounds = nk + 6
+    te4 = TE[4]
+    (m0, m1, m2, m3) = FINAL_MASKS
+
+    w = np.empty((keys.shape[0], 4 * (num_rounds + 1)), dtype = np.uint32)
+    w[:, : nk] = keys
+
+    for i in range(nk, 4 * (num_rounds + 1)):
+        t = w[:, i - 1]
+        if i % nk == 0:
+            t = ((te4[(t >> 16) & 0xff] & m0) | (te4[(t >> 8) & 0xff] & m1) |
+                 (te4[t & 0xff] & m2) | (te4[t >> 24] & m3)) ^ RCON_WORDS[i // nk]
+        elif nk == 8 and i % nk == 4:
+            t = ((te4[t >> 24] & m0) | (te4[(t >> 16) & 0xff] & m1) |
+                 (te4[(t >> 8) & 0xff] & m2) | (te4[t & 0xff] & m3))
+        w[:, i] = w[:, i - nk] ^ t
+
+    return w.reshape(-1, num_rounds + 1, 4)
+
+
+#-------------------------------------------------------------------
+# NumpyAES()
+#
+# AES engine processing many blocks under one key at once using
+# NumPy array operations. The round keys are the ones generated
+# by the AES model key expansion.
+#-------------------------------------------------------------------
+class NumpyAES():
+    #-------------------------------------------------------------------
+    #-------------------------------------------------------------------
+    def __init__(self, key, aes = None):
+        if aes is None:
+            aes = AES(verbose = False, dump_vars = False)
+
+        round_keys = aes.key_gen(key)
+        self.num_rounds = len(round_keys) - 1
+        self.enc_keys = np.array(round_keys, dtype = np.uint32)
+        self.dec_keys = np.array(aes.equivalent_inverse_keys(round_keys),
+                                 dtype = np.uint32)
+
+
+    #-------------------------------------------------------------------
+    # encrypt_blocks()
+    #
+    # Encipher the given (N, 4) word or (N, 16) byte array of
+    # blocks. The result has the same format as the given blocks.
+    #-------------------------------------------------------------------
+    def encrypt_blocks(self, blocks):
+        (words, as_bytes) = to_words(blocks)
+        return from_words(ttable_rounds(words, self.enc_keys, TE, 1), as_bytes)
+
+
+    #-------------------------------------------------------------------
+    # decrypt_blocks()
+    #
+    # Decipher the given (N, 4) word or (N, 16) byte array of
+    # blocks. The result has the same format as the given blocks.
+    #-------------------------------------------------------------------
+    def decrypt_blocks(self, blocks):
+        (words, as_bytes) = to_words(blocks)
+        return from_words(ttable_rounds(words, self.dec_keys, TD, 3), as_bytes)
+
+
+    #-------------------------------------------------------------------
+    # encrypt()
+    #
+    # Encipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def encrypt(self, data):
+        blocks = np.frombuffer(data, dtype = np.uint8).reshape(-1, 16)
+        return self.encrypt_blocks(blocks).tobytes()
+
+
+    #-------------------------------------------------------------------
+    # decrypt()
+    #
+    # Decipher the given bytes in ECB mode. The length must be
+    # a multiple of the block size.
+    #-------------------------------------------------------------------
+    def decrypt(self, data):
+        blocks = np.frombuffer(data, dtype = np.uint8).reshape(-1, 16)
+        return self.decrypt_blocks(blocks).tobytes()
+
+
+#-------------------------------------------------------------------
+# test_numpy_aes()
+#
+# Test the NumPy engine using the NIST test vectors. All blocks
+# for a key are processed as one batch. A larger batch of random
+# blocks is checked against the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_numpy_aes():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+
+    for key_len in (4, 8):
+        vectors = [v for v in AES.NIST_TEST_VECTORS if len(v[1]) == key_len]
+        key = vectors[0][1]
+        plaintext = np.array([v[2] for v in vectors], dtype = np.uint32)
+        expected = np.array([v[3] for v in vectors], dtype = np.uint32)
+        engine = NumpyAES(key, aes)
+
+        tc += 2
+        if not np.array_equal(engine.encrypt_blocks(plaintext), expected):
+            print("Error: Encipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+        if not np.array_equal(engine.decrypt_blocks(expected), plaintext):
+            print("Error: Decipher of NIST vectors for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+        # Byte blocks must give the same result as word blocks.
+        tc += 1
+        byte_blocks = plaintext.astype('>u4').view(np.uint8).reshape(-1, 16)
+        if engine.encrypt_blocks(byte_blocks).tobytes() !=\
+           expected.astype('>u4').tobytes():
+            print("Error: Encipher of byte blocks for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+        data = np.random.default_rng(key_len).bytes(16 * 1024)
+        ciphertext = engine.encrypt(data)
+        prepared_key = aes.prepare(key)
+        words = np.frombuffer(data, dtype = '>u4').reshape(-1, 4)[:16].tolist()
+        exp_words = [prepared_key.encrypt_block(tuple(w)) for w in words]
+        tc += 2
+        if np.frombuffer(ciphertext, dtype = '>u4').reshape(-1, 4)[:16].tolist() !=\
+           [list(w) for w in exp_words]:
+            print("Error: Result for AES-%d differs from the AES model." % (key_len * 32))
+            tc_errors += 1
+        if engine.decrypt(ciphertext) != data:
+            print("Error: Decipher of random data for AES-%d failed." % (key_len * 32))
+            tc_errors += 1
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_key_gen_batch()
+#
+# Test the batch key expansion against the word based key
+# expansion in the AES model for random keys of each size.
+#-------------------------------------------------------------------
+def test_key_gen_batch():
+    tc_errors = 0
+    tc        = 0
+    rng = np.random.default_rng(1)
+
+    # With a trace hook the AES model expands the keys with
+    # next_128bit_key() and next_256it_key_a/b().
+    aes = AES(verbose = False, dump_vars = False,
+              trace_hook = lambda round, step, words: None)
+
+    for key_len in (4, 8):
+        keys = rng.integers(0, 1 << 32, size = (64, key_len), dtype = np.uint32)
+        round_keys = key_gen_batch(keys)
+        tc += 2
+        if round_keys.shape != (64, key_len + 7, 4):
+            print("Error: Round keys for AES-%d have shape %s." %
+                  (key_len * 32, round_keys.shape))
+            tc_errors += 1
+        expected = [aes.key_gen128(tuple(k)) if key_len == 4 else
+                    aes.key_gen256(tuple(k)) for k in keys.tolist()]
+        if round_keys.tolist() != [[list(rk) for rk in e] for e in expected]:
+            print("Error: Round keys for AES-%d differ from the AES model." %
+                  (key_len * 32))
+            tc_errors += 1
+
+    tc += 1
+    try:
+        key_gen_batch(np.zeros((2, 6), dtype = np.uint32))
+        print("Error: Keys with six words not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the throughput of the engine on a multi MB buffer.
+#-------------------------------------------------------------------
+def test_performance():
+    data = bytes(4 * 1024 * 1024)
+    engine = NumpyAES(AES.NIST_TEST_VECTORS[0][1])
+
+    for (name, func) in (("encrypt", engine.encrypt), ("decrypt", engine.decrypt)):
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        print("%s: %.1f MB/s" % (name, len(data) / elapsed / 1e6))
+
+    num_keys = 100000
+    for key_len in (4, 8):
+        keys = np.random.default_rng(key_len).integers(0, 1 << 32, size = (num_keys, key_len),
+                                                       dtype = np.uint32)
+        start = time.perf_counter()
+        key_gen_batch(keys)
+        elapsed = time.perf_counter() - start
+        print("key_gen_batch AES-%d: %.0f keys/s" % (key_len * 32, num_keys / elapsed))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the NumPy AES engine.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the NumPy AES engine")
+    print("============================")
+
+    test_numpy_aes()
+    test_key_gen_batch()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_numpy.py
+#=======================================================================
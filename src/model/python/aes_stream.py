@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aes_stream.py
+# -------------
+# Generators for ECB processing of streams of bytes-like chunks
+# of arbitrary size. Partial blocks are carried between chunks and
+# the output is produced in large aligned batches.
+#
+#
+#
+# Author: Joachim Strömbergson
+# Copyright (c) 2026, Secworks Sweden AB
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import time
+
+from aes import AES
+from aes_engines import batch_engine
+from aes_byteslice import BytesliceAES
+
+
+#-------------------------------------------------------------------
+# Constants.
+#-------------------------------------------------------------------
+VERBOSE = True
+
+DEFAULT_BATCH_BYTES = 64 * 1024
+
+
+#-------------------------------------------------------------------
+# iter_process()
+#
+# Generator that collects the given chunks into batches of
+# batch_bytes bytes, processes each batch with the given function
+# and yields the results. Partial blocks are carried over to the
+# next chunk. The last batch holds the remaining whole blocks.
+# Data that does not end on a block boundary raises ValueError.
+#-------------------------------------------------------------------
+def iter_process(chunks, func, batch_bytes):
+    if batch_bytes <= 0 or batch_bytes % 16 != 0:
+        raise ValueError("Batch size must be a positive multiple of 16 bytes.")
+
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) >= batch_bytes:
+            end = len(buf) - (len(buf) % batch_bytes)
+            view = memoryview(buf)
+            for start in range(0, end, batch_bytes):
+                yield func(view[start : start + batch_bytes])
+            view.release()
+            del buf[: end]
+
+    if len(buf) % 16 != 0:
+        raise ValueError("Data length must be a multiple of 16 bytes, "
+                         "%d bytes left over." % (len(buf) % 16))
+    if buf:
+        yield func(bytes(buf))
+
+
+#-------------------------------------------------------------------
+# iter_encrypt()
+#
+# Encipher the stream of bytes-like chunks in ECB mode with the
+# given key. Yields the ciphertext in batches of batch_bytes.
+# If no engine is given the fastest available batch engine is
+# used.
+#-------------------------------------------------------------------
+def iter_encrypt(chunks, key, batch_bytes = DEFAULT_BATCH_BYTES, engine = None):
+    if engine is None:
+        engine = batch_engine(key)
+    return iter_process(chunks, engine.encrypt, batch_bytes)
+
+
+#-------------------------------------------------------------------
+# iter_decrypt()
+#
+# Decipher the stream of bytes-like chunks in ECB mode with the
+# given key. Yields the plaintext in batches of batch_bytes.
+#-------------------------------------------------------------------
+def iter_decrypt(chunks, key, batch_bytes = DEFAULT_BATCH_BYTES, engine = None):
+    if engine is None:
+        engine = batch_engine(key)
+    return iter_process(chunks, engine.decrypt, batch_bytes)
+
+
+#-------------------------------------------------------------------
+# split_chunks()
+#
+# Split the given data into chunks of varying sizes.
+#-------------------------------------------------------------------
+def split_chunks(data, sizes):
+    chunks = []
+    start = 0
+    i = 0
+    while start < len(data):
+        chunks.append(data[start : start + sizes[i % len(sizes)]])
+        start += sizes[i % len(sizes)]
+        i += 1
+    return chunks
+
+
+#-------------------------------------------------------------------
+# test_stream()
+#
+# Test the stream generators with chunks of different sizes
+# against the prepared key in the AES model.
+#-------------------------------------------------------------------
+def test_stream():
+    tc_errors = 0
+    tc        = 0
+    aes = AES(verbose = False, dump_vars = False)
+    data = bytes(range(256)) * 40
+
+    for key in (AES.NIST_TEST_VECTORS[0][1], AES.NIST_TEST_VECTORS[4][1]):
+        expected = aes.prepare(key).encrypt(data)
+        for sizes in ((1,), (7, 100, 3), (16,), (1000, 5000), (len(data),)):
+            chunks = split_chunks(data, sizes)
+            batches = list(iter_encrypt(chunks, key, batch_bytes = 1024))
+            tc += 2
+            if b"".join(batches) != expected:
+                print("Error: Stream encipher with chunk sizes %s failed." % (sizes,))
+                tc_errors += 1
+            if [len(b) for b in batches[:-1]] != [1024] * (len(batches) - 1):
+                print("Error: Batches are not aligned to the batch size.")
+                tc_errors += 1
+
+        # Decipher memoryview chunks with the stdlib engine.
+        chunks = split_chunks(memoryview(expected), (33, 999))
+        engine = BytesliceAES(key, aes = aes)
+        tc += 1
+        if b"".join(iter_decrypt(chunks, key, batch_bytes = 4096, engine = engine)) != data:
+            print("Error: Stream decipher failed.")
+            tc_errors += 1
+
+    tc += 2
+    if list(iter_encrypt([], key)) != []:
+        print("Error: Empty stream gave output.")
+        tc_errors += 1
+    try:
+        list(iter_encrypt([data, b"\x00" * 5], key))
+        print("Error: Partial last block not rejected.")
+        tc_errors += 1
+    except ValueError:
+        pass
+
+    print("Number of test cases executed: %d" % tc)
+    if (tc_errors == 0):
+        print("All test cases OK.")
+    else:
+        print("Number of failing test cases: %d" % tc_errors)
+
+
+#-------------------------------------------------------------------
+# test_performance()
+#
+# Measure the throughput for a stream of small unaligned chunks.
+#-------------------------------------------------------------------
+def test_performance():
+    key = AES.NIST_TEST_VECTORS[0][1]
+    chunk = bytes(range(250)) * 4
+    num_chunks = 4096
+
+    start = time.perf_counter()
+    for batch in iter_encrypt((chunk for i in range(num_chunks)), key):
+        pass
+    elapsed = time.perf_counter() - start
+    print("iter_encrypt: %.1f MB/s" % (len(chunk) * num_chunks / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# If executed tests the stream generators.
+#-------------------------------------------------------------------
+def main():
+    print("Testing the AES stream generators")
+    print("=================================")
+
+    test_stream()
+    if VERBOSE:
+        test_performance()
+
+
+#-------------------------------------------------------------------
+# __name__
+# Python thingy which allows the file to be run standalone as
+# well as parsed from within a Python interpreter.
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    # Run the main function.
+    sys.exit(main())
+
+#=======================================================================
+# EOF aes_stream.py
+#=======================================================================